@@ -54,6 +54,11 @@ packages=[
 ]
 download_url="http://www.almad.net/download/sneakylang/sneakylang-"+version+".tar.gz"
 data_files=[]
+entry_points={
+    'console_scripts' : [
+        'sneakylang = sneakylang.cli:main',
+    ],
+}
 ###############################################################################
 # end arguments for setup
 ###############################################################################
@@ -82,6 +87,7 @@ def main():
         packages=packages,
         download_url=download_url,
         data_files=data_files,
+        entry_points=entry_points,
     )
 
 if __name__ == "__main__":
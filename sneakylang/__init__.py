@@ -11,11 +11,23 @@ __versionstr__ = '.'.join(map(str, VERSION))
 from document import Document
 from expanders import expand
 from macro import Macro
-from parser import parse
+from macro_caller import MacroSyntax
+from parser import parse, parse_file
 from register import Register, RegisterMap
+from render import render
 from treebuilder import TreeBuilder
 
 __all__ = (
-    "Document", "Macro", "Register", "RegisterMap", "TreeBuilder",
-    "parse", "expand",
+    "Document", "Macro", "MacroSyntax", "Register", "RegisterMap", "TreeBuilder",
+    "parse", "parse_file", "expand", "render", "warm_up",
 )
+
+def warm_up(register_map=None):
+    """ Do work otherwise done lazily on first parse (importing pyparsing and
+    building argument grammar, resolving hooks for macros in register_map).
+    Useful f.e. before forking worker processes. """
+    from macro_caller import get_argument_parser
+    get_argument_parser()
+    if register_map is not None:
+        for macro in register_map:
+            register_map.get_hooks(macro)
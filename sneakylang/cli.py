@@ -0,0 +1,292 @@
+# -*- coding: utf-8 -*-
+
+""" Command line tool rendering documents.
+
+    sneakylang [options] CONFIG PATH...
+
+CONFIG is Python path to configuration: module (f.e. mywiki.config) or
+object in module (mywiki.config:czechtile). It must have register_map and
+node_map attributes; parsers (list of parsers) and format (default
+format) are used too if present. PATH is file or directory to render,
+directories are searched recursively.
+"""
+
+import math
+import os
+import sys
+import time
+from optparse import OptionParser
+
+from expanders import expand
+from macro import Macro
+from macro_hook import MacroHook
+from memory import measure_parse, tree_stats
+from render import render
+from source import read_source
+
+__all__ = ['ProfileHook', 'load_config', 'main', 'percentile']
+
+USAGE = "%prog [options] CONFIG PATH..."
+
+# percentiles reported by --bench
+BENCH_PERCENTILES = (50, 90, 99)
+
+class ProfileHook(MacroHook):
+    """ Measures time spent in expanding of every macro class.
+    Total time includes time of nested macros, self time does not """
+    macro = Macro
+
+    def __init__(self):
+        MacroHook.__init__(self)
+        # macro class name : [calls, total time, self time]
+        self.timings = {}
+        # [macro, start, time of nested macros] of macros being expanded
+        self._stack = []
+
+    def pre_macro(self, stream, macro, builder):
+        self._stack.append([macro, time.time(), 0.0])
+        return stream
+
+    def post_macro(self, macro, builder):
+        end = time.time()
+        # macros which failed were not followed by post_macro
+        while self._stack and self._stack[-1][0] is not macro:
+            self._stack.pop()
+        if not self._stack:
+            return
+        unused, start, nested = self._stack.pop()
+        elapsed = end - start
+        name = macro.__class__.__name__
+        timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+        timing[0] += 1
+        timing[1] += elapsed
+        timing[2] += elapsed - nested
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    def reset(self):
+        self.timings = {}
+        self._stack = []
+
+
+def load_config(name):
+    """ Import configuration given as module or module:object """
+    if ':' in name:
+        module_name, object_name = name.split(':', 1)
+    else:
+        module_name, object_name = name, None
+    __import__(module_name)
+    config = sys.modules[module_name]
+    if object_name is not None:
+        for attribute in object_name.split('.'):
+            config = getattr(config, attribute)
+    for attribute in ('register_map', 'node_map'):
+        if not hasattr(config, attribute):
+            raise ValueError("Configuration %s has no %s" % (name, attribute))
+    return config
+
+def percentile(values, percent):
+    """ Return percentile of values (nearest rank) """
+    values = sorted(values)
+    if not values:
+        return None
+    index = int(math.ceil(percent / 100.0 * len(values))) - 1
+    return values[max(index, 0)]
+
+def find_files(paths, suffix=None):
+    """ Return list of tuples (file, path relative to given directory) """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append((path, os.path.basename(path)))
+            continue
+        for directory, dirs, names in os.walk(path):
+            dirs[:] = sorted([name for name in dirs if not name.startswith('.')])
+            for name in sorted(names):
+                if name.startswith('.') or (suffix and not name.endswith(suffix)):
+                    continue
+                file_path = os.path.join(directory, name)
+                files.append((file_path, os.path.relpath(file_path, path)))
+    return files
+
+def get_option_parser():
+    parser = OptionParser(usage=USAGE)
+    parser.add_option('-f', '--format', help="format to render to (default is format from configuration)")
+    parser.add_option('-o', '--output', metavar='DIR', help="write output files to DIR instead of standard output")
+    parser.add_option('-x', '--extension', help="extension of output files (default is .FORMAT)")
+    parser.add_option('-s', '--suffix', help="render only files ending with SUFFIX when searching directories")
+    parser.add_option('-e', '--encoding', default='utf-8', help="encoding of input and output [%default]")
+    parser.add_option('-j', '--jobs', type='int', default=1, metavar='N', help="render in N processes [%default]")
+    parser.add_option('-p', '--profile', action='store_true', default=False, help="report time spent in macros")
+    parser.add_option('-b', '--bench', type='int', default=0, metavar='N', help="render every file N times and report percentiles of times, output is not written")
+    parser.add_option('--stats', action='store_true', default=False, help="report size of parsed trees")
+    return parser
+
+
+class Renderer(object):
+    """ Renders files with given configuration and options. One is created in every process """
+    def __init__(self, config_name, options):
+        self.config = load_config(config_name)
+        self.options = options
+        self.register_map = self.config.register_map
+        self.node_map = self.config.node_map
+        self.parsers = getattr(self.config, 'parsers', None)
+        self.format = options.format or getattr(self.config, 'format', None)
+        self.profile_hook = None
+        # hooks added to register map of configuration, removed by close()
+        self._added_hooks = []
+        if options.profile:
+            if ProfileHook not in self.register_map.hooks.get(ProfileHook.macro, ()):
+                self.register_map.add_hooks([ProfileHook])
+                self._added_hooks.append(ProfileHook)
+            for hook in self.register_map.get_hooks(Macro):
+                if isinstance(hook, ProfileHook):
+                    self.profile_hook = hook
+
+    def close(self):
+        """ Remove hooks added to register map of configuration """
+        self.register_map.remove_hooks(self._added_hooks)
+        self._added_hooks = []
+
+    def render_task(self, path, relative_path):
+        """ Render file, failure is reported in result instead of raised """
+        try:
+            return self.render_file(path, relative_path)
+        except Exception, err:
+            return {'path' : path, 'error' : '%s: %s' % (err.__class__.__name__, err)}
+
+    def render_file(self, path, relative_path):
+        """ Render file, return dictionary with results """
+        stream = read_source(path, self.options.encoding)
+        result = {'path' : path}
+        if self.profile_hook is not None:
+            self.profile_hook.reset()
+
+        if self.options.stats:
+            tree, memory = measure_parse(stream, self.register_map, parsers=self.parsers, document_root=True)
+            start = time.time()
+            output = expand(tree.children, self.format, self.node_map)
+            result['stats'] = '\n'.join([tree_stats(tree).report(), memory.report(), 'expand: %.3fs' % (time.time() - start)])
+        else:
+            output = render(stream, self.register_map, self.format, self.node_map, parsers=self.parsers)
+
+        if self.options.bench:
+            times = []
+            for i in range(self.options.bench):
+                start = time.time()
+                render(stream, self.register_map, self.format, self.node_map, parsers=self.parsers)
+                times.append(time.time() - start)
+            result['times'] = times
+        elif self.options.output:
+            self.write_output(relative_path, output)
+        else:
+            result['output'] = output
+
+        if self.profile_hook is not None:
+            result['timings'] = self.profile_hook.timings
+        return result
+
+    def write_output(self, relative_path, output):
+        extension = self.options.extension or '.' + self.format
+        output_path = os.path.join(self.options.output, os.path.splitext(relative_path)[0] + extension)
+        directory = os.path.dirname(output_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        output_file = open(output_path, 'wb')
+        try:
+            output_file.write(output.encode(self.options.encoding))
+        finally:
+            output_file.close()
+
+
+# Renderer of worker process
+_renderer = None
+
+def _init_worker(config_name, options):
+    global _renderer
+    _renderer = Renderer(config_name, options)
+
+def _render_in_worker(task):
+    return _renderer.render_task(*task)
+
+
+def format_profile(timings):
+    lines = ['%-30s %8s %10s %10s' % ('macro', 'calls', 'total', 'self')]
+    for name, (calls, total, self_time) in sorted(timings.items(), key=lambda item: -item[1][1]):
+        lines.append('%-30s %8d %10.4f %10.4f' % (name, calls, total, self_time))
+    return '\n'.join(lines)
+
+def format_bench(path, times):
+    columns = ['min %.4f' % min(times)]
+    for percent in BENCH_PERCENTILES:
+        columns.append('p%d %.4f' % (percent, percentile(times, percent)))
+    columns.append('max %.4f' % max(times))
+    return '%s: %s' % (path, ', '.join(columns))
+
+def main(argv=None):
+    """ Run command line tool, return exit status """
+    parser = get_option_parser()
+    options, arguments = parser.parse_args(argv)
+    if len(arguments) < 2:
+        parser.error("configuration and at least one path must be given")
+    config_name, paths = arguments[0], arguments[1:]
+
+    # modules of configuration are usually next to documents
+    if os.getcwd() not in sys.path and '' not in sys.path:
+        sys.path.insert(0, os.getcwd())
+
+    try:
+        renderer = Renderer(config_name, options)
+    except (ImportError, AttributeError, ValueError), err:
+        parser.error("cannot load configuration %s: %s" % (config_name, err))
+    if renderer.format is None:
+        parser.error("format must be given, configuration has none")
+
+    files = find_files(paths, options.suffix)
+    try:
+        if options.jobs > 1 and len(files) > 1:
+            from multiprocessing import Pool
+            pool = Pool(options.jobs, _init_worker, (config_name, options))
+            try:
+                results = pool.map(_render_in_worker, files)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            results = [renderer.render_task(*task) for task in files]
+    finally:
+        renderer.close()
+
+    timings = {}
+    failed = False
+    for result in results:
+        if 'error' in result:
+            sys.stderr.write('%s: %s\n' % (result['path'], result['error']))
+            failed = True
+            continue
+        if 'output' in result:
+            sys.stdout.write(result['output'].encode(options.encoding))
+        if 'stats' in result:
+            sys.stderr.write('%s:\n%s\n' % (result['path'], result['stats']))
+        if 'times' in result:
+            sys.stderr.write(format_bench(result['path'], result['times']) + '\n')
+        for name, (calls, total, self_time) in result.get('timings', {}).items():
+            timing = timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += calls
+            timing[1] += total
+            timing[2] += self_time
+
+    if options.bench and len(results) > 1:
+        times = []
+        for result in results:
+            times.extend(result.get('times', []))
+        if times:
+            sys.stderr.write(format_bench('all', times) + '\n')
+    if options.profile:
+        sys.stderr.write(format_profile(timings) + '\n')
+    if failed:
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+""" Differences between two parsed trees.
+
+Subtrees are compared by hashes of node class, text content and chosen
+attributes (f.e. ['args', 'kwargs']) of all their nodes. Hashes are
+computed once for every node, so equal subtrees are skipped without
+walking them. Children of matching nodes are aligned with difflib, so
+only inserted, deleted or replaced runs of children are reported,
+together with their output expanded to given format.
+"""
+
+from difflib import SequenceMatcher
+from hashlib import md5
+
+from expanders import expand
+from node import TextNode
+
+__all__ = ['Change', 'TreeHashes', 'diff', 'subtree_hash']
+
+INSERT = 'insert'
+DELETE = 'delete'
+REPLACE = 'replace'
+
+class TreeHashes(object):
+    """ Hashes of subtrees, computed on first use and remembered """
+    def __init__(self, attributes=()):
+        self.attributes = tuple(attributes)
+        # id(node) : (node, hash of node itself, hash of subtree)
+        self._hashes = {}
+
+    def own_hash(self, node):
+        """ Return hash of node class, content and attributes (not of children) """
+        return self._get(node)[1]
+
+    def get(self, node):
+        """ Return hash of subtree """
+        return self._get(node)[2]
+
+    def _own_digest(self, node):
+        parts = ['%s:%s' % (node.__class__.__module__, node.__class__.__name__)]
+        if isinstance(node, TextNode):
+            parts.append(node.content.encode('utf-8'))
+        for name in self.attributes:
+            parts.append(repr(getattr(node, name, None)))
+        return md5('\0'.join(parts)).digest()
+
+    def _get(self, node):
+        try:
+            return self._hashes[id(node)]
+        except KeyError:
+            pass
+        # post-order walk without recursion
+        stack = [(node, False)]
+        while stack:
+            current, children_done = stack.pop()
+            if id(current) in self._hashes:
+                continue
+            if not children_done:
+                stack.append((current, True))
+                for child in current.children:
+                    if id(child) not in self._hashes:
+                        stack.append((child, False))
+                continue
+            own = self._own_digest(current)
+            digest = md5(own)
+            for child in current.children:
+                digest.update(self._hashes[id(child)][2])
+            self._hashes[id(current)] = (current, own, digest.digest())
+        return self._hashes[id(node)]
+
+
+def subtree_hash(node, attributes=()):
+    """ Return hash of node and its descendants """
+    return TreeHashes(attributes).get(node)
+
+
+class Change(object):
+    """ Run of children replaced, inserted or deleted.
+
+    path and new_path are indices of children leading from given root to
+    parent of changed children in old and new tree; path is None if roots
+    themselves differ. Children old_start:old_end of parent in old tree
+    are replaced by nodes (children new_start:new_end in new tree), output
+    is those nodes expanded (or None if format was not given).
+    """
+    def __init__(self, action, path, new_path, old_start, old_end, new_start, new_end, nodes, output=None):
+        self.action = action
+        self.path = path
+        self.new_path = new_path
+        self.old_start = old_start
+        self.old_end = old_end
+        self.new_start = new_start
+        self.new_end = new_end
+        self.nodes = nodes
+        self.output = output
+
+    def __repr__(self):
+        return '<Change %s %s[%d:%d] -> %d nodes>' % (self.action, self.path, self.old_start, self.old_end, len(self.nodes))
+
+
+def diff(old, new, attributes=(), format=None, node_map=None):
+    """ Return list of Changes turning old tree into new one, in document order.
+    Trees are nodes (children of roots are compared if roots are the same)
+    or lists of nodes (as returned by parse()); if only one of them is
+    list, it's compared with children of the other """
+    hashes = TreeHashes(attributes)
+    changes = []
+
+    def add_change(action, path, new_path, old_start, old_end, new_start, new_end, nodes):
+        output = None
+        if format is not None and nodes:
+            output = expand(nodes, format, node_map)
+        changes.append(Change(action, path, new_path, old_start, old_end, new_start, new_end, nodes, output))
+
+    if isinstance(old, list) or isinstance(new, list):
+        if not isinstance(old, list):
+            old = old.children
+        if not isinstance(new, list):
+            new = new.children
+        stack = [(old, new, (), ())]
+    elif hashes.get(old) == hashes.get(new):
+        return changes
+    elif hashes.own_hash(old) != hashes.own_hash(new):
+        add_change(REPLACE, None, None, 0, 1, 0, 1, [new])
+        return changes
+    else:
+        stack = [(old.children, new.children, (), ())]
+
+    while stack:
+        old_children, new_children, path, new_path = stack.pop()
+        matcher = SequenceMatcher(None, [hashes.get(node) for node in old_children],
+            [hashes.get(node) for node in new_children], autojunk=False)
+        nested = []
+        for action, old_start, old_end, new_start, new_end in matcher.get_opcodes():
+            if action == 'equal':
+                continue
+            if action == REPLACE and old_end - old_start == new_end - new_start:
+                # nodes replaced one by one: those differing only in descendants are compared deeper
+                for offset in range(old_end - old_start):
+                    old_node, new_node = old_children[old_start+offset], new_children[new_start+offset]
+                    if hashes.own_hash(old_node) == hashes.own_hash(new_node) and not isinstance(old_node, TextNode):
+                        nested.append((old_node.children, new_node.children,
+                            path + (old_start+offset,), new_path + (new_start+offset,)))
+                    else:
+                        add_change(REPLACE, path, new_path, old_start+offset, old_start+offset+1,
+                            new_start+offset, new_start+offset+1, [new_node])
+                continue
+            add_change(action, path, new_path, old_start, old_end, new_start, new_end, new_children[new_start:new_end])
+        stack.extend(reversed(nested))
+    # changes of nested nodes were found after changes of their parents
+    changes.sort(key=lambda change: change.new_path + (change.new_start,))
+    return changes
@@ -2,8 +2,7 @@
 
 """ Default document macro/nodes """
 
-import logging
-
+from log import debug
 from macro import Macro
 from parser import Parser, parse
 from node import Node
@@ -19,7 +18,7 @@ class Document(Macro):
 
     def expand_to_nodes(self, content, **kwargs):
         doc = DocumentNode()
-        logging.debug('Creating document node and parsing document')
+        debug('Creating document node and parsing document')
         res = parse(content, self.register_map, self.register)
         for node in res:
             if node is not None:
@@ -15,3 +15,13 @@ class ParserRollback(Error):
 
 class ExpanderError(Error):
     """ Error when expanding. Either internal problem with expander, or expander not found """
+
+class UnsupportedInEventMode(Error):
+    """ Builder operation changing already reported nodes (see events.EventBuilder) """
+
+class LimitExceeded(Error):
+    """ Parsing exceeded one of limits set (see limits.Limits) """
+    def __init__(self, limit, value):
+        Error.__init__(self, "Limit of %s exceeded: %s" % (limit, value))
+        self.limit = limit
+        self.value = value
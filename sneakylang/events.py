@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+""" Event-driven (SAX-like) parsing.
+
+EventBuilder could be passed to parse() instead of TreeBuilder. Instead of
+building tree, it reports start of node, text and end of node to handler,
+so nodes could be garbage-collected as soon as they're reported.
+"""
+
+from err import UnsupportedInEventMode
+from node import TextNode
+from parser import parse
+from treebuilder import TreeBuilder
+
+__all__ = ['ContentHandler', 'EventBuilder', 'TreeBuildingHandler', 'parse_events']
+
+class ContentHandler(object):
+    """ Receives parsing events. Subclass this one to make real handler """
+
+    def start_node(self, node):
+        pass
+
+    def text(self, content):
+        pass
+
+    def end_node(self, node):
+        pass
+
+
+class EventBuilder(object):
+    """ Builder reporting events to handler instead of building the tree.
+    Nodes inserted by insert() are reported at current position, as events
+    already reported cannot be reordered. Hooks and macros which replace
+    nodes or move actual node elsewhere are not supported, replace() and
+    set_actual_node() raise UnsupportedInEventMode.
+    """
+    def __init__(self, handler):
+        self.handler = handler
+        self.root = None
+        # stack of opened nodes
+        self._opened = []
+        # text node is reported when it's closed, as parser is filling it
+        # even after appending
+        self._text_node = None
+        # (MacroScanner, start, end) of macro being expanded, see parse()
+        self.scanner_hint = None
+        # number of nodes reported, checked by limits
+        self.node_count = 0
+        # LimitGuard of parsing in progress, see limits.py
+        self.limit_guard = None
+
+    def _flush_text(self):
+        if self._text_node is not None:
+            if self._text_node.content:
+                self.handler.text(self._text_node.content)
+            self._text_node = None
+
+    def _require_root(self):
+        if self.root is None:
+            raise ValueError("For this operation, root for treebuilder must be set")
+
+    def set_root(self, node):
+        self.root = node
+        self._opened = [node]
+        self.handler.start_node(node)
+
+    def append(self, node, move_actual=True):
+        self._require_root()
+        self._flush_text()
+        self.node_count += 1
+        if isinstance(node, TextNode):
+            self._text_node = node
+        elif move_actual is True:
+            self.handler.start_node(node)
+            self._opened.append(node)
+        else:
+            self.handler.start_node(node)
+            self.handler.end_node(node)
+
+    add_child = append
+
+    def insert(self, node, index, move_actual=True):
+        self.append(node, move_actual)
+
+    def add_childs(self, nodes, move_actual=True):
+        assert len(nodes) > 0
+        for node in nodes[:-1]:
+            self.append(node, move_actual=False)
+        self.append(nodes[-1], move_actual)
+
+    def move_up(self):
+        self._require_root()
+        if len(self._opened) < 2:
+            raise ValueError('Cannot move up as there is no parent of current node')
+        self._flush_text()
+        self.handler.end_node(self._opened.pop())
+
+    def close_text(self):
+        self._flush_text()
+
+    def replace(self, node):
+        raise UnsupportedInEventMode('Reported nodes cannot be replaced')
+
+    def set_actual_node(self, node):
+        if node is not self.actual_node:
+            raise UnsupportedInEventMode('Actual node cannot be changed when reporting events')
+
+    def close(self):
+        """ Report end of all opened nodes """
+        self._flush_text()
+        while self._opened:
+            self.handler.end_node(self._opened.pop())
+
+    def get_actual_node(self):
+        if self._opened:
+            return self._opened[-1]
+        return None
+
+    actual_node = property(fget=get_actual_node)
+
+
+class TreeBuildingHandler(ContentHandler):
+    """ Rebuild tree from events """
+    def __init__(self, builder=None):
+        if builder is None:
+            builder = TreeBuilder()
+        self.builder = builder
+
+    def start_node(self, node):
+        if self.builder.root is None:
+            self.builder.set_root(node)
+        else:
+            self.builder.append(node)
+
+    def text(self, content):
+        self.builder.append(TextNode(content=content), move_actual=False)
+
+    def end_node(self, node):
+        if node is not self.builder.root:
+            self.builder.move_up()
+
+    def get_root(self):
+        return self.builder.root
+
+    root = property(fget=get_root)
+
+
+def parse_events(stream, register_map, handler, **kwargs):
+    """ Parse stream reporting events to handler. Other arguments are same as for parse() """
+    builder = EventBuilder(handler)
+    parse(stream, register_map, builder=builder, document_root=True, **kwargs)
+    builder.close()
@@ -3,24 +3,82 @@
 """ Expanders for nodes
 """
 
-from cgi import escape
 from err import *
 
-__all__ = ['Expander', 'TextNodeExpander', 'expand']
+__all__ = ['Expander', 'TextNodeExpander', 'escape', 'expand']
+
+def escape(s, quote=False):
+    """ Replace special characters &, < and > to HTML-safe sequences.
+    If quote is true, quotation mark is also translated.
+    Same as cgi.escape, which is not imported as cgi module is slow to import """
+    # most of text has nothing to escape; membership tests are cheaper than
+    # replace() calls (and much cheaper than unicode.translate())
+    if u'&' in s:
+        s = s.replace(u'&', u'&amp;')
+    if u'<' in s:
+        s = s.replace(u'<', u'&lt;')
+    if u'>' in s:
+        s = s.replace(u'>', u'&gt;')
+    if quote and u'"' in s:
+        s = s.replace(u'"', u'&quot;')
+    return s
 
 class Expander(object):
+    # if True, runs of adjacent nodes using this expander are passed
+    # to expand_run() at once instead of calling expand() on each of them
+    batch = False
+
     def expand(self, node, format, node_map):
         pass
 
+    def expand_run(self, nodes, format, node_map):
+        return u''.join([self.expand(node, format, node_map) for node in nodes])
+
 class TextNodeExpander(Expander):
-    def expand(self, node, *args, **kwargs):
-        return escape(node.content)
+    batch = True
+    # formats in which quotation marks must be escaped as well
+    quote_formats = ()
+
+    def expand(self, node, format=None, *args, **kwargs):
+        return escape(node.content, format in self.quote_formats)
+
+    def expand_run(self, nodes, format=None, *args, **kwargs):
+        if self.expand.im_func is not TextNodeExpander.expand.im_func:
+            # subclass overriding expand() must be called for every node
+            return Expander.expand_run(self, nodes, format, *args, **kwargs)
+        return escape(u''.join([node.content for node in nodes]), format in self.quote_formats)
 
 def expand(node_list, format, node_map):
     if type(node_list) != type([]):
         node_list = [node_list]
     try:
-        return u''.join([node_map[format][node.__class__]().expand(node, format, node_map) for node in node_list])
+        expanders = node_map[format]
+        result = []
+        i = 0
+        count = len(node_list)
+        while i < count:
+            node = node_list[i]
+            expander = expanders[node.__class__]
+            if getattr(expander, 'batch', False):
+                end = i + 1
+                while end < count and expanders.get(node_list[end].__class__) is expander:
+                    end += 1
+                if end > i + 1:
+                    result.append(expander().expand_run(node_list[i:end], format, node_map))
+                    i = end
+                    continue
+            if getattr(node, 'fragment', None) is not None:
+                # node created by cacheable macro, output is cached too
+                fragment, index = node.fragment
+                output = fragment.get_output(index, format, node_map)
+                if output is None:
+                    output = expander().expand(node, format, node_map)
+                    fragment.set_output(index, format, node_map, output)
+                result.append(output)
+            else:
+                result.append(expander().expand(node, format, node_map))
+            i += 1
+        return u''.join(result)
     except KeyError:
         if not node_map.has_key(format):
             raise ExpanderError("Format not supported")
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+""" Read-only tree stored in parallel arrays.
+
+FlatTree holds node class ids, parent indices, first child / next sibling
+indices and text offsets in flat arrays instead of linked Node objects.
+Nodes are accessed through lightweight FlatNode views exposing the Node API
+(children, parent, content), so they could be expanded by expand() directly.
+"""
+
+from array import array
+
+from node import TextNode
+
+__all__ = ['FlatNode', 'FlatTree']
+
+# text is looked up in source only this far behind text of previous node
+# (markup between texts is short), so texts not present in source (f.e.
+# rewritten by hooks) don't make whole source searched again and again
+TEXT_SEARCH_WINDOW = 4096
+
+class FlatNode(object):
+    """ View of one node in FlatTree """
+    __slots__ = ('tree', 'index')
+
+    def __init__(self, tree, index):
+        self.tree = tree
+        self.index = index
+
+    def _get_node_class(self):
+        return self.tree.classes[self.tree.node_class[self.index]]
+
+    # view pretends to be instance of node class it represents,
+    # so expanders are looked up (and isinstance works) as for real nodes
+    __class__ = property(fget=_get_node_class)
+
+    def _get_children(self):
+        tree = self.tree
+        children = []
+        child = tree.first_child[self.index]
+        while child != -1:
+            children.append(FlatNode(tree, child))
+            child = tree.next_sibling[child]
+        return children
+
+    children = property(fget=_get_children)
+
+    def _get_parent(self):
+        parent = self.tree.parent[self.index]
+        if parent == -1:
+            return None
+        return FlatNode(self.tree, parent)
+
+    parent = property(fget=_get_parent)
+
+    def _get_content(self):
+        return self.tree.get_text(self.index)
+
+    content = property(fget=_get_content)
+
+    def __getattr__(self, name):
+        try:
+            return self.tree.extras[self.index][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __eq__(self, other):
+        return type(other) is FlatNode and self.tree is other.tree and self.index == other.index
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self.tree), self.index))
+
+
+class FlatTree(object):
+    """ Tree stored in parallel arrays, indexed by node position in document order """
+
+    def __init__(self):
+        self.classes = []
+        self.node_class = array('i')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        # text is slice [text_start:text_end] of source; text not found in source
+        # is kept in strings, text_start is then -(index+1)
+        self.text_start = array('i')
+        self.text_end = array('i')
+        self.source = u''
+        self.strings = []
+        # node index : {attribute : value} for extra_attributes of node classes
+        self.extras = {}
+        self.node_list = False
+
+    def __len__(self):
+        return len(self.node_class)
+
+    @classmethod
+    def from_node(cls, tree, source=None):
+        """ Create FlatTree from node or list of nodes (as returned by parse()).
+        If source is given, text offsets are pointing to it where possible
+        """
+        flat = cls()
+        if isinstance(tree, list):
+            flat.node_list = True
+            roots = tree
+        else:
+            roots = [tree]
+
+        if source is not None:
+            flat.source = source
+        cursor = 0
+
+        class_ids = {}
+        last_child = {}
+        # stack of (node, parent index)
+        stack = [(node, -1) for node in reversed(roots)]
+        previous_root = -1
+        while stack:
+            node, parent = stack.pop()
+            index = len(flat.node_class)
+            node_cls = node.__class__
+
+            class_id = class_ids.get(node_cls)
+            if class_id is None:
+                class_id = class_ids[node_cls] = len(flat.classes)
+                flat.classes.append(node_cls)
+
+            flat.node_class.append(class_id)
+            flat.parent.append(parent)
+            flat.first_child.append(-1)
+            flat.next_sibling.append(-1)
+
+            if parent == -1:
+                if previous_root != -1:
+                    flat.next_sibling[previous_root] = index
+                previous_root = index
+            elif last_child.get(parent, -1) == -1:
+                flat.first_child[parent] = index
+            else:
+                flat.next_sibling[last_child[parent]] = index
+            last_child[parent] = index
+
+            if isinstance(node, TextNode):
+                content = node.content
+                start = -1
+                if source is not None:
+                    start = source.find(content, cursor, cursor + len(content) + TEXT_SEARCH_WINDOW)
+                if start != -1:
+                    cursor = start + len(content)
+                    flat.text_start.append(start)
+                    flat.text_end.append(cursor)
+                else:
+                    flat.strings.append(content)
+                    flat.text_start.append(-len(flat.strings))
+                    flat.text_end.append(0)
+            else:
+                flat.text_start.append(0)
+                flat.text_end.append(0)
+
+            if node_cls.extra_attributes:
+                flat.extras[index] = dict([(attr, getattr(node, attr, None)) for attr in node_cls.extra_attributes])
+
+            stack.extend([(child, index) for child in reversed(node.children)])
+
+        return flat
+
+    def get_text(self, index):
+        start = self.text_start[index]
+        if start < 0:
+            return self.strings[-start-1]
+        return self.source[start:self.text_end[index]]
+
+    def get_root(self):
+        """ Return view of root node, or list of views if tree was created from node list """
+        if len(self) == 0:
+            if self.node_list:
+                return []
+            return None
+        root = FlatNode(self, 0)
+        if not self.node_list:
+            return root
+        roots = [root]
+        index = self.next_sibling[0]
+        while index != -1:
+            roots.append(FlatNode(self, index))
+            index = self.next_sibling[index]
+        return roots
+
+    root = property(fget=get_root)
+
+    def to_node(self):
+        """ Convert back to linked Node/TextNode graph """
+        nodes = []
+        roots = []
+        for index in xrange(len(self)):
+            node_cls = self.classes[self.node_class[index]]
+            node = node_cls.__new__(node_cls)
+            node.__dict__.update({
+                'children' : [],
+                'actual_text_content' : None,
+                'last_added_child' : None,
+                'parent' : None,
+            })
+            if isinstance(node, TextNode):
+                node.content = self.get_text(index)
+            if index in self.extras:
+                for attr, value in self.extras[index].items():
+                    setattr(node, attr, value)
+            nodes.append(node)
+
+            parent_index = self.parent[index]
+            if parent_index == -1:
+                roots.append(node)
+            else:
+                parent = nodes[parent_index]
+                node.parent = parent
+                parent.children.append(node)
+                parent.last_added_child = node
+                if isinstance(node, TextNode):
+                    parent.actual_text_content = node
+                else:
+                    parent.actual_text_content = None
+
+        if self.node_list:
+            return roots
+        if roots:
+            return roots[0]
+        return None
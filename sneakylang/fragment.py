@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+""" Cache of nodes created by macros and of their expanded output.
+
+Macros which are pure functions of their argument string (and only append
+nodes to actual node) could set cacheable = True. When register_map has
+fragment_cache set, nodes created by such macro are remembered under
+(macro class, argument string, register map, syntax) and next call with
+the same arguments gets copies of them without calling the macro, unless
+limits of parsing (see limits.py) would be exceeded by calling it.
+Expanded output of those nodes is remembered too and reused by expand().
+"""
+
+from collections import OrderedDict
+
+from node import TextNode
+from serialize import dumps, loads
+
+__all__ = ['Fragment', 'FragmentCache']
+
+class Fragment(object):
+    """ Nodes created by one macro call, serialized, with outputs they were expanded to """
+    # RegisterMap of macro call nodes were created by
+    register_map = None
+    # how deeper than macro call parsing went, None if it's not known
+    nesting = None
+
+    def __init__(self, nodes):
+        self.data = dumps(nodes)
+        self.classes = set()
+        # number of nodes, including descendants
+        self.size = 0
+        stack = list(nodes)
+        while stack:
+            node = stack.pop()
+            self.size += 1
+            self.classes.add(node.__class__)
+            stack.extend(node.children)
+        # (index of node, format) : (node_map, output)
+        self.outputs = {}
+
+    def get_nodes(self):
+        """ Return new copy of nodes; those that are not text are marked as coming from fragment """
+        nodes = loads(self.data, self.classes)
+        for index, node in enumerate(nodes):
+            if not isinstance(node, TextNode):
+                node.fragment = (self, index)
+        return nodes
+
+    def get_output(self, index, format, node_map):
+        try:
+            cached_map, output = self.outputs[(index, format)]
+        except KeyError:
+            return None
+        if cached_map is not node_map:
+            return None
+        return output
+
+    def set_output(self, index, format, node_map, output):
+        self.outputs[(index, format)] = (node_map, output)
+
+
+class FragmentCache(object):
+    """ Least recently used fragments, at most max_size of them """
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._fragments = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._fragments)
+
+    def get(self, key):
+        try:
+            fragment = self._fragments.pop(key)
+        except KeyError:
+            self.misses += 1
+            return None
+        self._fragments[key] = fragment
+        self.hits += 1
+        return fragment
+
+    def set(self, key, fragment):
+        self._fragments.pop(key, None)
+        self._fragments[key] = fragment
+        while len(self._fragments) > self.max_size:
+            self._fragments.popitem(last=False)
+
+    def clear(self):
+        self._fragments.clear()
+
+    def _usable(self, fragment, macro, builder, guard):
+        """ Return True if fragment could be used instead of calling macro """
+        if fragment.register_map is not macro.register_map:
+            # other map with the same id, the cached one does not exist anymore
+            return False
+        if guard is None:
+            return True
+        limits = guard.limits
+        if limits.max_depth is not None and (fragment.nesting is None or guard.depth + fragment.nesting > limits.max_depth):
+            return False
+        if limits.max_nodes is not None and builder.node_count + fragment.size > limits.max_nodes:
+            return False
+        return True
+
+    def expand_macro(self, macro, builder, state=None):
+        """ Expand macro into builder, using cached nodes if possible.
+        Nodes are cached for register map and syntax macro was called with.
+        Cached nodes are used only if limits of parsing would not be
+        exceeded by calling macro, so limits apply the same way """
+        key = (macro.__class__, macro.argument_string, id(macro.register_map), macro.syntax)
+        guard = getattr(builder, 'limit_guard', None)
+        fragment = self.get(key)
+        if fragment is not None and not self._usable(fragment, macro, builder, guard):
+            self.hits -= 1
+            self.misses += 1
+            fragment = None
+        if fragment is not None:
+            nodes = fragment.get_nodes()
+            # top level nodes are counted when appended
+            builder.node_count += fragment.size - len(nodes)
+            for node in nodes:
+                builder.append(node, move_actual=False)
+            return
+
+        parent = builder.actual_node
+        if parent.children:
+            last = parent.children[-1]
+        else:
+            last = None
+        if guard is not None:
+            deepest, truncations = guard.deepest, guard.truncations
+            guard.deepest = guard.depth
+
+        # nodes must stay in tree until they're collected
+        builder.held += 1
+        try:
+            macro.expand(builder=builder, state=state)
+        finally:
+            builder.held -= 1
+            if guard is not None:
+                nesting = guard.deepest - guard.depth
+                guard.deepest = max(deepest, guard.deepest)
+
+        if builder.actual_node is not parent:
+            # macro is not only appending nodes, don't cache it
+            return
+        if guard is not None and guard.truncations != truncations:
+            # some content was left as text because of limits
+            return
+        nodes = []
+        for child in reversed(parent.children):
+            if child is last:
+                break
+            nodes.append(child)
+        nodes.reverse()
+        if nodes and parent.last_added_child is not nodes[-1]:
+            # nodes were not appended to the end
+            return
+        try:
+            fragment = Fragment(nodes)
+        except ValueError:
+            # extra attributes of nodes cannot be serialized
+            return
+        fragment.register_map = macro.register_map
+        if guard is not None:
+            fragment.nesting = nesting
+        self.set(key, fragment)
+        for index, node in enumerate(nodes):
+            if not isinstance(node, TextNode):
+                node.fragment = (fragment, index)
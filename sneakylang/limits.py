@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+""" Limits of resources used by parsing untrusted input.
+
+Limits are given to parse() (or set as limits of RegisterMap) and checked
+while parsing: depth of nested parsing, number of nodes created, number of
+macros called, length of macro content scanned and time spent. When any
+limit is exceeded, the rest of input is left as text (or only the content
+which is nested too deep), or LimitExceeded is raised if on_breach is
+BREACH_RAISE.
+"""
+
+import time
+
+from err import LimitExceeded
+
+__all__ = ['BREACH_RAISE', 'BREACH_TEXT', 'LimitGuard', 'Limits']
+
+BREACH_TEXT = 'text'
+BREACH_RAISE = 'raise'
+
+# clock is read only once per this number of checks
+CLOCK_INTERVAL = 64
+
+class Limits(object):
+    """ Limits for one parse() call; None means no limit.
+    max_depth is maximal nesting of parse() called by macros on their content,
+    time_budget is in seconds.
+    """
+    def __init__(self, max_depth=None, max_nodes=None, max_macros=None,
+            max_lookahead=None, time_budget=None, on_breach=BREACH_TEXT):
+        if on_breach not in (BREACH_TEXT, BREACH_RAISE):
+            raise ValueError("on_breach must be %s or %s" % (BREACH_TEXT, BREACH_RAISE))
+        self.max_depth = max_depth
+        self.max_nodes = max_nodes
+        self.max_macros = max_macros
+        self.max_lookahead = max_lookahead
+        self.time_budget = time_budget
+        self.on_breach = on_breach
+
+    def start(self):
+        """ Return new guard counting resources of one parsing """
+        return LimitGuard(self)
+
+
+class LimitGuard(object):
+    """ Resources used by one parsing, checked against limits """
+    def __init__(self, limits):
+        self.limits = limits
+        self.degrade = limits.on_breach == BREACH_TEXT
+        self.depth = 0
+        # the deepest nesting reached
+        self.deepest = 0
+        self.macros = 0
+        self._checks = 0
+        if limits.time_budget is None:
+            self.deadline = None
+        else:
+            self.deadline = time.time() + limits.time_budget
+        # once nodes, macros or time are exhausted, nothing more is parsed
+        self.breach = None
+        # number of times input was left as text because of limits
+        self.truncations = 0
+
+    def _fail(self, limit, value):
+        self.breach = LimitExceeded(limit, value)
+        raise self.breach
+
+    def enter(self):
+        self.depth += 1
+        if self.depth > self.deepest:
+            self.deepest = self.depth
+
+    def leave(self):
+        self.depth -= 1
+
+    def check(self, builder):
+        """ Raise LimitExceeded if any limit is exceeded """
+        if self.breach is not None:
+            raise self.breach
+        limits = self.limits
+        if limits.max_depth is not None and self.depth > limits.max_depth:
+            # only content nested too deep is affected
+            raise LimitExceeded('depth', self.depth)
+        if limits.max_nodes is not None and getattr(builder, 'node_count', 0) > limits.max_nodes:
+            self._fail('nodes', builder.node_count)
+        if self.deadline is not None:
+            self._checks += 1
+            if self._checks % CLOCK_INTERVAL == 0 and time.time() > self.deadline:
+                self._fail('time', limits.time_budget)
+
+    def macro_called(self):
+        self.macros += 1
+        if self.limits.max_macros is not None and self.macros > self.limits.max_macros:
+            self._fail('macros', self.macros)
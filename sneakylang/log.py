@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+""" Debug messages of sneakylang logger.
+
+logging module is not imported by sneakylang: messages are passed to it
+only when it was imported (and possibly configured) by application, as
+they would be dropped by unconfigured logging anyway.
+"""
+
+import sys
+
+__all__ = ['debug']
+
+_logger = None
+
+def debug(message, *args):
+    """ Log message, formatted with args by logging only if it's logged """
+    global _logger
+    if _logger is None:
+        logging = sys.modules.get('logging')
+        if logging is None:
+            return
+        _logger = logging.getLogger('sneakylang')
+    _logger.debug(message, *args)
@@ -1,16 +1,20 @@
 # -*- coding: utf-8 -*-
 """ Macro superclass and default Document and Macro classes """
 
-import logging
-logging = logging.getLogger('sneakylang')
-
 from err import *
+from log import debug
 from macro_caller import parse_macro_arguments
 
 class Macro(object):
     """ All macros should derive from this class """
     name = None # define macro name
     help = "<this macro doesn't have usage example>"
+    # MacroSyntax of register macro was called from, used for parsing arguments
+    syntax = None
+    # True if macro is only appending nodes to actual node and those are
+    # depending only on argument string, so they could be cached (see fragment.py)
+    cacheable = False
+    argument_string = None
 
     def __init__(self, register_map, builder, state=None):
         object.__init__(self)
@@ -23,10 +27,10 @@ class Macro(object):
     def get_argument_list(self, argument_string):
         """ DEPRECATED: Use get_arguments instead.
         Return list of arguments. Uses ARGUMENT_SEPARATOR as argument separator."""
-        return parse_macro_arguments(argument_string)
+        return parse_macro_arguments(argument_string, syntax=self.syntax)
 
     def get_arguments(self, argument_string):
-        return parse_macro_arguments(argument_string, return_kwargs=True)
+        return parse_macro_arguments(argument_string, return_kwargs=True, syntax=self.syntax)
 
     def parse_argument_string(self, argument_string):
         if argument_string is not None and argument_string not in (u'', ''):
@@ -41,6 +45,8 @@ class Macro(object):
         returns properly istantiazed macro, ready call expand() function """
         assert type(argument_string) in (type(None), type(''), type(u'')), u"Bad argument_string type %s (content: %s)" % (type(argument_string), argument_string)
         macro_instance = cls(register.register_map, builder, state)
+        macro_instance.syntax = getattr(register, 'syntax', None)
+        macro_instance.argument_string = argument_string
         macro_instance.parse_argument_string(argument_string)
         return macro_instance
 
@@ -48,13 +54,20 @@ class Macro(object):
         try:
             return self.expand_to_nodes(*self.arguments, **self.keyword_arguments)
         except TypeError, err:
-            logging.debug("Error while calling macro %s: %s" % (self.__class__, err))
+            debug("Error while calling macro %s: %s", self.__class__, err)
             raise MacroCallError(err)
 
     def expand_to_nodes(self, *args, **kwargs):
         """ Macro with arguments resolved; macro should expand themselves to Nodes and append to DOM """
         raise NotImplementedError()
 
+    def append_pending(self, fetch, build, fallback=None):
+        """ Append placeholder for nodes to be built when data are fetched, see pending.py """
+        from pending import PendingNode
+        node = PendingNode(fetch, build, fallback)
+        self.builder.append(node, move_actual=False)
+        return node
+
     def _get_register(self):
         """ Property function, use .register attribute instead """
         if self.register_map.has_key(self.__class__):
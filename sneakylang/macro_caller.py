@@ -10,7 +10,7 @@ implementation and should be as forward-compatible as possible.
 """
 
 
-import logging
+import re
 
 from err import *
 
@@ -39,26 +39,245 @@ MACRO_END = u'))'
 # ))
 ALLOW_MULTILINE_MACRO = False
 
+# How far (in characters) end of multiline macro is searched for, so
+# unfinished macro does not cause scanning of whole document. None for no limit
+MAX_MACRO_LOOKAHEAD = 64 * 1024
+
 LONG_ARGUMENT_BEGIN = u'"'
 LONG_ARGUMENT_END = u'"'
 
-def parse_macro_arguments(argument_string, return_kwargs=False):
-    if not argument_string:
-        return None
+# argument string grammars for syntaxes, built on first use as importing pyparsing is slow
+_argument_parsers = {}
+
+def get_argument_parser(syntax=None):
+    """ Return pyparsing grammar for argument strings """
+    if syntax is None:
+        syntax = get_default_syntax()
+    key = (syntax.long_argument_begin, syntax.long_argument_end, syntax.keyword_argument_separator, syntax.nested_macro_pattern)
+    try:
+        return _argument_parsers[key]
+    except KeyError:
+        pass
 
-    import re
     from pyparsing import Group, Or, QuotedString, Regex, Suppress, ZeroOrMore
 
+    long_argument = QuotedString(syntax.long_argument_begin, endQuoteChar=syntax.long_argument_end)
+    if isinstance(syntax.macro_begin, basestring):
+        nested_macro = _nested_macro_element(syntax)
+    else:
+        nested_macro = Regex(syntax.nested_macro_pattern, flags=re.UNICODE)
     # General argument string parser
-    argstring_def = ZeroOrMore(Or([ \
-        QuotedString('"'),                          # long arguments
+    argument_parser = ZeroOrMore(Or([ \
+        long_argument,                              # long arguments
         Group(Regex('[\w]+', flags=re.UNICODE) +    # keyword arguments
-          Suppress('=').leaveWhitespace() +
-          Or([Regex('[\w]+'), QuotedString('"')])),
-        Regex(r'\(\(.*\)\)', flags=re.UNICODE),     # nested macros
+          Suppress(syntax.keyword_argument_separator).leaveWhitespace() +
+          Or([Regex('[\w]+'), long_argument])),
+        nested_macro,                               # nested macros
         Regex('[\S]+', flags=re.UNICODE)            # basic arguments
     ]))
-    args = argstring_def.parseString(argument_string).asList()
+    _argument_parsers[key] = argument_parser
+    return argument_parser
+
+def _nested_macro_element(syntax):
+    """ Return pyparsing element matching the same as nested_macro_pattern:
+    MACRO_BEGIN and everything up to the last MACRO_END on the line.
+    Unlike the regexp, it's not scanning rest of the line again for every
+    argument that is not nested macro, as the last MACRO_END of every line
+    is found once for whole argument string """
+    from bisect import bisect_left
+    from pyparsing import ParseException, Token
+
+    begin, end = syntax.macro_begin, syntax.macro_end
+
+    class NestedMacro(Token):
+        def __init__(self):
+            Token.__init__(self)
+            self.name = 'nested macro'
+            self.errmsg = 'Expected ' + self.name
+            self.mayReturnEmpty = False
+            self.mayIndexError = False
+            # (argument string, ends of its lines, last MACRO_END in those lines)
+            self._lines = (None, None, None)
+
+        def _get_lines(self, instring):
+            lines = self._lines
+            if lines[0] is not instring:
+                line_ends = []
+                last_ends = []
+                start = 0
+                while True:
+                    line_end = instring.find(u'\n', start)
+                    if line_end == -1:
+                        line_end = len(instring)
+                    line_ends.append(line_end)
+                    last_ends.append(instring.rfind(end, start, line_end))
+                    if line_end == len(instring):
+                        break
+                    start = line_end + 1
+                lines = (instring, line_ends, last_ends)
+                self._lines = lines
+            return lines
+
+        def parseImpl(self, instring, loc, doActions=True):
+            if instring.startswith(begin, loc):
+                unused, line_ends, last_ends = self._get_lines(instring)
+                last_end = last_ends[bisect_left(line_ends, loc)]
+                if last_end >= loc + len(begin):
+                    position = last_end + len(end)
+                    return position, instring[loc:position]
+            raise ParseException(instring, loc, self.errmsg, self)
+
+    return NestedMacro()
+
+# used as default value of MacroSyntax arguments, value is then taken from module constants
+_MODULE_DEFAULT = object()
+
+class MacroSyntax(object):
+    """ Syntax of macro calls ((macro_name argument argument)).
+
+    Arguments not given are taken from module constants. Syntax is compiled
+    into matchers when created, so one instance should be used for all parsing
+    (set it as syntax of Register or RegisterMap).
+    """
+    def __init__(self, macro_begin=_MODULE_DEFAULT, macro_end=_MODULE_DEFAULT,
+            name_argument_separator=_MODULE_DEFAULT, long_argument_begin=_MODULE_DEFAULT,
+            long_argument_end=_MODULE_DEFAULT, keyword_argument_separator=_MODULE_DEFAULT,
+            allow_multiline=_MODULE_DEFAULT, max_lookahead=_MODULE_DEFAULT):
+
+        def value(argument, default):
+            if argument is _MODULE_DEFAULT:
+                return default
+            return argument
+
+        self.macro_begin = value(macro_begin, MACRO_BEGIN)
+        self.macro_end = value(macro_end, MACRO_END)
+        self.name_argument_separator = value(name_argument_separator, MACRO_NAME_ARGUMENT_SEPARATOR)
+        self.long_argument_begin = value(long_argument_begin, LONG_ARGUMENT_BEGIN)
+        self.long_argument_end = value(long_argument_end, LONG_ARGUMENT_END)
+        self.keyword_argument_separator = value(keyword_argument_separator, KEYWORD_ARGUMENT_SEPARATOR)
+        self.allow_multiline = value(allow_multiline, ALLOW_MULTILINE_MACRO)
+        self.max_lookahead = value(max_lookahead, MAX_MACRO_LOOKAHEAD)
+
+        self.settings = (self.macro_begin, self.macro_end, self.name_argument_separator,
+            self.long_argument_begin, self.long_argument_end, self.keyword_argument_separator,
+            self.allow_multiline, self.max_lookahead)
+
+        for delimiter in (self.macro_end, self.name_argument_separator, self.long_argument_begin, self.long_argument_end):
+            if not isinstance(delimiter, basestring):
+                raise NotImplementedError('Only MACRO_BEGIN could be regular expression, other delimiters must be strings')
+
+        if isinstance(self.macro_begin, basestring):
+            begin_pattern = re.escape(self.macro_begin)
+            self.begin_end = self._string_begin_end
+        else:
+            # compiled regular expression; it's matched on given position, so ^ is not needed
+            begin_pattern = self.macro_begin.pattern
+            if begin_pattern.startswith('^'):
+                begin_pattern = begin_pattern[1:]
+            self._begin_re = re.compile(begin_pattern, self.macro_begin.flags)
+            self.begin_end = self._regexp_begin_end
+        # pattern (and its flags) matching MACRO_BEGIN at given position
+        self.begin_pattern = begin_pattern
+        self.begin_flags = getattr(self.macro_begin, 'flags', 0)
+
+        # pattern matching nested macro in argument string
+        self.nested_macro_pattern = u'%s.*%s' % (begin_pattern, re.escape(self.macro_end))
+        # positions where scanning of macro content must stop and look around
+        self.delimiters = re.compile(u'|'.join([begin_pattern, re.escape(self.macro_end), re.escape(self.long_argument_begin)]), re.UNICODE)
+
+        if self.allow_multiline and self.name_argument_separator.isspace():
+            # arguments of multiline macro could begin on next line
+            self._name_separator = re.compile(u'\n|%s' % re.escape(self.name_argument_separator), re.UNICODE)
+        else:
+            self._name_separator = None
+
+        # name of macro ends with separator, MACRO_END or line break
+        # (line break ends name of multiline macro, but not single-line one)
+        if self.allow_multiline:
+            line_break = u'(?P<line_break>)\n'
+        else:
+            line_break = u'(?P<line_break>%s)' % _LINE_BREAK
+        self._name_end = re.compile(u'|'.join([re.escape(self.name_argument_separator), re.escape(self.macro_end), line_break]), re.UNICODE)
+        self._name_end_length = max(len(self.name_argument_separator), len(self.macro_end), 1)
+        # name containing these could be ended elsewhere, as they're skipped when scanning content
+        self._skipped = re.compile(u'|'.join([begin_pattern, re.escape(self.long_argument_begin)]), re.UNICODE)
+
+    def _string_begin_end(self, source, position, bound):
+        if source.startswith(self.macro_begin, position, bound):
+            return position + len(self.macro_begin)
+        return -1
+
+    def _regexp_begin_end(self, source, position, bound):
+        match = self._begin_re.match(source, position, bound)
+        if match is None or match.end() == position:
+            return -1
+        return match.end()
+
+    def find_name(self, source, start, bound, max_length=None):
+        """ Return name of macro which content begins at start, without resolving
+        where content ends. Return None if there is no name of at most max_length
+        characters or if content could not be ended (name not ended on the line).
+        Name is the same as split_name() returns for content if is_plain_name(name)
+        """
+        if max_length is not None:
+            bound = min(bound, start + max_length + self._name_end_length)
+        match = self._name_end.search(source, start, bound)
+        if match is None:
+            return None
+        if max_length is not None and match.start() - start > max_length:
+            return None
+        if match.group('line_break') is not None and not self.allow_multiline:
+            return None
+        return source[start:match.start()]
+
+    def is_plain_name(self, name):
+        """ Return False if name found by find_name() could be different from
+        one in content, because it contains (the beginning of) something skipped
+        when scanning for end of content """
+        return self._skipped.search(name) is None
+
+    def split_name(self, content):
+        """ Return tuple(macro_name, string_with_macro_arguments) """
+        if self._name_separator is not None and u'\n' in content:
+            res = self._name_separator.split(content, 1)
+            if len(res) == 1:
+                return (res[0], None)
+            return (res[0], res[1])
+
+        # if name_argument separator not in stream, then no argument given - return whole string
+        # Please report other use-cases as bug
+        index = content.find(self.name_argument_separator)
+        if index == -1:
+            return (content, None)
+        return (content[0:index], content[index+len(self.name_argument_separator):])
+
+_default_syntax = None
+
+def get_default_syntax():
+    """ Return MacroSyntax given by module constants """
+    global _default_syntax
+    settings = (MACRO_BEGIN, MACRO_END, MACRO_NAME_ARGUMENT_SEPARATOR,
+        LONG_ARGUMENT_BEGIN, LONG_ARGUMENT_END, KEYWORD_ARGUMENT_SEPARATOR,
+        ALLOW_MULTILINE_MACRO, MAX_MACRO_LOOKAHEAD)
+    if _default_syntax is None or _default_syntax.settings != settings:
+        _default_syntax = MacroSyntax(*settings)
+    return _default_syntax
+
+def _get_syntax(syntax=None, scanner=None, register=None):
+    if syntax is not None:
+        return syntax
+    if scanner is not None:
+        return scanner.syntax
+    syntax = getattr(register, 'syntax', None)
+    if syntax is not None:
+        return syntax
+    return get_default_syntax()
+
+def parse_macro_arguments(argument_string, return_kwargs=False, syntax=None):
+    if not argument_string:
+        return None
+
+    args = get_argument_parser(syntax).parseString(argument_string).asList()
 
     # The keyword arguments are stored as lists in the `args' variable,
     # extract them and convert them into a dict, then return
@@ -71,22 +290,12 @@ def parse_macro_arguments(argument_string, return_kwargs=False):
         return args, kwargs
     return args
 
-def resolve_macro_name(stream):
+def resolve_macro_name(stream, syntax=None):
     """ Resolve macro name. Return tuple(macro_name, string_with_macro_arguments) """
-    if isinstance(MACRO_NAME_ARGUMENT_SEPARATOR, str) or isinstance(MACRO_NAME_ARGUMENT_SEPARATOR, unicode):
-        # if name_argument separator not in stream, then no argument given - return whole string
-        # Please report other use-cases as bug
-        res = stream.split(MACRO_NAME_ARGUMENT_SEPARATOR)
-        if len(res) == 1:
-            return (res[0], None)
-        else:
-#            return (res[0], parse_macro_arguments(stream[len(res[0]):]))
-            return (res[0], stream[len(res[0])+len(MACRO_NAME_ARGUMENT_SEPARATOR):])
-    else:
-        raise NotImplementedError, 'MACRO_NAME_ARGUMENT_SEPARATOR must be string, other types like regexp are not yet supported'
+    return _get_syntax(syntax).split_name(stream)
 
-def resolve_name_from_register(stream, register):
-    name = resolve_macro_name(stream)[0]
+def resolve_name_from_register(stream, register, syntax=None):
+    name = resolve_macro_name(stream, _get_syntax(syntax, register=register))[0]
     # if name is None, it's not resolved in name_map, so explicit check not needed
     if name in register.macro_map:
         return name
@@ -112,110 +321,346 @@ def move_chars(chunk, strfrom, strto):
     return (strfrom, strto)
 
 
-def get_nested_macro_chunk(line):
-    if line.startswith(MACRO_BEGIN) and MACRO_END in line:
-        buffer = ''
-        orig_line = line
-        line, buffer = move_chars(line[0:len(MACRO_BEGIN)], line, buffer)
-        while len(line) > 0:
-            if line.startswith(LONG_ARGUMENT_BEGIN):
-                line, buffer = strip_long_argument_chunk(line, buffer)
-            if line.startswith(MACRO_BEGIN):
-                nested_chunk = get_nested_macro_chunk(line)
-                if nested_chunk is not None:
-                    try:
-                        line, buffer = move_chars(line[:len(nested_chunk)], line, buffer)
-                    except ValueError:
-                        # There are some rare cases where `line' doesn't start with
-                        # the generated `chunk' (and thus a ValueError is raised).
-                        # Merely ignoring the error seems to work.
-                        pass
-            if line.startswith(MACRO_END):
-                line, buffer = move_chars(line[0:len(MACRO_END)], line, buffer)
-                return buffer
-
-            line, buffer = move_chars(line[0], line, buffer)
-
-        # parsed line with no result
-        return None
+# line breaks as recognized by unicode.splitlines(); compiled (and cached
+# by re) on first use, as compiling non-latin1 characters is slow
+_LINE_BREAK = u'[\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]'
+_STR_LINE_BREAK = '[\n\r]'
 
-    else:
-        return line
+class MacroScanner(object):
+    """ Finds where macros end in source.
 
-def get_content(stream):
-    """ Return content of macro or None if proper end not resolved """
-    if not ALLOW_MULTILINE_MACRO:
-        #FIXME: (?) allow regexp macro_end...?
-        this_line = stream.splitlines()[0]
-        if MACRO_END not in this_line:
+    Source is scanned as content of macro is: long arguments and nested
+    macros are skipped and first MACRO_END on the same level ends the content.
+    Content ends with line, or (for multiline macros) anywhere in source.
+
+    Results are remembered for every position scanned, so no part of
+    source is scanned twice, no matter how many times and from which
+    nesting level it's asked. Scanner for macro content, which is parsed
+    again by macro, could share those results (see sub_scanner()).
+
+    Positions are relative to the beginning of scanned text.
+    """
+
+    def __init__(self, source, offset=0, length=None, parent=None, syntax=None):
+        if parent is not None:
+            self.source = parent.source
+            self.syntax = parent.syntax
+            self._scans = parent._scans
+            self._bounded_scans = parent._bounded_scans
+            self._finds = parent._finds
+            self._line_break = parent._line_break
+            self.lookahead = parent.lookahead
+        else:
+            self.source = source
+            self.syntax = _get_syntax(syntax)
+            # absolute position : (result, reach) of scans not depending on bound
+            self._scans = {}
+            # bound : {absolute position : result} of scans which reached the bound
+            self._bounded_scans = {}
+            # (needle, bound) : (from, found) of last find of needle
+            self._finds = {}
+            if isinstance(source, unicode):
+                self._line_break = re.compile(_LINE_BREAK, re.UNICODE)
+            else:
+                self._line_break = re.compile(_STR_LINE_BREAK)
+            # maximal length of macro content, None for no limit (see limits.Limits)
+            self.lookahead = None
+
+        self.offset = offset
+        if length is None:
+            length = len(self.source) - offset
+        self.end = offset + length
+        self._line_end = (-1, -1)
+
+    def __len__(self):
+        return self.end - self.offset
+
+    def sub_scanner(self, text, start=0, end=None):
+        """ Return scanner for text, which is part of scanned source
+        somewhere between start and end, or None if it's not there """
+        if end is None:
+            end = len(self)
+        end = min(self.offset + end, self.end)
+        position = self.source.find(text, self.offset + start, end)
+        if position == -1:
             return None
+        return MacroScanner(None, position, len(text), parent=self)
+
+    def get_text(self, start, end):
+        return self.source[self.offset+start:self.offset+end]
+
+    def _find(self, needle, position, bound):
+        """ source.find(needle, position, bound), but subsequent finds
+        from greater positions are not scanning source again """
+        key = (needle, bound)
+        cached = self._finds.get(key)
+        if cached is not None and cached[0] <= position and (cached[1] == -1 or position <= cached[1]):
+            return cached[1]
+        found = self.source.find(needle, position, bound)
+        self._finds[key] = (position, found)
+        return found
+
+    def line_end(self, position):
+        """ Return (absolute) end of line containing absolute position """
+        start, end = self._line_end
+        if start <= position <= end:
+            return end
+        match = self._line_break.search(self.source, position, self.end)
+        if match is None:
+            end = self.end
+        else:
+            end = match.start()
+        self._line_end = (position, end)
+        return end
+
+    def _cached_scan(self, position, bound):
+        cached = self._scans.get(position)
+        if cached is not None and cached[1] <= bound:
+            return (cached[0], cached[1], False)
+        bounded = self._bounded_scans.get(bound)
+        if bounded is not None and position in bounded:
+            return (bounded[position], bound, True)
+        return None
 
-        buffer = ''
-        line = this_line
-        while len(line) > 0:
-            if line.startswith(LONG_ARGUMENT_BEGIN):
-                line, buffer = strip_long_argument_chunk(line, buffer)
-            if line.startswith(MACRO_BEGIN):
-                nested_chunk = get_nested_macro_chunk(line)
-                if nested_chunk is not None:
-                    line, buffer = move_chars(line[0:len(nested_chunk)], line, buffer)
-            if line.startswith(MACRO_END):
-                # we're not appending content because our MACRO_END is in stream,
-                # but we won't include it as content
-                return buffer
+    def _remember_scan(self, positions, result, reach, hit, bound):
+        if hit:
+            scans = self._bounded_scans.setdefault(bound, {})
+            for position in positions:
+                scans[position] = result
+        else:
+            entry = (result, reach)
+            for position in positions:
+                self._scans[position] = entry
+
+    def scan(self, start, bound):
+        """ Scan from absolute position start to bound, skipping long arguments
+        and nested macros. Return absolute position of MACRO_END found on the
+        same level, or None.
+
+        Nested macros are resolved using explicit stack instead of recursion,
+        so deep nesting cannot exceed recursion limit. """
+        source = self.source
+        syntax = self.syntax
+        begin_end, delimiters = syntax.begin_end, syntax.delimiters
+        end = syntax.macro_end
+        long_begin, long_end = syntax.long_argument_begin, syntax.long_argument_end
+
+        # frame is [position, scanned positions, reach, hit, position of nested macro]
+        # reach is end of inspected part of source, hit is True when result
+        # depends on bound (something was not found before it)
+        stack = [[start, [], start, False, None]]
+        while True:
+            frame = stack[-1]
+            result = None
+            finished = False
+
+            if frame[4] is None:
+                position = frame[0]
+                if position >= bound:
+                    frame[3] = True
+                    finished = True
+                else:
+                    cached = self._cached_scan(position, bound)
+                    if cached is not None:
+                        result = cached[0]
+                        frame[2] = max(frame[2], cached[1])
+                        frame[3] = frame[3] or cached[2]
+                        finished = True
+
+                if not finished:
+                    frame[1].append(position)
+                    if source.startswith(long_begin, position, bound):
+                        quote_end = self._find(long_end, position+len(long_begin), bound)
+                        if quote_end == -1:
+                            frame[3] = True
+                        else:
+                            position = quote_end + len(long_end)
+                            frame[2] = max(frame[2], position)
+                    content_start = begin_end(source, position, bound)
+                    if content_start != -1:
+                        macro_end = self._find(end, content_start, bound)
+                        if macro_end == -1:
+                            # no end at all, skip rest
+                            frame[3] = True
+                            position = bound
+                        else:
+                            frame[2] = max(frame[2], macro_end+len(end))
+                            frame[0] = position
+                            frame[4] = position
+                            stack.append([content_start, [], content_start, False, None])
+                            continue
+                    frame[0] = position
+
+            else:
+                # nested macro resolved, skipped if it has end
+                position = frame[0]
+                frame[4] = None
+
+            if not finished:
+                if source.startswith(end, position, bound):
+                    result = position
+                    frame[2] = max(frame[2], position+len(end))
+                    finished = True
+                else:
+                    if position + len(end) > bound:
+                        frame[3] = True
+                    if position < bound:
+                        # skip to next possible delimiter
+                        match = delimiters.search(source, position+1, bound)
+                        if match is None:
+                            position = bound
+                        else:
+                            position = match.start()
+                    frame[0] = position
+                    frame[2] = max(frame[2], position)
+                    continue
+
+            self._remember_scan(frame[1], result, frame[2], frame[3], bound)
+            stack.pop()
+            if not stack:
+                return result
+            parent = stack[-1]
+            parent[2] = max(parent[2], frame[2])
+            parent[3] = parent[3] or frame[3]
+            if result is not None:
+                parent[0] = result + len(end)
+
+    def content_end(self, position, multiline=False, lookahead=None):
+        """ Return position of MACRO_END ending content of macro beginning
+        at position, or None if content is not ended on the same line.
+        If multiline is True, content could span more lines. If lookahead
+        is given, content must end within lookahead characters """
+        start = self.offset + position
+        end_delimiter = self.syntax.macro_end
+        if not multiline:
+            bound = self.line_end(start)
+        else:
+            bound = self.end
+        limited = lookahead is not None and start + lookahead < bound
+        if limited:
+            # bound is rounded, so scans from near positions share results
+            bound = min(bound, (start // lookahead + 2) * lookahead)
 
-            if line:
-                line, buffer = move_chars(line[0], line, buffer)
+        if self._find(end_delimiter, start, bound) == -1:
+            return None
+        end = self.scan(start, bound)
+        if end is None:
+            if multiline or limited:
+                return None
+            # MACRO_END was skipped as part of nested macro or long argument,
+            # whole line is taken as content
+            end = bound
+        elif lookahead is not None and end - start > lookahead:
+            return None
+        return end - self.offset
 
-        return buffer
+    def get_content(self, position, multiline=False, lookahead=None):
+        """ Return content of macro beginning at position, or None """
+        end = self.content_end(position, multiline, lookahead)
+        if end is None:
+            return None
+        return self.get_text(position, end)
 
 
+def get_nested_macro_chunk(line, syntax=None):
+    syntax = _get_syntax(syntax)
+    if syntax.begin_end(line, 0, len(line)) != -1 and syntax.macro_end in line:
+        scanner = MacroScanner(line, syntax=syntax)
+        end = scanner.scan(syntax.begin_end(line, 0, len(line)), len(line))
+        if end is None:
+            # parsed line with no result
+            return None
+        return line[0:end+len(syntax.macro_end)]
     else:
-        raise NotImplementedError, 'Multiline macros not implemented yet'
+        return line
+
+def get_content(stream, scanner=None, position=0, syntax=None):
+    """ Return content of macro or None if proper end not resolved.
+    If scanner is given, stream is its text from position """
+    if scanner is None:
+        scanner = MacroScanner(stream, syntax=syntax)
+        position = 0
+    syntax = scanner.syntax
+    lookahead = scanner.lookahead
+    if not syntax.allow_multiline:
+        return scanner.get_content(position, lookahead=lookahead)
+    else:
+        if lookahead is None or (syntax.max_lookahead is not None and syntax.max_lookahead < lookahead):
+            lookahead = syntax.max_lookahead
+        return scanner.get_content(position, multiline=True, lookahead=lookahead)
 
-def process_resolved_macro(stream, register):
-    macro_content = get_content(stream)
+def process_resolved_macro(stream, register, scanner=None, position=0, syntax=None):
+    macro_content = get_content(stream, scanner, position, syntax)
     if macro_content is None:
         return None
     else:
-        return resolve_name_from_register(macro_content, register)
+        return resolve_name_from_register(macro_content, register, _get_syntax(syntax, scanner, register))
 
-def get_macro_name(stream, register):
+def get_macro_name(stream, register, scanner=None, position=0, syntax=None):
     """ Resolve if stream is beginning with macro.
-    If yes, name is resolved and returned, otherwise function returns None
+    If yes, name is resolved and returned, otherwise function returns None.
+    If scanner is given, stream is its text from position
     """
+    syntax = _get_syntax(syntax, scanner, register)
 
     # first resolve if macro syntax
-    if isinstance(MACRO_BEGIN, str) or isinstance(MACRO_BEGIN, unicode):
-        if not stream.startswith(MACRO_BEGIN):
-            return None
-        else:
-            return process_resolved_macro(stream[len(MACRO_BEGIN):], register)
+    content_start = syntax.begin_end(stream, 0, len(stream))
+    if content_start == -1:
+        return None
 
-    else:
-        # compiled regular expression assumed
-        res = MACRO_BEGIN.search(stream)
-        if res is None:
+    # then check name, before searching for end of macro
+    name = syntax.find_name(stream, content_start, len(stream), getattr(register, 'max_name_length', None))
+    if name is None:
+        return None
+    if syntax.is_plain_name(name):
+        if name not in register.macro_map:
             return None
+        if scanner is None:
+            macro_content = get_content(stream[content_start:], syntax=syntax)
         else:
-            return process_resolved_macro(stream[res.end():], register)
+            macro_content = get_content(None, scanner, position+content_start)
+        if macro_content is None:
+            return None
+        return name
 
-    raise NotImplementedError, 'String not parsed in macro in one of possible MACRO_BEGIN instances, please report this as bug.'
+    # name could be ended elsewhere, resolve it from content
+    if scanner is None:
+        return process_resolved_macro(stream[content_start:], register, syntax=syntax)
+    else:
+        return process_resolved_macro(None, register, scanner, position+content_start)
+
+def could_begin_macro(source, position, register, syntax=None):
+    """ Return False if no macro from register could begin at position of source,
+    checking only beginning of macro and its name (see get_macro_name()) """
+    syntax = _get_syntax(syntax, register=register)
+    if not isinstance(syntax.macro_begin, basestring):
+        # regexp could look behind position, which get_macro_name() does not see
+        return True
+    content_start = syntax.begin_end(source, position, len(source))
+    if content_start == -1:
+        return False
+    name = syntax.find_name(source, content_start, len(source), getattr(register, 'max_name_length', None))
+    if name is None:
+        return False
+    return not syntax.is_plain_name(name) or name in register.macro_map
 
 def call_macro(macro, argument_string, register, builder, state):
     macro.argument_call(argument_string, register, builder, state).expand()
 
-def expand_macro_from_stream(stream, register, builder, state):
+def expand_macro_from_stream(stream, register, builder, state, scanner=None, position=0, syntax=None):
     """ Stream is beginning with properly written macro, create proper macro and return
     return tuple(macro_instance, stripped_stream)
+    If scanner is given, stream is its text from position
     """
-    #FIXME: OMG, get this regexp syntax working
-    if not isinstance(MACRO_BEGIN, unicode) and not isinstance(MACRO_BEGIN, str):
-        raise NotImplementedError('MACRO_BEGIN must be (unicode) string, regular expressions not yet supported')
+    syntax = _get_syntax(syntax, scanner, register)
 
-    macro_content = get_content(stream[len(MACRO_BEGIN):])
+    content_start = syntax.begin_end(stream, 0, len(stream))
+    if scanner is None:
+        macro_content = get_content(stream[content_start:], syntax=syntax)
+    else:
+        macro_content = get_content(None, scanner, position+content_start)
     # assuming macro previously resolved in context
-    name, args = resolve_macro_name(macro_content)
+    name, args = syntax.split_name(macro_content)
     assert type(args) in (type(None), type(''), type(u'')), str(args)
-    new_stream = stream[len(MACRO_BEGIN)+len(macro_content)+len(MACRO_END):]
+    new_stream = stream[content_start+len(macro_content)+len(syntax.macro_end):]
     return (register.macro_map[name].argument_call(args, register, builder, state), new_stream)
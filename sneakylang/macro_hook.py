@@ -5,15 +5,28 @@ Hooks works on same base as SAX events. When macro is encountered in document,
 callback is called on all registered hooks.
 
 Pre- macro hooks are useful for modifying macro arguments or parsed stream.
-Post- macro hooks are useful for rebuilding or inspecting tree
+Post- macro hooks are useful for rebuilding or inspecting tree.
+Batched hooks are also called once after whole document is parsed,
+with all macros they're registered for.
+
+Hook is instantiated once when added to RegisterMap and the instance is
+reused for all macros. Hooks registered for macro class are called for its
+subclasses too, hooks with higher priority first.
 """
 
 class MacroHook(object):
     """ Main MacroHook class. Subclass this one to make real MacroHook """
     macro = None
+    priority = 0
+    # whether post_parse should be called
+    batched = False
 
     def pre_macro(self, stream, macro, tree):
         return stream
 
     def post_macro(self, macro, builder):
         pass
+
+    def post_parse(self, macros, builder):
+        """ Called when parsing is done with list of all macros hook was called for """
+        pass
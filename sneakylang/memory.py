@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+
+""" Memory used by parsed trees and by parsing.
+
+tree_stats() walks the tree and counts nodes by class, text and estimated
+size of node objects (as reported by sys.getsizeof, so only approximately).
+measure_parse() parses stream and reports allocations made by parse(),
+using tracemalloc if it's available (Python 3.4+, or pytracemalloc).
+Without it (f.e. on plain Python 2) measurements are rougher: peak is
+growth of maximal resident size of process (resource.getrusage, Unix
+only), so it's 0 when parsing fits into memory process used before, and
+retained memory is estimated by tree_stats().
+"""
+
+import sys
+import time
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from node import TextNode
+from parser import parse
+
+__all__ = ['METHOD_RUSAGE', 'METHOD_TRACEMALLOC', 'ParseMemory', 'TreeStats', 'measure_parse', 'tree_stats']
+
+class TreeStats(object):
+    """ Footprint of tree. Sizes are in bytes; text strings shared by more
+    nodes (see Node.normalize) are counted once """
+    def __init__(self):
+        self.nodes = 0
+        # class name : number of nodes
+        self.classes = {}
+        self.text_nodes = 0
+        self.text_length = 0
+        self.text_bytes = 0
+        self.object_bytes = 0
+        self.depth = 0
+
+    def get_total_bytes(self):
+        return self.text_bytes + self.object_bytes
+
+    total_bytes = property(fget=get_total_bytes)
+
+    def report(self):
+        """ Return stats as lines of text """
+        lines = [
+            'nodes: %d (%d text nodes), depth %d' % (self.nodes, self.text_nodes, self.depth),
+            'text: %d characters, %d bytes' % (self.text_length, self.text_bytes),
+            'objects: %d bytes, total %d bytes' % (self.object_bytes, self.total_bytes),
+        ]
+        for name, count in sorted(self.classes.items(), key=lambda item: (-item[1], item[0])):
+            lines.append('  %s: %d' % (name, count))
+        return '\n'.join(lines)
+
+
+def _object_size(node):
+    size = sys.getsizeof(node)
+    attributes = getattr(node, '__dict__', None)
+    if attributes is not None:
+        size += sys.getsizeof(attributes)
+    if isinstance(node, TextNode):
+        if node._chunks:
+            size += sys.getsizeof(node._chunks)
+    elif node.children:
+        size += sys.getsizeof(node.children)
+    return size
+
+def tree_stats(tree):
+    """ Return TreeStats for node or list of nodes (as returned by parse()) """
+    if not isinstance(tree, list):
+        tree = [tree]
+    stats = TreeStats()
+    texts = set()
+    stack = [(node, 1) for node in reversed(tree)]
+    while stack:
+        node, depth = stack.pop()
+        stats.nodes += 1
+        stats.depth = max(stats.depth, depth)
+        name = node.__class__.__name__
+        stats.classes[name] = stats.classes.get(name, 0) + 1
+        stats.object_bytes += _object_size(node)
+        if isinstance(node, TextNode):
+            stats.text_nodes += 1
+            content = node.content
+            stats.text_length += len(content)
+            if id(content) not in texts:
+                texts.add(id(content))
+                stats.text_bytes += sys.getsizeof(content)
+        else:
+            stack.extend([(child, depth+1) for child in reversed(node.children)])
+    return stats
+
+
+# ParseMemory.method values
+METHOD_TRACEMALLOC = 'tracemalloc'
+METHOD_RUSAGE = 'rusage'
+
+class ParseMemory(object):
+    """ Allocations made by one parse() call, in bytes. method tells how
+    they were measured (see module docstring), they are None if it's None """
+    def __init__(self, peak=None, retained=None, seconds=None, method=None):
+        # the most memory allocated at once while parsing
+        self.peak = peak
+        # memory still allocated when parsing is done (mostly the tree)
+        self.retained = retained
+        self.seconds = seconds
+        self.method = method
+
+    def report(self):
+        if self.method is None:
+            return 'parse: %.3fs (memory cannot be measured)' % self.seconds
+        return 'parse: %.3fs, peak %d bytes, retained %d bytes (%s)' % (self.seconds, self.peak, self.retained, self.method)
+
+
+def _get_tracemalloc():
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    return tracemalloc
+
+def _get_max_rss():
+    """ Return maximal resident size of process in bytes """
+    size = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        # kilobytes elsewhere
+        size *= 1024
+    return size
+
+def measure_parse(stream, register_map, **kwargs):
+    """ Parse stream, return tuple (tree, ParseMemory). Other arguments are same as for parse() """
+    tracemalloc = _get_tracemalloc()
+    if tracemalloc is None:
+        if resource is not None:
+            before = _get_max_rss()
+        start = time.time()
+        tree = parse(stream, register_map, **kwargs)
+        seconds = time.time() - start
+        if resource is None:
+            return tree, ParseMemory(seconds=seconds)
+        return tree, ParseMemory(_get_max_rss() - before, tree_stats(tree).total_bytes, seconds, METHOD_RUSAGE)
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    try:
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.time()
+        tree = parse(stream, register_map, **kwargs)
+        seconds = time.time() - start
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        if started:
+            tracemalloc.stop()
+    return tree, ParseMemory(max(peak - before, 0), current - before, seconds, METHOD_TRACEMALLOC)
@@ -8,7 +8,19 @@ from expanders import *
 
 __all__ = ['Node', 'TextNode']
 
+# texts up to this length are shared between text nodes by Node.normalize()
+INTERN_LENGTH = 32
+
 class Node(object):
+    # names of attributes (besides children and text content) that should be
+    # preserved when tree is serialized, f.e. ['args', 'kwargs']
+    extra_attributes = ()
+    # True if expander needs whole tree (f.e. later siblings), so node
+    # cannot be expanded while document is being parsed (see render)
+    needs_tree = False
+    # (Fragment, index) if node was created by cacheable macro, see fragment.py
+    fragment = None
+
     def __init__(self):
         self.parent = None
         self.children = []
@@ -28,7 +40,7 @@ class Node(object):
         else:
             self.actual_text_content = None
         if position is None:
-            if self.last_added_child:
+            if self.last_added_child and self.last_added_child is not self.children[-1]:
                 self.children.insert(self.children.index(self.last_added_child)+1, node)
             else:
                 self.children.append(node)
@@ -51,6 +63,50 @@ class Node(object):
         node.parent = self
         self.last_added_child = node
 
+    def close_text(self):
+        """ Stop filling actual text node, next text is added as new text node """
+        self.actual_text_content = None
+
+    def normalize(self, intern_length=INTERN_LENGTH):
+        """ Merge adjacent text nodes and remove empty ones in whole subtree.
+        Nodes having same short text content are then sharing one string. """
+        interned = {}
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if not node.children:
+                continue
+            children = []
+            run = []
+            for child in node.children + [None]:
+                if isinstance(child, TextNode):
+                    run.append(child)
+                    continue
+                if run:
+                    contents = [text_node.content for text_node in run if text_node.content]
+                    if contents:
+                        text_node = run[0]
+                        if len(contents) == 1:
+                            content = contents[0]
+                        else:
+                            content = u''.join(contents)
+                        if len(content) <= intern_length:
+                            content = interned.setdefault(content, content)
+                        text_node.content = content
+                        children.append(text_node)
+                    run = []
+                if child is not None:
+                    children.append(child)
+                    stack.append(child)
+            if len(children) != len(node.children):
+                node.children = children
+                if node.last_added_child not in children:
+                    node.last_added_child = children and children[-1] or None
+            if children and isinstance(children[-1], TextNode):
+                node.actual_text_content = children[-1]
+            else:
+                node.actual_text_content = None
+
     def expand(self, format):
         for child in self.childs:
             child.expand(format)
@@ -65,13 +121,58 @@ class TextNode(Node):
     Begins when unresolved text discovered, ends when
     begin/end of any macro.
     Could not have any children.
+    Text added to opened node is collected in chunks and joined when
+    content is read.
     """
+    _content = u''
+    _chunks = None
+
     def  __init__(self, content=u'', *args, **kwargs):
         self.content = content
         Node.__init__(self, *args, **kwargs)
 
+    def _get_content(self):
+        if self._chunks:
+            self._content = u''.join([self._content] + self._chunks)
+            self._chunks = None
+        return self._content
+
+    def _set_content(self, content):
+        self._content = content
+        self._chunks = None
+
+    content = property(fget=_get_content, fset=_set_content)
+
+    def __setstate__(self, state):
+        if 'content' in state:
+            # pickled before content was collected in chunks
+            state = dict(state)
+            state['_content'] = state.pop('content')
+        self.__dict__.update(state)
+
+    def add_text(self, text):
+        if self._chunks is None:
+            self._chunks = [text]
+        else:
+            self._chunks.append(text)
+
     def add_char(self, char):
-        self.content = u''.join([self.content, unicode(char)])
+        self.add_text(unicode(char))
+
+    def endswith(self, suffix):
+        if self._chunks and len(self._chunks[-1]) >= len(suffix):
+            return self._chunks[-1].endswith(suffix)
+        return self.content.endswith(suffix)
+
+    def remove_suffix(self, suffix):
+        """ Remove suffix from end of content. Return True if content was ending with it """
+        if not self.endswith(suffix):
+            return False
+        if self._chunks and len(self._chunks[-1]) >= len(suffix):
+            self._chunks[-1] = self._chunks[-1][:-len(suffix)]
+        else:
+            self.content = self.content[:-len(suffix)]
+        return True
 
 #    def __str__(self):
 #        return str(self.content)
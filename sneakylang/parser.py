@@ -4,23 +4,29 @@
 Parser transforming input stream to DOM
 """
 
-import logging
-
-from err import ParserRollback, MacroCallError
+from err import LimitExceeded, ParserRollback, MacroCallError
+from log import debug
+from macro_caller import MacroScanner
 
 from node import TextNode
-from register import Register
+from register import ANCHOR_DOCUMENT, ANCHOR_LINE, Register, ResolutionCache
+from source import normalize_newlines, read_source
 from treebuilder import TreeBuilder
 
 #FIXME
 NEGATION_CHAR = "!"
 
-__all__ = ['Parser', 'parse']
+__all__ = ['ANCHOR_DOCUMENT', 'ANCHOR_LINE', 'Parser', 'parse', 'parse_file']
 
 class Parser(object):
     """ All parsers should derivate from this class """
     start = []
     macro = None
+    # when more parsers are matching the same chunk, one with higher priority is used
+    priority = 0
+    # ANCHOR_DOCUMENT or ANCHOR_LINE to resolve parser only at the beginning
+    # of document or line; start beginning with ^ is anchored to document
+    anchor = None
 
     def __init__(self, stream, parent_parser, chunk, register):
         """ Parse is taking activity in DOM dom because of chunk resolved """
@@ -67,22 +73,35 @@ class Parser(object):
 
     register = property(fget=get_register)
 
-def _get_text_node(stream, register, register_map, builder, state, force_first_char=False, opened_text_node=None, whole_stream=None):
+def _get_text_node(stream, register, register_map, builder, state, force_first_char=False, opened_text_node=None, whole_stream=None, cache=None, scanner=None, guard=None):
     if opened_text_node is None:
         tn = TextNode()
     else:
         tn = opened_text_node
 
     if force_first_char is True:
-        tn.content = u''.join([tn.content, stream[0:1]])
+        tn.add_text(stream[0:1])
         stream = stream[1:]
 
     if whole_stream is None:
         whole_stream = stream
 
+    # text is added in one chunk when the run ends
+    text_stream = stream
+    text_length = 0
     while True:
+        if guard is not None:
+            try:
+                guard.check(builder)
+            except LimitExceeded:
+                if not guard.degrade:
+                    raise
+                # limit exceeded, rest is text
+                text_length = len(text_stream)
+                stream = u''
+                break
         try:
-            res = register.resolve_macro(stream, builder, state, whole_stream)
+            res = register.resolve_macro(stream, builder, state, whole_stream, cache, scanner)
         except (ParserRollback, MacroCallError):
             pass
         else:
@@ -90,20 +109,40 @@ def _get_text_node(stream, register, register_map, builder, state, force_first_c
                 break
         if len(stream) == 0:
             break
-        tn.content = u''.join([tn.content, stream[0:1]])
-        stream = stream[1:]
+        # skip text where nothing could be resolved
+        skip = register.skip_text(stream)
+        text_length += skip
+        stream = stream[skip:]
+    if text_length > 0:
+        tn.add_text(text_stream[0:text_length])
     return (tn, stream)
 
-def parse(stream, register_map, register=None, parsers=None, state=None, builder=None, document_root=False):
+def _get_scanner(stream, builder, syntax):
+    """ Return MacroScanner for stream. When parsing content of macro being
+    expanded, scanner is sharing results with scanner of outer stream """
+    hint = getattr(builder, 'scanner_hint', None)
+    if hint is not None and hint[0].syntax is syntax:
+        scanner, start, end = hint
+        sub_scanner = scanner.sub_scanner(stream, start, end)
+        if sub_scanner is not None:
+            return sub_scanner
+    return MacroScanner(stream, syntax=syntax)
+
+def parse(stream, register_map, register=None, parsers=None, state=None, builder=None, document_root=False, limits=None):
     if builder is None:
         builder = TreeBuilder()
 
     # prepare the stream for parsing
     if isinstance(stream, str):
         stream = stream.decode('utf-8')
-    stream = stream.replace('\r\n', '\n').replace('\r', '\n')  # normalize newlines
+    elif hasattr(stream, 'read'):
+        # file object or mmap
+        stream = read_source(stream)
+    stream = normalize_newlines(stream)
 
     if builder.root is None:
+        # we're building new tree, not called from macro
+        new_tree = True
         if document_root is True:
             from document import DocumentNode
             builder.set_root(DocumentNode())
@@ -113,6 +152,7 @@ def parse(stream, register_map, register=None, parsers=None, state=None, builder
             builder.set_root(Node())
             hack_root = True
     else:
+        new_tree = False
         hack_root = False
 
     remembered_actual_node = builder.actual_node
@@ -123,42 +163,107 @@ def parse(stream, register_map, register=None, parsers=None, state=None, builder
         if parsers is not None:
             register.add_parsers(parsers)
 
+    # limits are checked by guard shared with parse() called by macros
+    guard = getattr(builder, 'limit_guard', None)
+    own_guard = False
+    if guard is None:
+        if limits is None:
+            limits = getattr(register_map, 'limits', None)
+        if limits is not None:
+            guard = limits.start()
+            builder.limit_guard = guard
+            own_guard = True
+
     opened_text_node = None
+    cache = ResolutionCache()
+    scanner = _get_scanner(stream, builder, register.syntax)
+    if guard is not None:
+        scanner.lookahead = guard.limits.max_lookahead
+        guard.enter()
 
     whole_stream = stream
-    while len(stream) > 0:
-        assert isinstance(stream, unicode) == True, stream
-        try:
-            macro, stream_new = register.resolve_macro(stream, builder, state, whole_stream)
-            if macro is not None and stream_new is not None:
-                # negation in effect?
-                if opened_text_node is not None and opened_text_node.content.endswith(NEGATION_CHAR):
-                    # don't forget to eat negation char!
-                    opened_text_node.content = opened_text_node.content[:-1]
-                    raise ParserRollback("Negation resolved")
-
-                logging.debug('Resolved macro %s' % macro)
-                stream_new = register_map.pre_hooks(stream_new, macro, builder)
-                macro.expand(builder=builder, state=state)
-                register_map.post_hooks(macro, builder)
-                stream = stream_new
-                opened_text_node = None
-            else:
-                #logging.debug('Macro not resolved, add text node')
-                node, stream = _get_text_node(stream, register, register_map, builder, state, opened_text_node=opened_text_node, whole_stream=whole_stream)
+    try:
+        while len(stream) > 0:
+            assert isinstance(stream, unicode) == True, stream
+            try:
+                if guard is not None:
+                    guard.check(builder)
+                macro, stream_new = register.resolve_macro(stream, builder, state, whole_stream, cache, scanner)
+                if macro is not None and stream_new is not None:
+                    # negation in effect?
+                    # (don't forget to eat negation char!)
+                    if opened_text_node is not None and opened_text_node.remove_suffix(NEGATION_CHAR):
+                        raise ParserRollback("Negation resolved")
+
+                    if guard is not None:
+                        guard.macro_called()
+
+                    debug('Resolved macro %s', macro)
+                    hooked_stream = register_map.pre_hooks(stream_new, macro, builder)
+
+                    # let parse() called by macro on its content reuse scanner
+                    position = len(scanner) - len(stream)
+                    remembered_hint = getattr(builder, 'scanner_hint', None)
+                    builder.scanner_hint = (scanner, position, len(scanner) - len(stream_new))
+                    try:
+                        fragment_cache = getattr(register_map, 'fragment_cache', None)
+                        if macro.cacheable and fragment_cache is not None and isinstance(builder, TreeBuilder):
+                            fragment_cache.expand_macro(macro, builder, state)
+                        else:
+                            macro.expand(builder=builder, state=state)
+                    finally:
+                        builder.scanner_hint = remembered_hint
+
+                    register_map.post_hooks(macro, builder)
+                    if hooked_stream is not stream_new or len(hooked_stream) > len(scanner):
+                        # stream rewritten, scanned positions are not valid anymore
+                        scanner = MacroScanner(hooked_stream, syntax=scanner.syntax)
+                        if guard is not None:
+                            scanner.lookahead = guard.limits.max_lookahead
+                        # stream must stay suffix of whole_stream, which anchors of parsers are checked in
+                        whole_stream = whole_stream[:len(whole_stream) - len(stream)] + hooked_stream
+                    stream = hooked_stream
+                    opened_text_node = None
+                    cache.invalidate()
+                else:
+                    #logging.debug('Macro not resolved, add text node')
+                    node, stream = _get_text_node(stream, register, register_map, builder, state, opened_text_node=opened_text_node, whole_stream=whole_stream, cache=cache, scanner=scanner, guard=guard)
+                    if opened_text_node is None:
+                        builder.append(node, move_actual=False)
+                    opened_text_node = node
+            except (ParserRollback, MacroCallError):
+                # badly resolved macro
+                debug('ParserRollback caught, forcing text char')
+                node, stream = _get_text_node(stream, register, register_map, builder, state, True, opened_text_node=opened_text_node, whole_stream=whole_stream, cache=cache, scanner=scanner, guard=guard)
                 if opened_text_node is None:
                     builder.append(node, move_actual=False)
-                opened_text_node = node
-        except (ParserRollback, MacroCallError):
-            # badly resolved macro
-            logging.debug('ParserRollback caught, forcing text char')
-            node, stream = _get_text_node(stream, register, register_map, builder, state, True, opened_text_node=opened_text_node, whole_stream=whole_stream)
-            if opened_text_node is None:
-                builder.append(node, move_actual=False)
-            opened_text_node=node
+                opened_text_node=node
+            except LimitExceeded:
+                if not guard.degrade:
+                    raise
+                debug('Limit exceeded, rest of stream is text')
+                guard.truncations += 1
+                if opened_text_node is None:
+                    opened_text_node = TextNode()
+                    builder.append(opened_text_node, move_actual=False)
+                opened_text_node.add_text(stream)
+                stream = u''
+
+        if hack_root is True:
+            builder.move_up()
 
-    if hack_root is True:
-        builder.move_up()
+        if new_tree is True:
+            register_map.post_parse_hooks(builder)
+            if getattr(builder, 'normalize_text', False) is True:
+                builder.root.normalize()
+    finally:
+        if guard is not None:
+            guard.leave()
+            if own_guard:
+                builder.limit_guard = None
+        if new_tree is True:
+            # macros batched for unfinished tree must not keep it alive
+            register_map.discard_hook_batch(builder)
 
     # make sure that we have ended where we have begun
     assert builder.actual_node == remembered_actual_node, "remembered %s, but actual node is %s" % (remembered_actual_node, builder.actual_node)
@@ -167,3 +272,7 @@ def parse(stream, register_map, register=None, parsers=None, state=None, builder
         return builder.root
     else:
         return builder.root.children
+
+def parse_file(source, register_map, encoding='utf-8', **kwargs):
+    """ Parse file given by name, file object or mmap. Other arguments are same as for parse() """
+    return parse(read_source(source, encoding), register_map, **kwargs)
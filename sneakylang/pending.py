@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+""" Nodes waiting for I/O.
+
+Macro which needs to fetch data (included page, remote resource...) could
+append PendingNode instead of fetching data itself (see Macro.append_pending).
+When parsing is done, resolve_pending() fetches data for all pending nodes
+in the tree concurrently (in threads) and replaces every pending node with
+nodes built from its data. Nodes built this way could contain pending
+nodes again, those are resolved in next round.
+
+Pending nodes are resolved only in trees returned by parse(), render()
+expands nodes while parsing and cannot be used with macros appending them.
+"""
+
+import sys
+
+from node import Node
+from parser import parse
+from treebuilder import TreeBuilder
+
+__all__ = ['PendingNode', 'parse_pending', 'resolve_pending']
+
+MAX_WORKERS = 8
+
+class PendingNode(Node):
+    """ Placeholder for nodes built when data are fetched.
+    fetch() is called without arguments (in other thread) and returns data,
+    build(data, builder) appends nodes to builder. If fetch raises exception,
+    fallback(exception, builder) is called instead, or exception is re-raised
+    if there is no fallback.
+    """
+    # callables cannot be serialized, so trees with pending nodes are refused
+    # by serialize.dumps() (and not cached by FragmentCache)
+    extra_attributes = ('fetch', 'build', 'fallback')
+
+    def __init__(self, fetch, build, fallback=None):
+        Node.__init__(self)
+        self.fetch = fetch
+        self.build = build
+        self.fallback = fallback
+
+
+def _find_pending(nodes):
+    pending = []
+    stack = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if isinstance(node, PendingNode):
+            pending.append(node)
+        else:
+            stack.extend(reversed(node.children))
+    return pending
+
+def _fetch(node):
+    try:
+        return (True, node.fetch())
+    except Exception:
+        # traceback is kept, so exception is re-raised as raised in fetch
+        return (False, sys.exc_info())
+
+def _replace(node, result):
+    """ Replace pending node with nodes built from result of fetch. Return them """
+    container = Node()
+    builder = TreeBuilder(root=container)
+    succeeded, data = result
+    if succeeded:
+        node.build(data, builder)
+    elif node.fallback is not None:
+        node.fallback(data[1], builder)
+    else:
+        exc_type, exc_value, exc_tb = data
+        raise exc_type, exc_value, exc_tb
+
+    parent = node.parent
+    index = parent.children.index(node)
+    parent.children[index:index+1] = container.children
+    for child in container.children:
+        child.parent = parent
+    if parent.last_added_child is node:
+        parent.last_added_child = container.children and container.children[-1] or None
+    if parent.actual_text_content is node:
+        parent.actual_text_content = None
+    return container.children
+
+def resolve_pending(tree, max_workers=MAX_WORKERS):
+    """ Fetch data for all pending nodes in tree (node or list of nodes)
+    concurrently and replace them with built nodes. Return number of
+    pending nodes resolved """
+    if not isinstance(tree, list):
+        tree = [tree]
+    pending = _find_pending(tree)
+    if not pending:
+        return 0
+
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(max(1, min(max_workers, len(pending))))
+    try:
+        count = 0
+        while pending:
+            results = pool.map(_fetch, pending)
+            built = []
+            for node, result in zip(pending, results):
+                built.extend(_replace(node, result))
+            count += len(pending)
+            pending = _find_pending(built)
+    finally:
+        pool.close()
+        pool.join()
+    return count
+
+def parse_pending(stream, register_map, max_workers=MAX_WORKERS, **kwargs):
+    """ Parse stream and resolve pending nodes. Other arguments are same as for parse() """
+    tree = parse(stream, register_map, document_root=True, **kwargs)
+    resolve_pending(tree, max_workers)
+    return tree
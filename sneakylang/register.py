@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 
-from re import compile, UNICODE
+from re import compile, error, escape, UNICODE
+from sre_constants import ASSERT, ASSERT_NOT, AT, BRANCH, IN, LITERAL, MAX_REPEAT, MIN_REPEAT, RANGE, SUBPATTERN, SRE_FLAG_IGNORECASE
+from sre_parse import parse as parse_regexp
 
 from expanders import Expander
-from macro_caller import get_macro_name, expand_macro_from_stream
+from macro_caller import could_begin_macro, get_macro_name, expand_macro_from_stream, get_default_syntax
 
-__all__ = ('ExpanderRegister', 'ParserRegister', 'Register', 'RegisterMap')
+__all__ = ('ANCHOR_DOCUMENT', 'ANCHOR_LINE', 'ExpanderRegister', 'ParserRegister', 'Register', 'RegisterMap', 'ResolutionCache')
 
 class RegisterMap(dict):
     """ Register map is dictionary holding macro : register_with_allowed_macros pair """
@@ -15,6 +17,20 @@ class RegisterMap(dict):
             self.__after_add(k)
 
         self.hooks = {}
+        # hook instances, ordered by priority
+        self._hook_instances = []
+        # macro class : hook instances applicable to it, filled on first use
+        self._hook_table = {}
+        # builder : list of (hook, macro) to be passed to batched hooks
+        self._hook_batches = {}
+        # MacroSyntax used by registers in this map, None for default one
+        self.syntax = None
+        # FragmentCache for nodes created by cacheable macros, None for no caching
+        self.fragment_cache = None
+        # Transclusion providing pages for IncludeMacro, see transclusion.py
+        self.transclusion = None
+        # Limits checked when parsing with this map, None for no limits
+        self.limits = None
 
     def __after_add(self, k):
         self[k].visit_register_map(self)
@@ -28,18 +44,142 @@ class RegisterMap(dict):
             if hook.macro:
                 if not self.hooks.has_key(hook.macro):
                     self.hooks[hook.macro] = set()
-                self.hooks[hook.macro].add(hook)
+                if hook not in self.hooks[hook.macro]:
+                    self.hooks[hook.macro].add(hook)
+                    self._hook_instances.append(hook())
+        # sort is stable, hooks with same priority are called in order they were added
+        self._hook_instances.sort(key=lambda hook: -hook.priority)
+        self._hook_table = {}
+
+    def remove_hooks(self, hooks):
+        for hook in hooks:
+            if hook.macro and hook in self.hooks.get(hook.macro, ()):
+                self.hooks[hook.macro].discard(hook)
+                self._hook_instances = [instance for instance in self._hook_instances if instance.__class__ is not hook]
+        self._hook_table = {}
+
+    def get_hooks(self, macro_class):
+        """ Return hook instances to be called for macro_class """
+        try:
+            return self._hook_table[macro_class]
+        except KeyError:
+            mro = macro_class.__mro__
+            hooks = [hook for hook in self._hook_instances if hook.macro in mro]
+            self._hook_table[macro_class] = hooks
+            return hooks
 
     def pre_hooks(self, stream, macro, builder):
-        if macro.__class__ in self.hooks:
-            for hook in self.hooks[macro.__class__]:
-                stream = hook().pre_macro(stream, macro, builder)
+        if self._hook_instances:
+            for hook in self.get_hooks(macro.__class__):
+                stream = hook.pre_macro(stream, macro, builder)
         return stream
 
     def post_hooks(self, macro, builder):
-        if macro.__class__ in self.hooks:
-            for hook in self.hooks[macro.__class__]:
-                hook().post_macro(macro, builder)
+        if self._hook_instances:
+            for hook in self.get_hooks(macro.__class__):
+                hook.post_macro(macro, builder)
+                if hook.batched:
+                    self._hook_batches.setdefault(builder, []).append((hook, macro))
+
+    def post_parse_hooks(self, builder):
+        """ Call batched hooks with macros collected while building tree in builder """
+        batch = self._hook_batches.pop(builder, None)
+        if not batch:
+            return
+        macros = {}
+        for hook, macro in batch:
+            macros.setdefault(hook, []).append(macro)
+        for hook in self._hook_instances:
+            if hook in macros:
+                hook.post_parse(macros[hook], builder)
+
+    def discard_hook_batch(self, builder):
+        """ Forget macros collected for batched hooks while building tree in builder """
+        self._hook_batches.pop(builder, None)
+
+# Parser.anchor values: parser is resolved only at the beginning of
+# stream (document) or at the beginning of line
+ANCHOR_DOCUMENT = 'document'
+ANCHOR_LINE = 'line'
+
+# kinds of position in stream, see ParserRegister.resolve_parser()
+POSITION_DOCUMENT = 0
+POSITION_LINE = 1
+POSITION_OTHER = 2
+
+# anchors of parsers allowed at given kind of position
+POSITION_ANCHORS = {
+    POSITION_DOCUMENT : (None, ANCHOR_DOCUMENT, ANCHOR_LINE),
+    POSITION_LINE : (None, ANCHOR_LINE),
+    POSITION_OTHER : (None,),
+}
+
+# character classes with more characters than this are not expanded
+# into dispatch table, parsers starting with them are tried everywhere
+MAX_DISPATCH_RANGE = 256
+
+def _class_chars(items):
+    """ Return set of characters matched by parsed character class, or None """
+    chars = set()
+    for op, av in items:
+        if op == LITERAL:
+            chars.add(unichr(av))
+        elif op == RANGE and av[1] - av[0] < MAX_DISPATCH_RANGE:
+            chars.update([unichr(i) for i in xrange(av[0], av[1]+1)])
+        else:
+            # negation, categories (\w, \s...)
+            return None
+    return chars
+
+def _first_chars(items):
+    """ Return tuple (chars, nullable) for parsed regular expression, where chars
+    is set of characters its non-empty match could begin with (None if it
+    cannot be determined) and nullable is True if it could match empty string """
+    chars = set()
+    for op, av in items:
+        if op == LITERAL:
+            item_chars, nullable = set([unichr(av)]), False
+        elif op == IN:
+            item_chars, nullable = _class_chars(av), False
+        elif op == SUBPATTERN:
+            item_chars, nullable = _first_chars(av[-1])
+        elif op == BRANCH:
+            item_chars, nullable = set(), False
+            for branch in av[1]:
+                branch_chars, branch_nullable = _first_chars(branch)
+                if branch_chars is None:
+                    return (None, True)
+                item_chars |= branch_chars
+                nullable = nullable or branch_nullable
+        elif op in (MAX_REPEAT, MIN_REPEAT):
+            item_chars, nullable = _first_chars(av[2])
+            nullable = nullable or av[0] == 0
+        elif op in (AT, ASSERT, ASSERT_NOT):
+            # zero-width
+            continue
+        else:
+            return (None, True)
+
+        if item_chars is None:
+            return (None, True)
+        chars |= item_chars
+        if not nullable:
+            return (chars, False)
+    return (chars, True)
+
+def get_start_chars(start, flags=0):
+    """ Return set of characters stream must begin with to be matched by
+    parser start regexp, or None if it could begin with anything """
+    try:
+        parsed = parse_regexp(start, UNICODE)
+    except error:
+        return None
+    if (parsed.pattern.flags | flags) & SRE_FLAG_IGNORECASE:
+        return None
+    return _first_chars(parsed)[0]
+
+def _char_class(chars):
+    return u'[%s]' % u''.join([escape(char) for char in sorted(chars)])
 
 class ParserRegister(object):
     """ Parser register is holding parsers (aka 'alternative syntaxes') allowed to use for parsing.
@@ -49,6 +189,19 @@ class ParserRegister(object):
         self.parser_start = {}
         #self.parser_start_compiled = {}
 
+        # start : (registration order, characters it could begin with, anchor)
+        self._start_info = {}
+        # kind of position : (dispatch table, fallback); dispatch table maps
+        # first character of stream to parsers to try, in order of priority,
+        # fallback are parsers to try for characters not in dispatch table
+        # (parsers with unknown first character are in every list)
+        self._dispatch = {}
+        for position in POSITION_ANCHORS:
+            self._dispatch[position] = ({}, [])
+        # patterns of positions (not at the beginning of document) where some
+        # parser could be resolved, None if it could be anywhere
+        self.text_starts = ()
+
         if parsers is not None:
             for parser in parsers:
                 self.add(parser)
@@ -60,6 +213,51 @@ class ParserRegister(object):
                     start = start.decode('utf-8')
                 self.parser_start[start] = (compile(u''.join([u'^', start]), flags=UNICODE), parser)
                 #self.parser_start_compiled[compile(''.join(['^', start]))] = parser
+                anchor = getattr(parser, 'anchor', None)
+                if anchor is None and start.startswith(u'^'):
+                    # backward compatibility, start with ^ is matching only beginning of document
+                    anchor = ANCHOR_DOCUMENT
+                self._start_info[start] = (len(self._start_info), get_start_chars(start), anchor)
+            self._build_dispatch()
+
+    def _build_dispatch(self):
+        """ Build dispatch tables: for every kind of position and every possible
+        first character, list of (compiled start, parser) sorted by parser priority;
+        parsers with same priority are tried in order they were added """
+        entries = []
+        for start in self.parser_start:
+            compiled, parser = self.parser_start[start]
+            order, chars, anchor = self._start_info[start]
+            entries.append((-getattr(parser, 'priority', 0), order, chars, anchor, (compiled, parser)))
+        entries.sort()
+
+        for position in POSITION_ANCHORS:
+            allowed = [entry for entry in entries if entry[3] in POSITION_ANCHORS[position]]
+            all_chars = set()
+            for entry in allowed:
+                if entry[2] is not None:
+                    all_chars |= entry[2]
+
+            table = {}
+            for char in all_chars:
+                table[char] = [entry[4] for entry in allowed if entry[2] is None or char in entry[2]]
+            self._dispatch[position] = (table, [entry[4] for entry in allowed if entry[2] is None])
+
+        other_table, other_fallback = self._dispatch[POSITION_OTHER]
+        line_table, line_fallback = self._dispatch[POSITION_LINE]
+        if other_fallback:
+            self.text_starts = None
+        else:
+            starts = []
+            if other_table:
+                starts.append(_char_class(other_table))
+            if line_fallback:
+                starts.append(u'(?<=\n)')
+            else:
+                line_chars = [char for char in line_table if char not in other_table]
+                if line_chars:
+                    starts.append(u'(?<=\n)' + _char_class(line_chars))
+            self.text_starts = tuple(starts)
 
     def get_parser(self, regexp):
         try:
@@ -67,58 +265,60 @@ class ParserRegister(object):
         except KeyError:
             raise ValueError('No Parser in register starting with %s' % regexp)
 
-    def _most_matching(self, matching):
-        """ Return most matching parser and chunk on which it's resolved """
-        most = None
-        length = 0
-        for m in matching:
-            mlen = len(m.string[m.start():m.end()])
-
-            if mlen > length:
-                most = m
-                length = len(m.string[m.start():m.end()])
-            elif mlen == length:
-                #logging.debug('Two or more parsers are matching, ' \
-                    #'performing the priority check')
-                m_parser = self.parser_start[m.re.pattern[1:]][1]
-                most_parser = self.parser_start[most.re.pattern[1:]][1]
-                if getattr(m_parser, 'priority', 0) > \
-                    getattr(most_parser, 'priority', 0):
-                    most = m
-
-        if most is None:
-            return (None, None)
-        return (self.parser_start[most.re.pattern[1:]][1], most.string[most.start():most.end()])
-
     def resolve_parser(self, stream, register, whole_stream=None):
         """ Resolve parser stream.
+        Parser with longest match wins, parser with higher priority on same length.
         Return properly initialized parser or None
         """
         if whole_stream is None:
                 whole_stream = stream
-        matching = []
-        
-        for start in self.parser_start:
-            compiled, parser = self.parser_start[start]
-            if start.find('^') != -1:
-                if compiled.match(whole_stream) and stream == whole_stream:
-                    matching.append(compiled.match(whole_stream))
-            else:
-                if compiled.match(stream):
-                    matching.append(compiled.match(stream))
-        #matching = [parser_start.match(stream) for parser_start in self.parser_start_compiled if parser_start.match(stream)]
-        if len(matching) == 0:
-            return None
-        parser, chunk = self._most_matching(matching)
-        if parser is None or chunk is None:
+
+        # stream is suffix of whole_stream
+        offset = len(whole_stream) - len(stream)
+        if offset == 0:
+            position = POSITION_DOCUMENT
+        elif offset < 0:
+            # stream is not part of whole_stream, position is not known
+            position = POSITION_OTHER
+        elif whole_stream[offset-1] == u'\n':
+            position = POSITION_LINE
+        else:
+            position = POSITION_OTHER
+
+        table, fallback = self._dispatch[position]
+        most = None
+        length = 0
+        for compiled, parser in table.get(stream[0:1], fallback):
+            match = compiled.match(stream)
+            if match is not None and match.end() > length:
+                most = parser
+                length = match.end()
+
+        if most is None:
             return None
-            
-        return parser(stream, self, chunk, register)
+
+        return most(stream, self, stream[0:length], register)
+
+    def could_resolve(self, source, position):
+        """ Return False if no parser could be resolved at position of source """
+        if position == 0:
+            kind = POSITION_DOCUMENT
+        elif source[position-1] == u'\n':
+            kind = POSITION_LINE
+        else:
+            kind = POSITION_OTHER
+        table, fallback = self._dispatch[kind]
+        return len(table.get(source[position:position+1], fallback)) > 0
 
 class Register(object):
-    def __init__(self, macro_list=None, parsers=None):
+    def __init__(self, macro_list=None, parsers=None, syntax=None):
         self.register_map = None
         self.macro_map = {}
+        # length of the longest macro name, longer names are not searched for
+        self.max_name_length = 0
+        self._syntax = syntax
+        # (key, compiled regexp) returned by get_text_skipper()
+        self._text_skipper = (None, None)
 
         self.parser_register = ParserRegister()
 
@@ -132,6 +332,7 @@ class Register(object):
         if self.macro_map.has_key(macro.name):
             raise ValueError, 'Macro %s already added under name %s' % (self.macro_map[macro.name], macro.name)
         self.macro_map[macro.name] = macro
+        self.max_name_length = max(self.max_name_length, len(macro.name))
 
     def add_macros(self, macro_list):
         for p in macro_list:
@@ -152,13 +353,77 @@ class Register(object):
     def visit_register_map(self, register_map):
         self.register_map = register_map
 
+    def get_syntax(self):
+        """ Return MacroSyntax given to register, or one of register map, or default one """
+        if self._syntax is not None:
+            return self._syntax
+        syntax = getattr(self.register_map, 'syntax', None)
+        if syntax is not None:
+            return syntax
+        return get_default_syntax()
+
+    def set_syntax(self, syntax):
+        self._syntax = syntax
+
+    syntax = property(fget=get_syntax, fset=set_syntax)
+
+    def get_text_skipper(self):
+        """ Return compiled regexp searching for next position where macro
+        or parser could be resolved, or None if it could be anywhere.
+        Positions skipped are text, so parser does not have to probe them """
+        syntax = self.syntax
+        text_starts = self.parser_register.text_starts
+        key = (syntax, text_starts, bool(self.macro_map))
+        if self._text_skipper[0] == key:
+            return self._text_skipper[1]
+
+        if text_starts is None:
+            skipper = None
+        else:
+            starts = list(text_starts)
+            if self.macro_map:
+                begin_chars = get_start_chars(syntax.begin_pattern, syntax.begin_flags)
+                if begin_chars:
+                    starts.append(_char_class(begin_chars))
+                else:
+                    starts = None
+            if starts is None:
+                skipper = None
+            elif starts:
+                skipper = compile(u'|'.join(starts), UNICODE)
+            else:
+                # nothing could be resolved
+                skipper = compile(u'$(?!\n)', UNICODE)
+        self._text_skipper = (key, skipper)
+        return skipper
+
+    def could_resolve(self, source, position):
+        """ Return False if neither parser nor macro could be resolved
+        at position of source, so it's text """
+        if self.parser_register.could_resolve(source, position):
+            return True
+        return len(self.macro_map) > 0 and could_begin_macro(source, position, self)
+
+    def skip_text(self, stream):
+        """ Return number of characters at the beginning of stream (at least one)
+        which are text, as nothing could be resolved on their positions """
+        skipper = self.get_text_skipper()
+        if skipper is None:
+            return 1
+        match = skipper.search(stream, 1)
+        while match is not None and match.start() < len(stream) and not self.could_resolve(stream, match.start()):
+            match = skipper.search(stream, match.start()+1)
+        if match is None:
+            return len(stream)
+        return min(match.start(), len(stream))
+
     def get_macro(self, name):
         try:
             return self.macro_map[name]
         except KeyError:
             raise ValueError, 'No macro parser registered under name %s in registry' % name
 
-    def resolve_parser_macro(self, stream):
+    def resolve_parser_macro(self, stream, scanner=None, position=0):
         """ Try resolving parser in macro syntax.
         Return properly initialized parser or None
         """
@@ -166,14 +431,19 @@ class Register(object):
         try:
             if not isinstance(stream, unicode):
                 raise TypeError("Stream expected to be unicode string, %s instead (stream: %s)" % (type(stream), stream))
-            return self.macro_map[get_macro_name(stream, self)]
+            return self.macro_map[get_macro_name(stream, self, scanner, position)]
         except KeyError:
 #            logging.debug('Macro name %s not in my macro_map' % get_macro_name(stream,self))
             return None
         else:
             raise NotImplementedError,('Unexpected condition, please report this as bug')
 
-    def resolve_macro(self, stream, builder, state=None, whole_stream=None):
+    def resolve_macro(self, stream, builder, state=None, whole_stream=None, cache=None, scanner=None):
+        """ Resolve macro at the beginning of stream.
+        If scanner (MacroScanner of whole_stream) is given, ends of macros
+        are found using results it remembers.
+        Return tuple (macro, new_stream) or (None, None)
+        """
 
         # backward compatibility for tests
         if isinstance(stream, str):
@@ -182,6 +452,17 @@ class Register(object):
         if whole_stream is None:
             whole_stream = stream
 
+        if cache is None:
+            return self._resolve_macro(stream, builder, state, whole_stream, scanner)
+
+        offset = len(whole_stream) - len(stream)
+        result = cache.get(self, offset)
+        if result is None:
+            result = self._resolve_macro(stream, builder, state, whole_stream, scanner)
+            cache.set(self, offset, result)
+        return result
+
+    def _resolve_macro(self, stream, builder, state, whole_stream, scanner=None):
         parser = self.parser_register.resolve_parser(stream, self, whole_stream)
 
         if parser is not None:
@@ -189,14 +470,45 @@ class Register(object):
             macro, stream_new = parser.get_macro(builder, state)
             return (macro, stream_new)
 
+        if scanner is None:
+            position = 0
+        else:
+            position = len(scanner) - len(stream)
+
         # resolve in macro syntax
-        macro = self.resolve_parser_macro(stream)
+        macro = self.resolve_parser_macro(stream, scanner, position)
 
         if macro is not None:
-            return expand_macro_from_stream(stream, self, builder, state)
+            return expand_macro_from_stream(stream, self, builder, state, scanner, position)
 
         return (None, None)
 
+class ResolutionCache(object):
+    """ Cache of Register.resolve_macro results during one parse() call.
+    Parser is probing the same stream position more than once (first in parse(),
+    then when collecting text), so last result for every register is kept
+    and handed out once for the same offset. Must be invalidated when stream
+    is changed (macro expanded, hooks rewrote the stream).
+    """
+    def __init__(self):
+        self._results = {}
+
+    def get(self, register, offset):
+        """ Return cached result for offset or None """
+        try:
+            cached_offset, result = self._results.pop(register)
+        except KeyError:
+            return None
+        if cached_offset != offset:
+            return None
+        return result
+
+    def set(self, register, offset, result):
+        self._results[register] = (offset, result)
+
+    def invalidate(self):
+        self._results.clear()
+
 class ExpanderRegister(object):
     def __init__(self, expander_map):
         self.expander_map = {}
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+
+""" Parsing and expanding in one pass.
+
+RenderBuilder expands children of document root as soon as they're
+complete and removes them from the tree, so whole tree is never held in
+memory and output could be sent while the rest of document is parsed.
+"""
+
+from expanders import expand
+from node import TextNode
+from parser import parse
+from treebuilder import TreeBuilder
+
+__all__ = ['RenderBuilder', 'render']
+
+class RenderBuilder(TreeBuilder):
+    """ TreeBuilder expanding complete children of root to format.
+
+    Expanded output is passed to write (if given) or collected and returned
+    by get_output(). Node classes with needs_tree set are expanded with the
+    whole tree: if any is in node_map for format, nothing is expanded until
+    parsing is done. The same happens when nodes are inserted or replaced,
+    as positions in already expanded part of tree cannot be changed.
+
+    Nothing is expanded while held is positive, so nodes stay in tree
+    until they are collected (see FragmentCache.expand_macro).
+    """
+    def __init__(self, format, node_map, write=None, root=None):
+        TreeBuilder.__init__(self, root)
+        self.format = format
+        self.node_map = node_map
+        self._output = []
+        if write is None:
+            write = self._output.append
+        self.write = write
+        self.streaming = True
+        for node_class in node_map.get(format, {}):
+            if getattr(node_class, 'needs_tree', False):
+                self.streaming = False
+                break
+
+    def flush(self):
+        """ Expand children of root that are complete """
+        if not self.streaming or self.held or self._actual_node is not self.root or self.root is None:
+            return
+        children = self.root.children
+        # last text node could be still filled by parser
+        if children and isinstance(children[-1], TextNode):
+            complete = children[:-1]
+        else:
+            complete = children
+        if not complete:
+            return
+        self.write(expand(complete, self.format, self.node_map))
+        self.root.children = children[len(complete):]
+        if not self.root.children:
+            self.root.last_added_child = None
+            self.root.actual_text_content = None
+
+    def append(self, node, move_actual=True):
+        self.flush()
+        TreeBuilder.append(self, node, move_actual)
+
+    def add_child(self, node, move_actual=True):
+        self.flush()
+        TreeBuilder.add_child(self, node, move_actual)
+
+    def add_childs(self, nodes, move_actual=True):
+        self.flush()
+        TreeBuilder.add_childs(self, nodes, move_actual)
+
+    def move_up(self):
+        TreeBuilder.move_up(self)
+        self.flush()
+
+    def insert(self, node, index, move_actual=True):
+        self.streaming = False
+        TreeBuilder.insert(self, node, index, move_actual)
+
+    def replace(self, node):
+        self.streaming = False
+        TreeBuilder.replace(self, node)
+
+    def set_actual_node(self, node):
+        self.streaming = False
+        TreeBuilder.set_actual_node(self, node)
+
+    def close(self):
+        """ Expand rest of tree, parsing must be done """
+        if self.root is not None and self.root.children:
+            self.write(expand(self.root.children, self.format, self.node_map))
+            self.root.children = []
+            self.root.last_added_child = None
+            self.root.actual_text_content = None
+
+    def get_output(self):
+        return u''.join(self._output)
+
+
+def render(stream, register_map, format, node_map, write=None, **kwargs):
+    """ Parse stream and expand it to format in one pass.
+    Output is the same as of expand(parse(stream, register_map, document_root=True).children, format, node_map).
+    If write is given, expanded chunks are passed to it as they're produced and None
+    is returned, otherwise output is returned. Other arguments are same as for parse().
+    When register_map has hooks, output is expanded only when parsing is done.
+    Pending nodes are not resolved, use pending.parse_pending() and expand() for them.
+    """
+    builder = RenderBuilder(format, node_map, write)
+    if register_map.hooks:
+        # hooks could insert nodes or move actual node anywhere in tree
+        builder.streaming = False
+    parse(stream, register_map, builder=builder, document_root=True, **kwargs)
+    builder.close()
+    if write is None:
+        return builder.get_output()
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+""" Compact serialization of parsed node trees.
+
+Tree is stored as flat array of node records in document order. Every record
+holds id of node class, number of children, id of text content in shared
+string table and id of extra attributes (declared by node class in
+extra_attributes). Parent references are not stored, they're recreated
+from child counts when loading.
+
+Serialized data may be memory-mapped, loads() accepts any object supporting
+slicing (str, buffer, mmap).
+"""
+
+import marshal
+import struct
+import sys
+from array import array
+
+from node import TextNode
+
+__all__ = ['dump', 'dumps', 'load', 'loads']
+
+MAGIC = 'SNKT'
+FORMAT_VERSION = 1
+
+# header: magic, format version, flags, node count, size of tables
+HEADER = struct.Struct('<4sBBxxII')
+
+# record fields: class id, children count, text id, extras id
+RECORD_SIZE = 4
+
+FLAG_NODE_LIST = 1
+FLAG_BIG_ENDIAN = 2
+
+def _class_key(cls):
+    return '%s:%s' % (cls.__module__, cls.__name__)
+
+def _resolve_class(key, classes):
+    if key in classes:
+        return classes[key]
+    module_name, class_name = key.split(':')
+    try:
+        module = __import__(module_name, {}, {}, [class_name])
+        return getattr(module, class_name)
+    except (ImportError, AttributeError):
+        raise ValueError('Cannot resolve node class %s, pass it in classes' % key)
+
+def dumps(tree):
+    """ Serialize node or list of nodes (as returned by parse()) to string """
+    if isinstance(tree, list):
+        flags = FLAG_NODE_LIST
+        roots = tree
+    else:
+        flags = 0
+        roots = [tree]
+    if sys.byteorder == 'big':
+        flags |= FLAG_BIG_ENDIAN
+
+    class_ids = {}
+    class_names = []
+    string_ids = {}
+    strings = []
+    extras = []
+    records = array('i')
+
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        cls = node.__class__
+
+        class_id = class_ids.get(cls)
+        if class_id is None:
+            class_id = class_ids[cls] = len(class_names)
+            class_names.append(_class_key(cls))
+
+        if isinstance(node, TextNode):
+            content = node.content
+            text_id = string_ids.get(content)
+            if text_id is None:
+                text_id = string_ids[content] = len(strings)
+                strings.append(content)
+        else:
+            text_id = -1
+
+        if cls.extra_attributes:
+            extras_id = len(extras)
+            extras.append(tuple([getattr(node, attr, None) for attr in cls.extra_attributes]))
+        else:
+            extras_id = -1
+
+        records.extend((class_id, len(node.children), text_id, extras_id))
+        stack.extend(reversed(node.children))
+
+    try:
+        tables = marshal.dumps((class_names, strings, extras))
+    except ValueError, err:
+        raise ValueError('Extra attributes must contain only basic types: %s' % err)
+
+    return ''.join([
+        HEADER.pack(MAGIC, FORMAT_VERSION, flags, len(records) / RECORD_SIZE, len(tables)),
+        records.tostring(),
+        tables,
+    ])
+
+def dump(tree, file):
+    """ Serialize tree to file object """
+    file.write(dumps(tree))
+
+def loads(data, classes=None):
+    """ Load tree serialized by dumps().
+    classes is optional list of node classes to use instead of importing them by name
+    """
+    if len(data) < HEADER.size:
+        raise ValueError('Data too short to contain serialized tree')
+    magic, version, flags, node_count, tables_size = HEADER.unpack(data[0:HEADER.size])
+    if magic != MAGIC:
+        raise ValueError('Data do not contain serialized tree')
+    if version != FORMAT_VERSION:
+        raise ValueError('Unsupported format version %s' % version)
+
+    records = array('i')
+    records_end = HEADER.size + node_count * RECORD_SIZE * records.itemsize
+    records.fromstring(data[HEADER.size:records_end])
+    if bool(flags & FLAG_BIG_ENDIAN) != (sys.byteorder == 'big'):
+        records.byteswap()
+    class_names, strings, extras = marshal.loads(data[records_end:records_end+tables_size])
+
+    class_map = {}
+    if classes is not None:
+        for cls in classes:
+            class_map[_class_key(cls)] = cls
+    node_classes = [_resolve_class(key, class_map) for key in class_names]
+
+    roots = []
+    # stack of [parent, number of children still to be attached]
+    stack = []
+    for i in xrange(0, len(records), RECORD_SIZE):
+        cls = node_classes[records[i]]
+        node = cls.__new__(cls)
+        # bypass __init__, it's considerably faster for big trees
+        node.__dict__.update({
+            'children' : [],
+            'actual_text_content' : None,
+            'last_added_child' : None,
+        })
+        if records[i+2] != -1:
+            node.content = strings[records[i+2]]
+        if records[i+3] != -1:
+            for attr, value in zip(cls.extra_attributes, extras[records[i+3]]):
+                setattr(node, attr, value)
+
+        if stack:
+            parent = stack[-1][0]
+            node.parent = parent
+            parent.children.append(node)
+            parent.last_added_child = node
+            if isinstance(node, TextNode):
+                parent.actual_text_content = node
+            else:
+                parent.actual_text_content = None
+            stack[-1][1] -= 1
+            if stack[-1][1] == 0:
+                stack.pop()
+        else:
+            node.parent = None
+            roots.append(node)
+
+        if records[i+1] > 0:
+            stack.append([node, records[i+1]])
+
+    if flags & FLAG_NODE_LIST:
+        return roots
+    elif len(roots) != 1:
+        raise ValueError('Serialized tree must have exactly one root')
+    return roots[0]
+
+def load(file, classes=None):
+    """ Load tree from file object """
+    return loads(file.read(), classes)
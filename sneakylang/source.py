@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+""" Reading of parser input.
+
+Input is read, decoded and newline-normalized in chunks, so whole raw
+(encoded) document never has to be held in memory alongside its decoded
+copy.
+"""
+
+import codecs
+
+__all__ = ['iter_source', 'read_source', 'normalize_newlines']
+
+CHUNK_SIZE = 64 * 1024
+
+def normalize_newlines(text):
+    """ Convert \\r\\n and \\r to \\n """
+    if u'\r' not in text:
+        return text
+    return text.replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+
+def iter_source(source, encoding='utf-8', chunk_size=CHUNK_SIZE):
+    """ Yield decoded chunks of text with normalized newlines.
+    source may be file name, file object or mmap
+    """
+    if isinstance(source, basestring):
+        source = open(source, 'rb')
+        close = True
+    else:
+        close = False
+
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        # \r at end of chunk could be followed by \n in next one
+        carriage_return = False
+        while True:
+            data = source.read(chunk_size)
+            if isinstance(data, unicode):
+                text = data
+            else:
+                text = decoder.decode(data, not data)
+            if carriage_return:
+                text = u''.join([u'\r', text])
+            carriage_return = text.endswith(u'\r') and len(data) > 0
+            if carriage_return:
+                text = text[:-1]
+            if text:
+                yield normalize_newlines(text)
+            if not data:
+                break
+    finally:
+        if close:
+            source.close()
+
+def read_source(source, encoding='utf-8', chunk_size=CHUNK_SIZE):
+    """ Return whole decoded text of source with normalized newlines """
+    return u''.join(list(iter_source(source, encoding, chunk_size)))
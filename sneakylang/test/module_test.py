@@ -138,7 +138,7 @@ class StrongVistingMacro(Macro):
         self.builder.move_up()
 
 class PictureNode(Node):
-    pass
+    extra_attributes = ['args', 'kwargs']
 
 class PictureKeywordMacro(Macro):
     name = 'picture'
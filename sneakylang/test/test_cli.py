@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test command line tool """
+
+import os
+import shutil
+import sys
+import tempfile
+from StringIO import StringIO
+from unittest import main as run_tests, TestCase
+from module_test import *
+
+from sneakylang import Register, RegisterMap
+from sneakylang.cli import load_config, main, percentile
+from sneakylang.expanders import Expander, TextNodeExpander
+
+class StrongDocbookExpand(Expander):
+    def expand(self, node, format, node_map):
+        return u''.join([u'<emphasis>'] + [expand(child, format, node_map) for child in node.children] + [u'</emphasis>'])
+
+class Config:
+    register_map = RegisterMap({
+        StrongMacro : Register([StrongMacro]),
+    })
+    node_map = {
+        'docbook5' : {
+            StrongNode : StrongDocbookExpand,
+            TextNode : TextNodeExpander,
+        }
+    }
+    format = 'docbook5'
+
+CONFIG = '%s:Config' % __name__
+
+class TestCommandLine(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.source = os.path.join(self.directory, 'source')
+        os.makedirs(os.path.join(self.source, 'sub'))
+        self.write('a.txt', 'a ((silne b))')
+        self.write(os.path.join('sub', 'c.txt'), 'č ((silne d))')
+        self.write('.hidden', 'hidden')
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+
+    def tearDown(self):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        shutil.rmtree(self.directory)
+
+    def write(self, name, content):
+        source_file = open(os.path.join(self.source, name), 'wb')
+        source_file.write(content)
+        source_file.close()
+
+    def read(self, name):
+        output_file = open(os.path.join(self.directory, 'output', name), 'rb')
+        try:
+            return output_file.read()
+        finally:
+            output_file.close()
+
+    def testLoadConfig(self):
+        self.assertEquals(Config, load_config(CONFIG))
+        self.assertRaises(ValueError, load_config, 'module_test')
+
+    def testRenderToStdout(self):
+        self.assertEquals(0, main([CONFIG, os.path.join(self.source, 'a.txt')]))
+        self.assertEquals('a <emphasis>b</emphasis>', sys.stdout.getvalue())
+
+    def testRenderDirectory(self):
+        main([CONFIG, '--output', os.path.join(self.directory, 'output'), self.source])
+        self.assertEquals('a <emphasis>b</emphasis>', self.read('a.docbook5'))
+        self.assertEquals('č <emphasis>d</emphasis>', self.read(os.path.join('sub', 'c.docbook5')))
+        self.assertEquals(['a.docbook5', 'sub'], sorted(os.listdir(os.path.join(self.directory, 'output'))))
+
+    def testParallelRendering(self):
+        main([CONFIG, '--jobs', '2', '--extension', '.xml', '--output', os.path.join(self.directory, 'output'), self.source])
+        self.assertEquals('a <emphasis>b</emphasis>', self.read('a.xml'))
+        self.assertEquals('č <emphasis>d</emphasis>', self.read(os.path.join('sub', 'c.xml')))
+
+    def testProfile(self):
+        main([CONFIG, '--profile', self.source])
+        self.assert_('StrongMacro' in sys.stderr.getvalue())
+
+    def testProfileHookRemoved(self):
+        main([CONFIG, '--profile', self.source])
+        self.assertEquals([], Config.register_map.get_hooks(StrongMacro))
+
+    def testFailingFile(self):
+        self.write('b.txt', 'invalid \xff')
+        self.assertEquals(1, main([CONFIG, self.source]))
+        self.assert_(os.path.join(self.source, 'b.txt') + ': UnicodeDecodeError' in sys.stderr.getvalue())
+        self.assertEquals('a <emphasis>b</emphasis>č <emphasis>d</emphasis>', sys.stdout.getvalue())
+
+    def testFailingFileInParallel(self):
+        self.write('b.txt', 'invalid \xff')
+        self.assertEquals(1, main([CONFIG, '--jobs', '2', '--output', os.path.join(self.directory, 'output'), self.source]))
+        self.assert_(os.path.join(self.source, 'b.txt') + ': UnicodeDecodeError' in sys.stderr.getvalue())
+        self.assertEquals('č <emphasis>d</emphasis>', self.read(os.path.join('sub', 'c.docbook5')))
+
+    def testBench(self):
+        main([CONFIG, '--bench', '3', self.source])
+        self.assertEquals('', sys.stdout.getvalue())
+        lines = sys.stderr.getvalue().splitlines()
+        self.assertEquals(3, len(lines))
+        self.assert_(lines[-1].startswith('all: min '))
+        self.assert_(' p90 ' in lines[0])
+
+    def testStats(self):
+        main([CONFIG, '--stats', os.path.join(self.source, 'a.txt')])
+        self.assert_('nodes: 4 (2 text nodes)' in sys.stderr.getvalue())
+        self.assertEquals('a <emphasis>b</emphasis>', sys.stdout.getvalue())
+
+    def testPercentile(self):
+        self.assertEquals(None, percentile([], 50))
+        self.assertEquals(3, percentile([5, 1, 3, 2, 4], 50))
+        self.assertEquals(5, percentile([5, 1, 3, 2, 4], 99))
+        self.assertEquals(1, percentile([5, 1, 3, 2, 4], 0))
+
+if __name__ == "__main__":
+    run_tests()
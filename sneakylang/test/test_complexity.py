@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test that time of parsing pathological input grows linearly with its size.
+
+Every input is measured at two sizes, GROWTH times different; time on the
+larger one must not be greater than GROWTH * TOLERANCE times the time on
+the smaller one (quadratic algorithm would need GROWTH * GROWTH times more).
+"""
+
+import time
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import expand, parse, Register, RegisterMap
+from sneakylang.expanders import Expander, TextNodeExpander
+from sneakylang.macro_caller import get_content, parse_macro_arguments
+from sneakylang.node import TextNode
+
+GROWTH = 8
+TOLERANCE = 2
+# times shorter than this are measured as this, so noise does not matter
+MIN_TIME = 0.005
+REPEAT = 2
+
+def measure(function, argument):
+    best = None
+    for i in range(REPEAT):
+        start = time.time()
+        function(argument)
+        elapsed = time.time() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return max(best, MIN_TIME)
+
+class StrongDocbookExpand(Expander):
+    def expand(self, node, format, node_map):
+        return u''.join([u'<emphasis>'] + [expand(child, format, node_map) for child in node.children] + [u'</emphasis>'])
+
+node_map = {
+    'docbook5' : {
+        ParagraphNode : ParagraphDocbookExpand,
+        StrongNode : StrongDocbookExpand,
+        TextNode : TextNodeExpander,
+    }
+}
+
+class LinearTestCase(TestCase):
+    def assertLinear(self, function, make_input, size):
+        small = measure(function, make_input(size))
+        large = measure(function, make_input(size * GROWTH))
+        self.assert_(large < small * GROWTH * TOLERANCE,
+            "%s times longer input took %.3fs instead of %.3fs" % (GROWTH, large, small))
+
+class TestParseComplexity(LinearTestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            ParagraphMacro : Register([StrongMacro]),
+            StrongMacro : Register([StrongMacro]),
+        })
+
+    def parse(self, stream):
+        return parse(stream, self.register_map, parsers=[Paragraph, Strong], document_root=True)
+
+    def testPlainText(self):
+        self.assertLinear(self.parse, lambda size: u'plain text ' * size, 2000)
+
+    def testRepeatedMacroBegin(self):
+        self.assertLinear(self.parse, lambda size: u'((' * size, 1000)
+
+    def testRepeatedNameWithoutEnd(self):
+        self.assertLinear(self.parse, lambda size: u'((silne ' * size, 500)
+
+    def testLongLineWithoutEnd(self):
+        self.assertLinear(self.parse, lambda size: u'((silne ' + u'a ' * size, 2000)
+
+    def testUnbalancedStrong(self):
+        self.assertLinear(self.parse, lambda size: u'"""a ' * size, 250)
+
+    def testNegations(self):
+        self.assertLinear(self.parse, lambda size: u'!((silne a)) ' * size, 250)
+
+    def testFlatMacros(self):
+        self.assertLinear(self.parse, lambda size: u'a ((silne b)) ' * size, 250)
+
+    def testParagraphs(self):
+        self.assertLinear(self.parse, lambda size: u'a ""b""\n\n' * size, 250)
+
+    def testDeepNesting(self):
+        self.assertLinear(self.parse, lambda size: u'((silne ' * size + u'a' + u'))' * size, 20)
+
+class TestGetContentComplexity(LinearTestCase):
+    def testLongLineWithoutEnd(self):
+        self.assertLinear(get_content, lambda size: u'silne ' + u'a ' * size, 5000)
+
+    def testNestedWithoutEnd(self):
+        self.assertLinear(get_content, lambda size: u'silne ' + u'((silne ' * size, 2000)
+
+    def testNestedEndedOnce(self):
+        self.assertLinear(get_content, lambda size: u'silne ' + u'((silne a' * size + u'))', 2000)
+
+    def testLongArguments(self):
+        self.assertLinear(get_content, lambda size: u'silne ' + u'"a" "' * size + u'))', 2000)
+
+class TestArgumentsComplexity(LinearTestCase):
+    def testWords(self):
+        self.assertLinear(parse_macro_arguments, lambda size: u'ab ' * size, 250)
+
+    def testMacroBeginsWithoutEnd(self):
+        self.assertLinear(parse_macro_arguments, lambda size: u'((a ' * size, 250)
+
+    def testMacroBeginsAfterEnd(self):
+        self.assertLinear(parse_macro_arguments, lambda size: u'a)) ' + u'((a ' * size, 250)
+
+    def testUnbalancedLongArguments(self):
+        self.assertLinear(parse_macro_arguments, lambda size: u'"a ' * size, 250)
+
+class TestExpandComplexity(LinearTestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            ParagraphMacro : Register([StrongMacro]),
+            StrongMacro : Register([StrongMacro]),
+        })
+
+    def expand(self, tree):
+        return expand(tree.children, 'docbook5', node_map)
+
+    def testFlatTree(self):
+        self.assertLinear(self.expand, lambda size: parse(u'a ((silne b)) ' * size, self.register_map, parsers=[Paragraph], document_root=True), 250)
+
+    def testParagraphs(self):
+        self.assertLinear(self.expand, lambda size: parse(u'a ((silne b))\n\n' * size, self.register_map, parsers=[Paragraph], document_root=True), 250)
+
+    def testDeepTree(self):
+        self.assertLinear(self.expand, lambda size: parse(u'((silne ' * size + u'a' + u'))' * size, self.register_map, document_root=True), 20)
+
+if __name__ == "__main__":
+    main()
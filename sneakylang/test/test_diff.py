@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test differences between trees """
+
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import parse, Register, RegisterMap
+from sneakylang.diff import diff, subtree_hash
+from sneakylang.expanders import Expander, TextNodeExpander
+from sneakylang.node import TextNode
+
+class StrongDocbookExpand(Expander):
+    def expand(self, node, format, node_map):
+        return u''.join([u'<emphasis>'] + [expand(child, format, node_map) for child in node.children] + [u'</emphasis>'])
+
+class TestDiff(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            StrongMacro : Register([StrongMacro]),
+            ParagraphMacro : Register([StrongMacro], parsers_list),
+        })
+        self.node_map = {
+            'docbook5' : {
+                StrongNode : StrongDocbookExpand,
+                TextNode : TextNodeExpander,
+                ParagraphNode : ParagraphDocbookExpand,
+            }
+        }
+
+    def parse(self, stream):
+        return parse(stream, self.register_map, parsers=parsers_list, document_root=True)
+
+    def diff(self, old, new, **kwargs):
+        return diff(self.parse(old), self.parse(new), format='docbook5', node_map=self.node_map, **kwargs)
+
+    def testHashes(self):
+        self.assertEquals(subtree_hash(self.parse(u'a ((silne b))')), subtree_hash(self.parse(u'a ((silne b))')))
+        self.assertNotEquals(subtree_hash(self.parse(u'a ((silne b))')), subtree_hash(self.parse(u'a ((silne c))')))
+        self.assertNotEquals(subtree_hash(self.parse(u'a ((silne b))')), subtree_hash(self.parse(u'a b')))
+
+    def testSameTrees(self):
+        self.assertEquals([], self.diff(u'a ((silne b))\n\nc', u'a ((silne b))\n\nc'))
+
+    def testNestedTextChanged(self):
+        changes = self.diff(u'a ((silne c)) d', u'a ((silne x)) d')
+        self.assertEquals(1, len(changes))
+        change = changes[0]
+        self.assertEquals('replace', change.action)
+        self.assertEquals((1,), change.path)
+        self.assertEquals((0, 1), (change.old_start, change.old_end))
+        self.assertEquals(u'x', change.output)
+
+    def testNodeReplaced(self):
+        changes = self.diff(u'a ((silne b))', u'a b')
+        self.assertEquals(['replace'], [change.action for change in changes])
+        self.assertEquals((), changes[0].path)
+        self.assertEquals((0, 2), (changes[0].old_start, changes[0].old_end))
+        self.assertEquals(u'a b', changes[0].output)
+
+    def testInsertAndDelete(self):
+        changes = self.diff(u'((silne a))((silne b))((silne c))', u'((silne x))((silne a))((silne c))')
+        self.assertEquals(['insert', 'delete'], [change.action for change in changes])
+        self.assertEquals((0, 0, 0, 1), (changes[0].old_start, changes[0].old_end, changes[0].new_start, changes[0].new_end))
+        self.assertEquals(u'<emphasis>x</emphasis>', changes[0].output)
+        self.assertEquals((1, 2), (changes[1].old_start, changes[1].old_end))
+        self.assertEquals([], changes[1].nodes)
+        self.assertEquals(None, changes[1].output)
+
+    def testRootsDiffer(self):
+        old, new = StrongNode(), TextNode(u'a')
+        changes = diff(old, new)
+        self.assertEquals(None, changes[0].path)
+        self.assertEquals([new], changes[0].nodes)
+
+    def testDocumentOrder(self):
+        def node(*children):
+            parent = Node()
+            for child in children:
+                if isinstance(child, basestring):
+                    child = TextNode(child)
+                parent.children.append(child)
+                child.parent = parent
+            return parent
+        old = node(node(u'a'), u'x', node(u'y'))
+        new = node(node(u'b'), u'x', node(), u'z')
+        changes = diff(old, new)
+        self.assertEquals([((0,), 0, 1), ((), 2, 3)], [(change.path, change.old_start, change.old_end) for change in changes])
+
+    def testNodeAndList(self):
+        old, new = self.parse(u'a'), self.parse(u'b')
+        self.assertEquals([((), 0, 1)], [(change.path, change.old_start, change.old_end) for change in diff(old, new.children)])
+        self.assertEquals([((), 0, 1)], [(change.path, change.old_start, change.old_end) for change in diff(old.children, new)])
+
+    def testNodeLists(self):
+        changes = diff(self.parse(u'a').children, self.parse(u'b').children)
+        self.assertEquals([((), 0, 1)], [(change.path, change.old_start, change.old_end) for change in changes])
+        self.assertEquals(None, changes[0].output)
+
+    def testAttributes(self):
+        old, new = StrongNode(), StrongNode()
+        old.level, new.level = 1, 2
+        self.assertEquals([], diff([old], [new]))
+        self.assertEquals(1, len(diff([old], [new], attributes=['level'])))
+
+if __name__ == "__main__":
+    main()
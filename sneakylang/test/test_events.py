@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test event-driven parsing """
+
+from unittest import main, TestCase
+
+from module_test import *
+
+from sneakylang import parse, Document, Register, RegisterMap
+from sneakylang.document import DocumentNode
+from sneakylang.err import UnsupportedInEventMode
+from sneakylang.events import ContentHandler, EventBuilder, TreeBuildingHandler, parse_events
+
+class CollectingHandler(ContentHandler):
+    def __init__(self):
+        self.events = []
+
+    def start_node(self, node):
+        self.events.append(('start', node.__class__))
+
+    def text(self, content):
+        self.events.append(('text', content))
+
+    def end_node(self, node):
+        self.events.append(('end', node.__class__))
+
+class TestEvents(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            ParagraphMacro : Register([StrongMacro]),
+            StrongMacro : Register([]),
+            OneArgumentMacro : Register(),
+            Document : Register([ParagraphMacro, OneArgumentMacro])
+        })
+
+    def testEvents(self):
+        handler = CollectingHandler()
+        parse_events('a ((odstavec ((silne b)) c)) !((onearg x))', self.register_map, handler)
+        self.assertEquals([
+            ('start', DocumentNode),
+            ('text', u'a '),
+            ('start', ParagraphNode),
+            ('start', StrongNode),
+            ('text', u'b'),
+            ('end', StrongNode),
+            ('text', u' c'),
+            ('end', ParagraphNode),
+            ('text', u' ((onearg x))'),
+            ('end', DocumentNode),
+        ], handler.events)
+
+    def testMacroAppendedText(self):
+        handler = CollectingHandler()
+        parse_events('((onearg x))', self.register_map, handler)
+        self.assertEquals([
+            ('start', DocumentNode),
+            ('start', DummyNode),
+            ('text', u'x'),
+            ('end', DummyNode),
+            ('end', DocumentNode),
+        ], handler.events)
+
+    def testRebuildingTree(self):
+        s = 'a ((odstavec ((silne b)) c)) d'
+        handler = TreeBuildingHandler()
+        parse_events(s, self.register_map, handler)
+        tree = parse(s, self.register_map, document_root=True)
+        self.assertEquals(DocumentNode, handler.root.__class__)
+        self.assertEquals([n.__class__ for n in tree.children], [n.__class__ for n in handler.root.children])
+        self.assertEquals(u'b', handler.root.children[1].children[0].children[0].content)
+        self.assertEquals(u' d', handler.root.children[2].content)
+
+    def testReportedNodesUnchanged(self):
+        builder = EventBuilder(CollectingHandler())
+        builder.set_root(DocumentNode())
+        builder.append(ParagraphNode())
+        self.assertRaises(UnsupportedInEventMode, builder.replace, StrongNode())
+        self.assertRaises(UnsupportedInEventMode, builder.set_actual_node, builder.root)
+        builder.set_actual_node(builder.actual_node)
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from sneakylang.macro import *
 from sneakylang.err import *
 from sneakylang.macro_caller import *
 from sneakylang.register import Register, RegisterMap
+from sneakylang.expanders import TextNodeExpander, escape
 
 #logging.basicConfig(level=logging.DEBUG)
 
@@ -32,3 +33,39 @@ class TestExpanding(TestCase):
         o = parse(s, self.register_map, document_root=True)
         self.assertRaises(ExpanderError, lambda:expand(o, 'docbook5', self.expander_map))
 
+
+class TestTextEscaping(TestCase):
+    def setUp(self):
+        self.node_map = {
+            'docbook5' : {
+                ParagraphNode : ParagraphDocbookExpand,
+                TextNode : TextNodeExpander,
+            }
+        }
+
+    def testEscape(self):
+        self.assertEquals(u'plain text', escape(u'plain text'))
+        self.assertEquals(u'&lt;a href="x"&gt; &amp;', escape(u'<a href="x"> &'))
+        self.assertEquals(u'&lt;a href=&quot;x&quot;&gt;', escape(u'<a href="x">', quote=True))
+
+    def testQuotingDependsOnFormat(self):
+        class AttributeTextExpander(TextNodeExpander):
+            quote_formats = ('docbook5',)
+        node_map = {'docbook5' : {TextNode : AttributeTextExpander}}
+        self.assertEquals(u'&quot;a&quot;', expand(TextNode(u'"a"'), 'docbook5', node_map))
+
+    def testExpandingRunOfTextNodes(self):
+        p = ParagraphNode()
+        for content in [u'<a>', u' & ', u'b']:
+            tn = TextNode(content)
+            tn.parent = p
+            p.children.append(tn)
+        p.children.insert(1, ParagraphNode())
+        self.assertEquals(u'<para>&lt;a&gt;<para></para> &amp; b</para>', expand(p, 'docbook5', self.node_map))
+
+    def testSubclassExpandingRun(self):
+        class UpperTextExpander(TextNodeExpander):
+            def expand(self, node, format=None, *args, **kwargs):
+                return u'[%s]' % node.content.upper()
+        node_map = {'docbook5' : {TextNode : UpperTextExpander}}
+        self.assertEquals(u'[A][B]', expand([TextNode(u'a'), TextNode(u'b')], 'docbook5', node_map))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test array-backed tree store """
+
+from unittest import main, TestCase
+
+from module_test import *
+
+from sneakylang import parse, expand, Document, Register, RegisterMap
+from sneakylang.document import DocumentNode
+from sneakylang.expanders import TextNodeExpander
+from sneakylang.flattree import FlatNode, FlatTree, TEXT_SEARCH_WINDOW
+
+class DocumentDocbookExpand(Expander):
+    def expand(self, node, format, node_map):
+        return expand(node.children, format, node_map)
+
+class TestFlatTree(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            ParagraphMacro : Register([StrongMacro]),
+            StrongMacro : Register([]),
+            PictureKeywordMacro : Register(),
+            Document : Register([ParagraphMacro, PictureKeywordMacro])
+        })
+        self.node_map = {
+            'docbook5' : {
+                DocumentNode : DocumentDocbookExpand,
+                ParagraphNode : ParagraphDocbookExpand,
+                StrongNode : DocumentDocbookExpand,
+                TextNode : TextNodeExpander,
+            }
+        }
+        self.source = u'((odstavec ((silne silny)) text <odstavce>)) konec'
+        self.tree = parse(self.source, self.register_map, document_root=True)
+
+    def testNodeApi(self):
+        flat = FlatTree.from_node(self.tree, self.source)
+        root = flat.root
+        self.assertEquals(DocumentNode, root.__class__)
+        self.assertEquals(None, root.parent)
+        self.assertEquals([ParagraphNode, TextNode], [n.__class__ for n in root.children])
+        paragraph = root.children[0]
+        self.assertEquals(root, paragraph.parent)
+        self.assertEquals(True, isinstance(paragraph.children[0], StrongNode))
+        self.assertEquals(u'silny', paragraph.children[0].children[0].content)
+        self.assertEquals(u' konec', root.children[1].content)
+
+    def testTextOffsetsPointToSource(self):
+        flat = FlatTree.from_node(self.tree, self.source)
+        self.assertEquals([], flat.strings)
+        flat = FlatTree.from_node(self.tree)
+        self.assertEquals(u' konec', flat.root.children[1].content)
+
+    def testTextNotInSource(self):
+        tree = DocumentNode()
+        tree.add_child(TextNode(u'rewritten'))
+        tree.actual_text_content = None
+        tree.add_child(TextNode(u'konec'))
+        flat = FlatTree.from_node(tree, self.source)
+        self.assertEquals([u'rewritten'], flat.strings)
+        self.assertEquals([u'rewritten', u'konec'], [node.content for node in flat.root.children])
+
+    def testTextSearchedNearPreviousText(self):
+        source = u'a' + u' ' * (TEXT_SEARCH_WINDOW * 2) + u'b'
+        tree = DocumentNode()
+        tree.add_child(TextNode(u'b'))
+        self.assertEquals([u'b'], FlatTree.from_node(tree, source).strings)
+        self.assertEquals([], FlatTree.from_node(tree, source[TEXT_SEARCH_WINDOW+1:]).strings)
+
+    def testExtraAttributes(self):
+        tree = parse('((picture http://pic.png title="My picture"))', self.register_map, document_root=True)
+        picture = FlatTree.from_node(tree).root.children[0]
+        self.assertEquals(u'My picture', picture.kwargs['title'])
+        self.assertRaises(AttributeError, lambda:picture.nonexistent)
+
+    def testExpandWalksFlatTree(self):
+        expected = expand(self.tree, 'docbook5', self.node_map)
+        self.assertEquals(expected, expand(FlatTree.from_node(self.tree).root, 'docbook5', self.node_map))
+
+    def testConversionBack(self):
+        tree = FlatTree.from_node(self.tree, self.source).to_node()
+        self.assertEquals(DocumentNode, tree.__class__)
+        self.assertEquals(tree, tree.children[0].parent)
+        self.assertEquals(u'silny', tree.children[0].children[0].children[0].content)
+
+    def testNodeList(self):
+        flat = FlatTree.from_node(self.tree.children)
+        self.assertEquals([ParagraphNode, TextNode], [n.__class__ for n in flat.root])
+        self.assertEquals([ParagraphNode, TextNode], [n.__class__ for n in flat.to_node()])
+
+if __name__ == '__main__':
+    main()
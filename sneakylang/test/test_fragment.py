@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test cache of nodes created by cacheable macros """
+
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import expand, parse, render, Register, RegisterMap
+from sneakylang.expanders import Expander, TextNodeExpander
+from sneakylang.fragment import FragmentCache
+from sneakylang.limits import Limits
+from sneakylang.node import TextNode
+from sneakylang.treebuilder import TreeBuilder
+
+class CachedPictureMacro(PictureKeywordMacro):
+    cacheable = True
+    calls = 0
+
+    def expand_to_nodes(self, content, **kwargs):
+        CachedPictureMacro.calls += 1
+        PictureKeywordMacro.expand_to_nodes(self, content, **kwargs)
+
+class CachedStrongMacro(StrongMacro):
+    cacheable = True
+    calls = 0
+
+    def expand_to_nodes(self, content, **kwargs):
+        CachedStrongMacro.calls += 1
+        StrongMacro.expand_to_nodes(self, content, **kwargs)
+
+class TwoNodesMacro(Macro):
+    name = 'two'
+    cacheable = True
+    calls = 0
+
+    def expand_to_nodes(self, *args, **kwargs):
+        TwoNodesMacro.calls += 1
+        self.builder.append(DummyNode(), move_actual=False)
+        self.builder.append(StrongNode(), move_actual=False)
+
+class NameExpander(Expander):
+    def expand(self, node, format, node_map):
+        return u'<%s/>' % node.__class__.__name__
+
+class PictureExpander(Expander):
+    calls = 0
+
+    def expand(self, node, format, node_map):
+        PictureExpander.calls += 1
+        return u'<img src="%s" />' % node.args[0]
+
+class StrongExpander(Expander):
+    def expand(self, node, format, node_map):
+        return u''.join([u'<b>'] + [expand(child, format, node_map) for child in node.children] + [u'</b>'])
+
+node_map = {
+    'xhtml' : {
+        PictureNode : PictureExpander,
+        StrongNode : StrongExpander,
+        TextNode : TextNodeExpander,
+    }
+}
+
+names_map = {
+    'xhtml' : {
+        DummyNode : NameExpander,
+        StrongNode : NameExpander,
+        TextNode : TextNodeExpander,
+    }
+}
+
+class TestFragmentCache(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            CachedPictureMacro : Register([]),
+            CachedStrongMacro : Register([CachedPictureMacro]),
+        })
+        self.register_map.fragment_cache = FragmentCache(max_size=10)
+        CachedPictureMacro.calls = 0
+        CachedStrongMacro.calls = 0
+        PictureExpander.calls = 0
+
+    def testMacroCalledOnce(self):
+        tree = parse(u'((picture a.png title=x)) b ((picture a.png title=x))', self.register_map, document_root=True)
+        self.assertEquals(1, CachedPictureMacro.calls)
+        self.assertEquals([PictureNode, TextNode, PictureNode], [node.__class__ for node in tree.children])
+        self.assertEquals(tree.children[0].args, tree.children[2].args)
+        self.assertEquals(tree.children[0].kwargs, tree.children[2].kwargs)
+        self.assertEquals(False, tree.children[0] is tree.children[2])
+        self.assertEquals(tree, tree.children[2].parent)
+
+    def testCacheSharedBetweenDocuments(self):
+        parse(u'((silne "a ((picture x.png)) b"))', self.register_map, document_root=True)
+        tree = parse(u'c ((silne "a ((picture x.png)) b"))', self.register_map, document_root=True)
+        self.assertEquals(1, CachedStrongMacro.calls)
+        self.assertEquals(1, CachedPictureMacro.calls)
+        self.assertEquals(u'c <b>a <img src="x.png" /> b</b>', expand(tree.children, 'xhtml', node_map))
+
+    def testOutputCached(self):
+        for i in range(3):
+            tree = parse(u'((picture a.png))', self.register_map, document_root=True)
+            self.assertEquals(u'<img src="a.png" />', expand(tree.children, 'xhtml', node_map))
+        self.assertEquals(1, PictureExpander.calls)
+        expand(tree.children, 'xhtml', {'xhtml' : dict(node_map['xhtml'])})
+        self.assertEquals(2, PictureExpander.calls)
+
+    def testDifferentArguments(self):
+        tree = parse(u'((picture a.png)) ((picture b.png))', self.register_map, document_root=True)
+        self.assertEquals(2, CachedPictureMacro.calls)
+        self.assertEquals([u'b.png'], tree.children[2].args)
+
+    def testLeastRecentlyUsedEvicted(self):
+        cache = FragmentCache(max_size=2)
+        self.register_map.fragment_cache = cache
+        parse(u'((picture a)) ((picture b)) ((picture a)) ((picture c))', self.register_map, document_root=True)
+        self.assertEquals(2, len(cache))
+        self.assertEquals(3, CachedPictureMacro.calls)
+        parse(u'((picture a))', self.register_map, document_root=True)
+        self.assertEquals(3, CachedPictureMacro.calls)
+        parse(u'((picture b))', self.register_map, document_root=True)
+        self.assertEquals(4, CachedPictureMacro.calls)
+
+    def testRenderMultipleNodes(self):
+        register_map = RegisterMap({TwoNodesMacro : Register([])})
+        register_map.fragment_cache = FragmentCache()
+        TwoNodesMacro.calls = 0
+        for i in range(2):
+            self.assertEquals(u'<DummyNode/><StrongNode/>', render(u'((two a))', register_map, 'xhtml', names_map))
+        self.assertEquals(1, TwoNodesMacro.calls)
+
+    def testLimitsApplyToCachedNodes(self):
+        stream = u' '.join([u'((silne "a ((picture x.png)) b"))'] * 4)
+        for limits in [Limits(max_nodes=9), Limits(max_depth=1)]:
+            self.register_map.fragment_cache = None
+            expected = expand(parse(stream, self.register_map, document_root=True, limits=limits).children, 'xhtml', node_map)
+            self.register_map.fragment_cache = FragmentCache()
+            # cached without limits
+            parse(stream, self.register_map, document_root=True)
+            tree = parse(stream, self.register_map, document_root=True, limits=limits)
+            self.assertEquals(expected, expand(tree.children, 'xhtml', node_map))
+
+    def testCachedNodesCounted(self):
+        stream = u'((silne "a ((picture x.png)) b")) ((silne "a ((picture x.png)) b"))'
+        builder = TreeBuilder()
+        parse(stream, self.register_map, builder=builder, document_root=True)
+        self.assertEquals(1, CachedStrongMacro.calls)
+        self.register_map.fragment_cache = None
+        uncached = TreeBuilder()
+        parse(stream, self.register_map, builder=uncached, document_root=True)
+        self.assertEquals(9, uncached.node_count)
+        self.assertEquals(uncached.node_count, builder.node_count)
+
+    def testCacheSharedBetweenRegisterMaps(self):
+        other_map = RegisterMap({
+            CachedPictureMacro : Register([]),
+            CachedStrongMacro : Register([]),
+        })
+        other_map.fragment_cache = self.register_map.fragment_cache
+        parse(u'((silne "a ((picture x.png)) b"))', self.register_map, document_root=True)
+        tree = parse(u'((silne "a ((picture x.png)) b"))', other_map, document_root=True)
+        self.assertEquals(u'<b>a ((picture x.png)) b</b>', expand(tree.children, 'xhtml', node_map))
+
+    def testWithoutCache(self):
+        self.register_map.fragment_cache = None
+        parse(u'((picture a.png)) ((picture a.png))', self.register_map, document_root=True)
+        self.assertEquals(2, CachedPictureMacro.calls)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test what is loaded when importing package """
+
+import os
+import sys
+from subprocess import Popen, PIPE
+from unittest import main, TestCase
+
+from module_test import *
+
+from sneakylang import warm_up, Register, RegisterMap
+
+# modules that must not be loaded by plain import sneakylang
+SLOW_MODULES = ['array', 'cgi', 'logging', 'pyparsing', 'threading']
+
+def run_python(code):
+    """ Run code in new interpreter, return its output """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([p for p in sys.path if p])
+    process = Popen([sys.executable, '-c', code], stdout=PIPE, env=env)
+    output = process.communicate()[0]
+    if process.returncode != 0:
+        raise AssertionError('Python exited with status %s' % process.returncode)
+    return output
+
+class TestImport(TestCase):
+    def testSlowModulesNotImported(self):
+        loaded = run_python('import sys; import sneakylang; print(" ".join(sorted(sys.modules.keys())))').split()
+        self.assertEquals('sneakylang' in loaded, True)
+        self.assertEquals([], [module for module in SLOW_MODULES if module in loaded])
+
+    def testWarmUp(self):
+        warm_up(RegisterMap({StrongMacro : Register()}))
+        self.assertEquals(True, 'pyparsing' in sys.modules)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test limits of parsing """
+
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import parse, Register, RegisterMap, TreeBuilder
+from sneakylang.err import LimitExceeded
+from sneakylang.limits import BREACH_RAISE, Limits
+from sneakylang.node import TextNode
+
+class TestLimits(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            StrongMacro : Register([StrongMacro]),
+        })
+
+    def parse(self, stream, **kwargs):
+        return parse(stream, self.register_map, document_root=True, **kwargs)
+
+    def testNoLimits(self):
+        tree = self.parse(u'a ((silne ((silne ((silne x)))))) b', limits=Limits())
+        self.assertEquals(StrongNode, tree.children[1].children[0].children[0].__class__)
+
+    def testDepthDegradesToText(self):
+        tree = self.parse(u'a ((silne ((silne ((silne x)))))) b', limits=Limits(max_depth=2))
+        inner = tree.children[1].children[0]
+        self.assertEquals(StrongNode, inner.__class__)
+        self.assertEquals([u'((silne x))'], [node.content for node in inner.children])
+        self.assertEquals(u' b', tree.children[2].content)
+
+    def testDeepNestingWithinRecursionLimit(self):
+        depth = 1000
+        stream = u'((silne ' * depth + u'x' + u'))' * depth
+        tree = self.parse(stream, limits=Limits(max_depth=10))
+        node = tree
+        levels = 0
+        while node.children and isinstance(node.children[0], StrongNode):
+            node = node.children[0]
+            levels += 1
+        self.assertEquals(10, levels)
+        self.assertEquals(TextNode, node.children[0].__class__)
+
+    def testMacros(self):
+        tree = self.parse(u'((silne a)) ((silne b)) ((silne c))', limits=Limits(max_macros=2))
+        self.assertEquals([StrongNode, TextNode, StrongNode, TextNode], [node.__class__ for node in tree.children])
+        self.assertEquals(u' ((silne c))', tree.children[-1].content)
+
+    def testNodes(self):
+        tree = self.parse(u'((silne a)) ((silne b)) ((silne c))', limits=Limits(max_nodes=2))
+        self.assertEquals(u' ((silne b)) ((silne c))', tree.children[-1].content)
+
+    def testLookahead(self):
+        stream = u'((silne %s)) ((silne b))' % (u'x' * 1000)
+        tree = self.parse(stream, limits=Limits(max_lookahead=100))
+        self.assertEquals(TextNode, tree.children[0].__class__)
+        self.assertEquals(StrongNode, tree.children[-1].__class__)
+
+    def testTimeBudget(self):
+        stream = u'((silne a)) ' * 200
+        tree = self.parse(stream, limits=Limits(time_budget=-1))
+        self.assertEquals(TextNode, tree.children[-1].__class__)
+        self.assertEquals(stream, u''.join([node.__class__ is StrongNode and u'((silne a))' or node.content for node in tree.children]))
+        self.assert_(len(tree.children) < 200)
+
+    def testRaise(self):
+        self.assertRaises(LimitExceeded, self.parse, u'((silne a)) ((silne b))', limits=Limits(max_macros=1, on_breach=BREACH_RAISE))
+
+    def testExceededLimit(self):
+        try:
+            self.parse(u'((silne ((silne x))))', limits=Limits(max_depth=1, on_breach=BREACH_RAISE))
+        except LimitExceeded, err:
+            self.assertEquals('depth', err.limit)
+        else:
+            self.fail('LimitExceeded not raised')
+
+    def testBadBreach(self):
+        self.assertRaises(ValueError, Limits, on_breach='ignore')
+
+    def testRegisterMapLimits(self):
+        self.register_map.limits = Limits(max_macros=1)
+        tree = self.parse(u'((silne a)) ((silne b))')
+        self.assertEquals(u' ((silne b))', tree.children[-1].content)
+
+    def testGuardRemovedAfterParsing(self):
+        builder = TreeBuilder()
+        parse(u'((silne a))', self.register_map, builder=builder, document_root=True, limits=Limits(max_macros=1))
+        self.assertEquals(None, builder.limit_guard)
+        self.assertEquals(2, builder.node_count)
+
+if __name__ == "__main__":
+    main()
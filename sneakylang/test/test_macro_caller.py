@@ -7,6 +7,7 @@ import os
 import sys
 sys.path.insert(0, os.path.join(os.pardir, os.pardir))
 
+import re
 from unittest import main, TestCase
 from module_test import *
 
@@ -85,5 +86,157 @@ class TestMacroCaller(TestCase):
         self.assertEquals(res[0].__class__, DummyMacro)
         self.assertEquals(res[1], '')
 
+class TestMacroScanner(TestCase):
+    def testContentEnd(self):
+        scanner = MacroScanner(u'((silne a ((silne b)) c)) d')
+        self.assertEquals(23, scanner.content_end(2))
+        self.assertEquals(u'silne b', scanner.get_content(12))
+        self.assertEquals(None, scanner.get_content(25))
+
+    def testLongArgumentSkipped(self):
+        self.assertEquals(u'a "))" b', MacroScanner(u'a "))" b))').get_content(0))
+
+    def testContentEndsWithLine(self):
+        scanner = MacroScanner(u'a\nb))')
+        self.assertEquals(None, scanner.get_content(0))
+        self.assertEquals(u'b', scanner.get_content(2))
+
+    def testUnfinishedMacroAtEnd(self):
+        self.assertEquals(None, get_content(u''))
+        self.assertEquals(None, MacroScanner(u'text ((').get_content(7))
+
+    def testDeepNesting(self):
+        depth = sys.getrecursionlimit() * 2
+        line = u'((' * depth + u'x' + u'))' * depth
+        self.assertEquals(line[2:-2], MacroScanner(line).get_content(2))
+
+    def testSubScannerSharesResults(self):
+        scanner = MacroScanner(u'((silne a ((silne b)) c))')
+        scanner.get_content(2)
+        sub_scanner = scanner.sub_scanner(u'a ((silne b)) c', 2)
+        self.assertEquals(8, sub_scanner.offset)
+        self.assertEquals(15, len(sub_scanner))
+        self.assertEquals(u'silne b', sub_scanner.get_content(4))
+        self.assertEquals(None, sub_scanner.get_content(13))
+        self.assertTrue(sub_scanner._scans is scanner._scans)
+        self.assertEquals(None, scanner.sub_scanner(u'x', 2))
+
+class TestMultilineMacro(TestCase):
+    def setUp(self):
+        from sneakylang import macro_caller
+        self.macro_caller = macro_caller
+        self.allow_multiline = macro_caller.ALLOW_MULTILINE_MACRO
+        self.lookahead = macro_caller.MAX_MACRO_LOOKAHEAD
+        macro_caller.ALLOW_MULTILINE_MACRO = True
+        self.reg = Register([DummyMacro])
+
+    def tearDown(self):
+        self.macro_caller.ALLOW_MULTILINE_MACRO = self.allow_multiline
+        self.macro_caller.MAX_MACRO_LOOKAHEAD = self.lookahead
+
+    def testContent(self):
+        self.assertEquals(u'arg \narg \n', get_content(u'arg \narg \n))'))
+        self.assertEquals(u'a ((b\n)) c', get_content(u'a ((b\n)) c)) d'))
+        self.assertEquals(None, get_content(u'arg \narg'))
+
+    def testUnfinishedNestedMacro(self):
+        self.assertEquals(None, get_content(u'a ((b))'))
+
+    def testLookahead(self):
+        self.macro_caller.MAX_MACRO_LOOKAHEAD = 10
+        self.assertEquals(u'a\nb', get_content(u'a\nb))'))
+        self.assertEquals(None, get_content(u'a' * 20 + u'))'))
+        scanner = MacroScanner(u'a' * 50 + u'))')
+        self.assertEquals(None, scanner.get_content(0, multiline=True, lookahead=10))
+        self.assertEquals(u'a' * 8, scanner.get_content(42, multiline=True, lookahead=10))
+
+    def testName(self):
+        self.assertEquals(('dummy_macro', u'arg\n'), resolve_macro_name(u'dummy_macro\narg\n'))
+        self.assertEquals('dummy_macro', get_macro_name(u'((dummy_macro\n  arg\n))', self.reg))
+
+    def testArguments(self):
+        self.assertEquals([u'arg', u'long arg'], parse_macro_arguments(u'\n  arg\n  "long arg"\n'))
+
+class TestMacroSyntax(TestCase):
+    def setUp(self):
+        self.syntax = MacroSyntax(macro_begin=u'<<', macro_end=u'>>', name_argument_separator=u':')
+        self.reg = Register([DummyMacro], syntax=self.syntax)
+
+    def testDefaultsFromModule(self):
+        syntax = MacroSyntax()
+        self.assertEquals(MACRO_BEGIN, syntax.macro_begin)
+        self.assertEquals(MACRO_END, syntax.macro_end)
+        self.assertEquals(syntax.settings, get_default_syntax().settings)
+
+    def testDefaultSyntaxFollowsModule(self):
+        from sneakylang import macro_caller
+        default = get_default_syntax()
+        self.assertTrue(default is get_default_syntax())
+        macro_caller.MACRO_END = u']]'
+        try:
+            self.assertEquals(u']]', get_default_syntax().macro_end)
+        finally:
+            macro_caller.MACRO_END = u'))'
+        self.assertEquals(u'))', get_default_syntax().macro_end)
+
+    def testSplitName(self):
+        self.assertEquals((u'dummy_macro', u'a b'), self.syntax.split_name(u'dummy_macro:a b'))
+        self.assertEquals((u'dummy_macro', None), self.syntax.split_name(u'dummy_macro'))
+
+    def testContent(self):
+        self.assertEquals(u'a <<b>> c', get_content(u'a <<b>> c>> d', syntax=self.syntax))
+        self.assertEquals(None, get_content(u'a )) b', syntax=self.syntax))
+
+    def testMacroName(self):
+        self.assertEquals('dummy_macro', get_macro_name(u'<<dummy_macro:arg>>', self.reg))
+        self.assertEquals(None, get_macro_name(u'((dummy_macro arg))', self.reg))
+
+    def testRegularExpressionBegin(self):
+        syntax = MacroSyntax(macro_begin=re.compile(u'^\\[+'), macro_end=u']]')
+        reg = Register([DummyMacro], syntax=syntax)
+        self.assertEquals('dummy_macro', get_macro_name(u'[[[dummy_macro]]', reg))
+        macro, stream = expand_macro_from_stream(u'[dummy_macro a]] b', reg, TreeBuilder(), None)
+        self.assertEquals(DummyMacro, macro.__class__)
+        self.assertEquals(u' b', stream)
+
+    def testOnlyBeginCouldBeRegularExpression(self):
+        self.assertRaises(NotImplementedError, lambda:MacroSyntax(macro_end=re.compile(u'\\)+')))
+
+    def testArguments(self):
+        syntax = MacroSyntax(long_argument_begin=u"'", long_argument_end=u"'")
+        self.assertEquals([u'a b', u'c'], parse_macro_arguments(u"'a b' c", syntax=syntax))
+
+class TestNameResolving(TestCase):
+    def setUp(self):
+        self.syntax = get_default_syntax()
+        self.reg = Register([DummyMacro])
+
+    def testFindName(self):
+        self.assertEquals(u'dummy_macro', self.syntax.find_name(u'((dummy_macro a))', 2, 17))
+        self.assertEquals(u'dummy_macro', self.syntax.find_name(u'((dummy_macro))', 2, 15))
+        self.assertEquals(None, self.syntax.find_name(u'((dummy_macro', 2, 13))
+        self.assertEquals(None, self.syntax.find_name(u'((dummy_macro\n))', 2, 16))
+
+    def testNameLengthBound(self):
+        self.assertEquals(u'dummy_macro', self.syntax.find_name(u'((dummy_macro))', 2, 15, 11))
+        self.assertEquals(None, self.syntax.find_name(u'((dummy_macro))', 2, 15, 10))
+        self.assertEquals(11, self.reg.max_name_length)
+
+    def testPlainName(self):
+        self.assertEquals(True, self.syntax.is_plain_name(u'dummy_macro'))
+        self.assertEquals(False, self.syntax.is_plain_name(u'dummy"macro'))
+        self.assertEquals(False, self.syntax.is_plain_name(u'dummy((macro'))
+
+    def testContentNotScannedForUnknownName(self):
+        scanner = MacroScanner(u'((unknown ((a)) b))')
+        self.assertEquals(None, get_macro_name(u'((unknown ((a)) b))', self.reg, scanner, 0))
+        self.assertEquals({}, scanner._scans)
+
+    def testNameWithQuotes(self):
+        class QuotedNameMacro(DummyMacro):
+            name = 'a"))"b'
+        reg = Register([QuotedNameMacro])
+        self.assertEquals('a"))"b', get_macro_name(u'((a"))"b c))', reg))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -8,6 +8,8 @@
 from unittest import main, TestCase
 
 from module_test import *
+from sneakylang.err import LimitExceeded
+from sneakylang.limits import BREACH_RAISE, Limits
 from sneakylang.register import Register, RegisterMap
 from sneakylang.macro_hook import MacroHook
 
@@ -21,6 +23,33 @@ class StrongMacroHook(MacroHook):
     def post_macro(self, macro, builder):
         builder.insert(DummyNode(), 0, move_actual=False)
 
+class RecordingHook(MacroHook):
+    macro = StrongMacro
+    calls = []
+
+    def post_macro(self, macro, builder):
+        self.calls.append((self.__class__, id(self)))
+
+class PriorityRecordingHook(RecordingHook):
+    priority = 10
+
+class SubclassedStrongMacro(StrongMacro):
+    name = 'silnejsi'
+
+class LengtheningHook(MacroHook):
+    macro = StrongMacro
+
+    def pre_macro(self, stream, macro, builder):
+        return stream + u' ' + u'x' * 50
+
+class CollectingHook(MacroHook):
+    macro = StrongMacro
+    batched = True
+    collected = []
+
+    def post_parse(self, macros, builder):
+        self.collected.append([macro.__class__ for macro in macros])
+
 
 class TestMacroHook(TestCase):
     def testHookAddedToExistings(self):
@@ -39,3 +68,45 @@ class TestMacroHook(TestCase):
         self.assertEquals(StrongNode, o.children[1].__class__)
         self.assertEquals("argument replaced by hook", o.children[1].children[0].content)
 
+    def testHookInstancesReusedAndOrdered(self):
+        RecordingHook.calls = []
+        reg_map = RegisterMap({StrongMacro : Register()})
+        reg_map.add_hooks([RecordingHook, PriorityRecordingHook])
+
+        parse('((silne a)) ((silne b))', reg_map, document_root=True)
+        self.assertEquals([PriorityRecordingHook, RecordingHook] * 2, [c[0] for c in RecordingHook.calls])
+        self.assertEquals(RecordingHook.calls[0:2], RecordingHook.calls[2:4])
+
+    def testHookCalledForMacroSubclass(self):
+        reg_map = RegisterMap({SubclassedStrongMacro : Register()})
+        reg_map.add_hooks([StrongMacroHook])
+
+        o = parse('((silnejsi "long argument"))', reg_map, document_root=True)
+        self.assertEquals(DummyNode, o.children[0].__class__)
+        self.assertEquals("argument replaced by hook", o.children[1].children[0].content)
+
+    def testHookLengtheningStream(self):
+        reg_map = RegisterMap({StrongMacro : Register()})
+        reg_map.add_hooks([LengtheningHook])
+
+        o = parse(u'a ((silne b)) c', reg_map, parsers=parsers_list, document_root=True)
+        self.assertEquals([TextNode, StrongNode, TextNode], [node.__class__ for node in o.children])
+        self.assertEquals(u' c ' + u'x' * 50, o.children[2].content)
+
+    def testBatchedHook(self):
+        CollectingHook.collected = []
+        reg_map = RegisterMap({StrongMacro : Register([StrongMacro]), SubclassedStrongMacro : Register()})
+        reg_map.add_hooks([CollectingHook])
+
+        parse('((silne ((silne a)))) ((silnejsi b))', reg_map, document_root=True)
+        self.assertEquals([[StrongMacro, StrongMacro, SubclassedStrongMacro]], CollectingHook.collected)
+
+    def testBatchDroppedWhenParsingFails(self):
+        CollectingHook.collected = []
+        reg_map = RegisterMap({StrongMacro : Register()})
+        reg_map.add_hooks([CollectingHook])
+        reg_map.limits = Limits(max_macros=1, on_breach=BREACH_RAISE)
+
+        self.assertRaises(LimitExceeded, parse, '((silne a)) ((silne b))', reg_map, document_root=True)
+        self.assertEquals({}, reg_map._hook_batches)
+        self.assertEquals([], CollectingHook.collected)
@@ -8,7 +8,7 @@ from module_test import *
 
 #logging.basicConfig(level=logging.DEBUG)
 
-from sneakylang import parse, RegisterMap, Document, Register
+from sneakylang import parse, MacroSyntax, RegisterMap, Document, Register
 from sneakylang.expanders import TextNodeExpander
 
 class TestArgumentParsing(TestCase):
@@ -118,6 +118,78 @@ class TestNestedMacroSyntax(TestCase):
         self.assertEquals(o.children[0].children[0].children[0].children[0].__class__, TextNode)
         self.assertEquals(o.children[0].children[0].children[0].children[0].content, 'text')
 
+    def testDeeplyNested(self):
+        depth = 100
+        s = '((container ' * depth + 'text' + '))' * depth
+        o = parse(s, self.register_map, document_root=True)
+        for i in range(depth):
+            self.assertEquals(len(o.children), 1)
+            o = o.children[0]
+            self.assertEquals(o.__class__, DummyNode)
+        self.assertEquals(o.children[0].content, 'text')
+
+    def testUnfinishedMacroAtEnd(self):
+        o = parse('text ((', self.register_map, document_root=True)
+        self.assertEquals(len(o.children), 1)
+        self.assertEquals(o.children[0].content, 'text ((')
+
+class TestMultilineMacroSyntax(TestCase):
+    def setUp(self):
+        from sneakylang import macro_caller
+        self.macro_caller = macro_caller
+        self.allow_multiline = macro_caller.ALLOW_MULTILINE_MACRO
+        macro_caller.ALLOW_MULTILINE_MACRO = True
+        self.register_map = RegisterMap({
+            ContainerMacro : Register([ContainerMacro]),
+            StrongMacro : Register([]),
+        })
+
+    def tearDown(self):
+        self.macro_caller.ALLOW_MULTILINE_MACRO = self.allow_multiline
+
+    def testMultilineMacro(self):
+        o = parse('a ((silne\n  strong\n)) b\n((silne c))', self.register_map, document_root=True)
+        self.assertEquals([TextNode, StrongNode, TextNode, StrongNode], [node.__class__ for node in o.children])
+        self.assertEquals('strong', o.children[1].children[0].content)
+        self.assertEquals(' b\n', o.children[2].content)
+
+    def testUnfinishedMacroIsText(self):
+        o = parse('a ((silne\nstrong\ntext b', self.register_map, document_root=True)
+        self.assertEquals(1, len(o.children))
+        self.assertEquals('a ((silne\nstrong\ntext b', o.children[0].content)
+
+class TestRegisterSyntax(TestCase):
+    def setUp(self):
+        self.wiki_map = RegisterMap({
+            StrongMacro : Register([]),
+        })
+        self.other_map = RegisterMap({
+            StrongMacro : Register([StrongMacro]),
+        })
+        self.other_map.syntax = MacroSyntax(macro_begin=u'<<', macro_end=u'>>')
+
+    def testSyntaxOfRegisterMap(self):
+        s = 'a ((silne b)) <<silne c>>'
+        o = parse(s, self.wiki_map, document_root=True)
+        self.assertEquals([TextNode, StrongNode, TextNode], [node.__class__ for node in o.children])
+        self.assertEquals(' <<silne c>>', o.children[2].content)
+
+        o = parse(s, self.other_map, document_root=True)
+        self.assertEquals([TextNode, StrongNode], [node.__class__ for node in o.children])
+        self.assertEquals('a ((silne b)) ', o.children[0].content)
+        self.assertEquals('c', o.children[1].children[0].content)
+
+    def testSyntaxOfRegister(self):
+        register = Register([StrongMacro], syntax=MacroSyntax(macro_begin=u'[[', macro_end=u']]'))
+        register.visit_register_map(self.other_map)
+        o = parse('[[silne a]] <<silne b>>', self.other_map, register, document_root=True)
+        self.assertEquals([StrongNode, TextNode], [node.__class__ for node in o.children])
+
+    def testNestedMacros(self):
+        o = parse('<<silne "x >> y">> <<silne <<silne z>>>>', self.other_map, document_root=True)
+        self.assertEquals([StrongNode, TextNode, StrongNode], [node.__class__ for node in o.children])
+        self.assertEquals('x >> y', o.children[0].children[0].content)
+        self.assertEquals(StrongNode, o.children[2].children[0].__class__)
 
 class TestKeywordMacroArguments(TestCase):
     def setUp(self):
@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test memory stats of trees and parsing """
+
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import parse, Register, RegisterMap
+from sneakylang.document import DocumentNode
+from sneakylang.memory import METHOD_RUSAGE, METHOD_TRACEMALLOC, measure_parse, tree_stats
+from sneakylang.node import TextNode
+
+class TestTreeStats(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            StrongMacro : Register([StrongMacro]),
+        })
+
+    def testCounts(self):
+        tree = parse(u'ab ((silne ((silne c)))) de', self.register_map, document_root=True)
+        stats = tree_stats(tree)
+        self.assertEquals(6, stats.nodes)
+        self.assertEquals(3, stats.text_nodes)
+        self.assertEquals({'DocumentNode' : 1, 'StrongNode' : 2, 'TextNode' : 3}, stats.classes)
+        self.assertEquals(7, stats.text_length)
+        self.assertEquals(4, stats.depth)
+        self.assert_(stats.text_bytes > 0)
+        self.assert_(stats.object_bytes > 0)
+        self.assertEquals(stats.text_bytes + stats.object_bytes, stats.total_bytes)
+
+    def testNodeList(self):
+        stats = tree_stats([TextNode(u'a'), TextNode(u'b')])
+        self.assertEquals(2, stats.nodes)
+        self.assertEquals(1, stats.depth)
+
+    def testSharedTextCountedOnce(self):
+        root = DocumentNode()
+        for i in range(10):
+            strong = StrongNode()
+            strong.add_child(TextNode(u''.join([u'sha', u'red'])))
+            root.add_child(strong)
+        unshared = tree_stats(root).text_bytes
+        root.normalize()
+        self.assertEquals(unshared, tree_stats(root).text_bytes * 10)
+
+    def testReport(self):
+        report = tree_stats(parse(u'((silne a))', self.register_map, document_root=True)).report()
+        self.assert_('nodes: 3 (1 text nodes), depth 3' in report)
+        self.assert_('  StrongNode: 1' in report)
+
+class TestMeasureParse(TestCase):
+    def testTreeReturned(self):
+        register_map = RegisterMap({StrongMacro : Register([])})
+        tree, memory = measure_parse(u'a ((silne b))', register_map, document_root=True)
+        self.assertEquals([TextNode, StrongNode], [node.__class__ for node in tree.children])
+        self.assert_(memory.seconds >= 0)
+        self.assert_(memory.report().startswith('parse: '))
+
+    def testMemoryMeasured(self):
+        register_map = RegisterMap({StrongMacro : Register([])})
+        stream = u'a ((silne b)) ' * 1000
+        tree, memory = measure_parse(stream, register_map, document_root=True)
+        if memory.method is None:
+            self.skipTest('neither tracemalloc nor resource is available')
+        self.assert_(memory.method in (METHOD_TRACEMALLOC, METHOD_RUSAGE))
+        self.assert_(memory.peak >= 0)
+        self.assert_(memory.retained > 0)
+        if memory.method == METHOD_TRACEMALLOC:
+            self.assert_(memory.peak >= memory.retained)
+        self.assert_(memory.report().endswith('(%s)' % memory.method))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test concurrent resolving of pending nodes """
+
+import sys
+import time
+import traceback
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import parse, Macro, Register, RegisterMap
+from sneakylang.node import TextNode
+from sneakylang.pending import PendingNode, parse_pending, resolve_pending
+
+# stand-in for remote pages
+pages = {
+    'a' : u'page a',
+    'b' : u'page b with ((include a))',
+}
+
+FETCH_DELAY = 0.1
+
+class IncludeMacro(Macro):
+    name = 'include'
+
+    def expand_to_nodes(self, name):
+        self.append_pending(lambda: self.fetch(name), self.build, self.fallback)
+
+    def fetch(self, name):
+        time.sleep(FETCH_DELAY)
+        return pages[name]
+
+    def build(self, text, builder):
+        parse(text, self.register_map, self.register, builder=builder)
+
+    def fallback(self, error, builder):
+        builder.append(TextNode(u'missing page'), move_actual=False)
+
+register_map = RegisterMap({
+    IncludeMacro : Register([IncludeMacro]),
+})
+
+class TestPending(TestCase):
+    def testPendingNodeAppended(self):
+        tree = parse(u'x ((include a)) y', register_map, document_root=True)
+        self.assertEquals([TextNode, PendingNode, TextNode], [node.__class__ for node in tree.children])
+
+    def testResolved(self):
+        tree = parse(u'x ((include a)) y', register_map, document_root=True)
+        self.assertEquals(1, resolve_pending(tree))
+        self.assertEquals([u'x ', u'page a', u' y'], [node.content for node in tree.children])
+        self.assertEquals(tree, tree.children[1].parent)
+
+    def testNestedPendingResolved(self):
+        tree = parse_pending(u'((include b))', register_map)
+        self.assertEquals([u'page b with ', u'page a'], [node.content for node in tree.children])
+
+    def testFetchedConcurrently(self):
+        count = 8
+        start = time.time()
+        tree = parse_pending(u'((include a))' * count, register_map, max_workers=count)
+        self.assertEquals(True, time.time() - start < FETCH_DELAY * count / 2)
+        self.assertEquals([u'page a'] * count, [node.content for node in tree.children])
+
+    def testFallback(self):
+        tree = parse_pending(u'((include c))', register_map)
+        self.assertEquals(u'missing page', tree.children[0].content)
+
+    def testErrorWithoutFallback(self):
+        def fetch():
+            raise IOError('not found')
+        tree = Node()
+        tree.add_child(PendingNode(fetch, None))
+        self.assertRaises(IOError, lambda:resolve_pending(tree))
+
+    def testTracebackOfFetchKept(self):
+        def fetch():
+            raise IOError('not found')
+        tree = Node()
+        tree.add_child(PendingNode(fetch, None))
+        try:
+            resolve_pending(tree)
+        except IOError:
+            self.assertEquals('fetch', traceback.extract_tb(sys.exc_info()[2])[-1][2])
+        else:
+            self.fail('IOError not raised')
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ from unittest import TestCase
 #logging.basicConfig(level=logging.DEBUG)
 
 from sneakylang.register import *
+from sneakylang.register import get_start_chars, POSITION_OTHER
 
 from sneakylang.macro import Macro
 from sneakylang.parser import Parser
@@ -93,6 +94,107 @@ class TestParserRegister(TestCase):
         reg = ParserRegister([NationalParser])
         self.assertEquals(reg.resolve_parser(u'žšť', Register()).__class__, NationalParser)
 
+class TestParserDispatch(TestCase):
+    def testStartChars(self):
+        self.assertEquals(set([u'#']), get_start_chars(u'(#){4}'))
+        self.assertEquals(set([u'#']), get_start_chars(u'^(####)$'))
+        self.assertEquals(set([u'\n', u'=']), get_start_chars(u'(\n)?(=){1,5}(\ ){1}'))
+        self.assertEquals(set([u'a', u'b', u'c']), get_start_chars(u'[a-b]|c'))
+        self.assertEquals(None, get_start_chars(u'(\w){3}'))
+        self.assertEquals(None, get_start_chars(u'[^a]'))
+        self.assertEquals(None, get_start_chars(u'(?i)a'))
+
+    def testDispatchTable(self):
+        reg = ParserRegister([DummyParser, AnotherDummyParser, NationalParser])
+        table, fallback = reg._dispatch[POSITION_OTHER]
+        self.assertEquals([DummyParser, NationalParser], [entry[1] for entry in table[u'#']])
+        self.assertEquals([NationalParser], [entry[1] for entry in fallback])
+        self.assertEquals(None, reg.resolve_parser(u'-#', Register()))
+        self.assertEquals(NationalParser, reg.resolve_parser(u'abc', Register()).__class__)
+
+    def testPriorityOnSameLength(self):
+        class PreferredParser(Parser):
+            start = ['####']
+            macro = DummyMacro
+            priority = 1
+
+        reg = ParserRegister([DummyParser, PreferredParser])
+        self.assertEquals(PreferredParser, reg.resolve_parser(u'####', Register()).__class__)
+        reg = ParserRegister([PreferredParser, DummyParser])
+        self.assertEquals(PreferredParser, reg.resolve_parser(u'####', Register()).__class__)
+
+    def testRegistrationOrderOnSamePriority(self):
+        class SecondParser(Parser):
+            start = ['####']
+            macro = AnotherDummyMacro
+
+        reg = ParserRegister([DummyParser, SecondParser])
+        self.assertEquals(DummyParser, reg.resolve_parser(u'####', Register()).__class__)
+        reg = ParserRegister([SecondParser, DummyParser])
+        self.assertEquals(SecondParser, reg.resolve_parser(u'####', Register()).__class__)
+
+    def testChunkIsLongestMatch(self):
+        reg = ParserRegister([DummyParser])
+        parser = reg.resolve_parser(u'#### rest', Register())
+        self.assertEquals(u'####', parser.chunk)
+        self.assertEquals(u' rest', parser.stream)
+
+class TestAnchoredParsers(TestCase):
+    def setUp(self):
+        class LineParser(Parser):
+            start = ['#']
+            macro = DummyMacro
+            anchor = ANCHOR_LINE
+
+        class DocumentStartParser(Parser):
+            start = ['--']
+            macro = AnotherDummyMacro
+            anchor = ANCHOR_DOCUMENT
+
+        self.line_parser = LineParser
+        self.document_parser = DocumentStartParser
+        self.reg = ParserRegister([LineParser, DocumentStartParser])
+
+    def resolve(self, whole_stream, offset):
+        parser = self.reg.resolve_parser(whole_stream[offset:], Register(), whole_stream)
+        return parser.__class__
+
+    def testLineAnchor(self):
+        stream = u'# a # b\n# c'
+        self.assertEquals(self.line_parser, self.resolve(stream, 0))
+        self.assertEquals(type(None), self.resolve(stream, 4))
+        self.assertEquals(self.line_parser, self.resolve(stream, 8))
+
+    def testDocumentAnchor(self):
+        stream = u'-- a\n-- b'
+        self.assertEquals(self.document_parser, self.resolve(stream, 0))
+        self.assertEquals(type(None), self.resolve(stream, 5))
+
+    def testCaretMeansDocumentAnchor(self):
+        reg = ParserRegister([DummyParserWithTwoPossibleStarts])
+        self.assertEquals(DummyParserWithTwoPossibleStarts, reg.resolve_parser(u'####', Register()).__class__)
+        self.assertEquals(None, reg.resolve_parser(u'####', Register(), u'a####'))
+
+    def testAnchoredParserInDocument(self):
+        from module_test import DummyNode
+        from sneakylang.node import TextNode
+        from sneakylang.parser import parse
+
+        class ItemMacro(Macro):
+            name = 'item'
+            def expand_to_nodes(self):
+                self.builder.append(DummyNode(), move_actual=False)
+
+        class LineParser(Parser):
+            start = ['#']
+            macro = ItemMacro
+            anchor = ANCHOR_LINE
+
+        register_map = RegisterMap({ItemMacro : Register([])})
+        tree = parse(u'# a # b\n# c', register_map, parsers=[LineParser], document_root=True)
+        self.assertEquals([DummyNode, TextNode, DummyNode, TextNode], [node.__class__ for node in tree.children])
+        self.assertEquals(u' a # b\n', tree.children[1].content)
+
 class TestRegister(TestCase):
 
     def setUp(self):
@@ -133,6 +235,72 @@ class TestRegister(TestCase):
         self.assertEquals((None, None), reg.resolve_macro('--', self.builder))
 
 
+class ProbeCountingRegister(Register):
+    def __init__(self, *args, **kwargs):
+        Register.__init__(self, *args, **kwargs)
+        self.probes = []
+
+    def resolve_parser_macro(self, stream, *args):
+        self.probes.append(len(stream))
+        return Register.resolve_parser_macro(self, stream, *args)
+
+class TestResolutionCache(TestCase):
+    def testEachPositionProbedOnce(self):
+        from module_test import StrongMacro
+        from sneakylang.parser import parse
+        register_map = RegisterMap({StrongMacro : Register()})
+        register = ProbeCountingRegister([StrongMacro])
+        register.visit_register_map(register_map)
+        tree = parse('ab ((silne c)) d ((silne)) e', register_map, register, document_root=True)
+        self.assertEquals(len(set(register.probes)), len(register.probes))
+        self.assertEquals(u'ab ', tree.children[0].content)
+        self.assertEquals(u' d ((silne)) e', tree.children[2].content)
+
+    def testCachedResultReturnedOnceForSameOffset(self):
+        register = Register()
+        cache = ResolutionCache()
+        cache.set(register, 3, (None, None))
+        self.assertEquals(None, cache.get(register, 2))
+        cache.set(register, 3, (None, None))
+        self.assertEquals((None, None), cache.get(register, 3))
+        self.assertEquals(None, cache.get(register, 3))
+
+class TestTextSkipping(TestCase):
+    def skip(self, register, stream):
+        return register.skip_text(stream)
+
+    def testNothingToResolve(self):
+        self.assertEquals(6, self.skip(Register(), u'a ((b)'))
+
+    def testSkippedToMacro(self):
+        reg = Register([DummyMacro])
+        self.assertEquals(8, self.skip(reg, u'a ((x)) ((dummy_macro))'))
+        self.assertEquals(14, self.skip(reg, u'a ((x ((y ((z '))
+
+    def testSkippedToParser(self):
+        reg = Register([DummyMacro, AnotherDummyMacro], [DummyParser, AnotherDummyParser])
+        self.assertEquals(3, self.skip(reg, u'a b####'))
+        self.assertEquals(2, self.skip(reg, u'a -- b'))
+
+    def testLineAnchoredParser(self):
+        class LineParser(Parser):
+            start = ['#']
+            macro = DummyMacro
+            anchor = ANCHOR_LINE
+
+        reg = Register([DummyMacro], [LineParser])
+        self.assertEquals(6, self.skip(reg, u'a # b\n# c'))
+
+    def testUnknownFirstCharacter(self):
+        reg = Register([AnotherDummyMacro], [NationalParser])
+        self.assertEquals(None, reg.get_text_skipper())
+
+    def testSkipperRebuiltWhenParserAdded(self):
+        reg = Register([DummyMacro, AnotherDummyMacro])
+        self.assertEquals(4, self.skip(reg, u'a --'))
+        reg.add_parser(AnotherDummyParser)
+        self.assertEquals(2, self.skip(reg, u'a --'))
+
 class TestRegisterMap(TestCase):
     def testProperVisit(self):
         map = RegisterMap()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test rendering in one pass """
+
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import parse, expand, render, Register, RegisterMap
+from sneakylang.document import Document
+from sneakylang.expanders import Expander, TextNodeExpander
+from sneakylang.macro_hook import MacroHook
+from sneakylang.node import Node, TextNode
+from sneakylang.render import RenderBuilder
+
+class StrongDocbookExpand(Expander):
+    def expand(self, node, format, node_map):
+        return u''.join([u'<emphasis>'] + [expand(child, format, node_map) for child in node.children] + [u'</emphasis>'])
+
+class ContentsNode(Node):
+    needs_tree = True
+
+register_map = RegisterMap({
+    ParagraphMacro : Register([StrongMacro], parsers_list),
+    StrongMacro : Register([]),
+    Document : Register([ParagraphMacro, StrongMacro], parsers_list),
+})
+
+node_map = {
+    'docbook5' : {
+        ParagraphNode : ParagraphDocbookExpand,
+        StrongNode : StrongDocbookExpand,
+        TextNode : TextNodeExpander,
+    }
+}
+
+class InsertingHook(MacroHook):
+    macro = StrongMacro
+
+    def post_macro(self, macro, builder):
+        builder.insert(DummyNode(), 0, move_actual=False)
+
+class DummyDocbookExpand(Expander):
+    def expand(self, node, format, node_map):
+        return u'<dummy/>'
+
+class TestRender(TestCase):
+    def setUp(self):
+        self.source = u'''\n\nFirst <paragraph> ""strong""\n\nSecond ((silne "also strong")) paragraph\n\nThird'''
+
+    def testSameAsExpandedTree(self):
+        tree = parse(self.source, register_map, parsers=parsers_list, document_root=True)
+        expected = expand(tree.children, 'docbook5', node_map)
+        self.assertEquals(expected, render(self.source, register_map, 'docbook5', node_map, parsers=parsers_list))
+
+    def testSameAsExpandedTreeWithHooks(self):
+        hooked_map = RegisterMap({StrongMacro : Register([])})
+        hooked_map.add_hooks([InsertingHook])
+        hooked_node_map = {'docbook5' : dict(node_map['docbook5'])}
+        hooked_node_map['docbook5'][DummyNode] = DummyDocbookExpand
+        source = u'a ((silne b)) c ((silne d))'
+        tree = parse(source, hooked_map, document_root=True)
+        expected = expand(tree.children, 'docbook5', hooked_node_map)
+        self.assertEquals(expected, render(source, hooked_map, 'docbook5', hooked_node_map))
+
+    def testTextOnly(self):
+        self.assertEquals(u'a &lt; b', render(u'a < b', register_map, 'docbook5', node_map))
+
+    def testOutputWritten(self):
+        chunks = []
+        self.assertEquals(None, render(self.source, register_map, 'docbook5', node_map, chunks.append, parsers=parsers_list))
+        self.assertEquals(True, len(chunks) > 2)
+        self.assertEquals(u'<para>First &lt;paragraph&gt; <emphasis>strong</emphasis></para>', chunks[0])
+        self.assertEquals(render(self.source, register_map, 'docbook5', node_map, parsers=parsers_list), u''.join(chunks))
+
+    def testExpandedNodesDiscarded(self):
+        builder = RenderBuilder('docbook5', node_map)
+        sizes = []
+        original_flush = builder.flush
+        def flush():
+            original_flush()
+            if builder.root is not None:
+                sizes.append(len(builder.root.children))
+        builder.flush = flush
+        parse(self.source * 10, register_map, parsers=parsers_list, builder=builder, document_root=True)
+        self.assertEquals(True, max(sizes) <= 2)
+
+    def testNodesNeedingTreeAreBuffered(self):
+        tree_node_map = {'docbook5' : dict(node_map['docbook5'])}
+        tree_node_map['docbook5'][ContentsNode] = Expander
+        chunks = []
+        render(self.source, register_map, 'docbook5', tree_node_map, chunks.append, parsers=parsers_list)
+        self.assertEquals(1, len(chunks))
+        self.assertEquals(render(self.source, register_map, 'docbook5', node_map, parsers=parsers_list), chunks[0])
+
+if __name__ == "__main__":
+    main()
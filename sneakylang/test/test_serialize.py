@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test tree serialization """
+
+from unittest import main, TestCase
+
+from module_test import *
+
+from sneakylang import parse, Document, Register, RegisterMap
+from sneakylang.document import DocumentNode
+from sneakylang.serialize import dumps, loads
+
+class TestSerialization(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({
+            ParagraphMacro : Register([StrongMacro]),
+            StrongMacro : Register([]),
+            PictureKeywordMacro : Register(),
+            Document : Register([ParagraphMacro, PictureKeywordMacro])
+        })
+
+    def testRoundTrip(self):
+        s = u'((odstavec ((silne silny)) text odstavce)) žluťoučký'
+        o = loads(dumps(parse(s, self.register_map, document_root=True)))
+        self.assertEquals(DocumentNode, o.__class__)
+        self.assertEquals(None, o.parent)
+        self.assertEquals(ParagraphNode, o.children[0].__class__)
+        self.assertEquals(o, o.children[0].parent)
+        self.assertEquals(StrongNode, o.children[0].children[0].__class__)
+        self.assertEquals(u'silny', o.children[0].children[0].children[0].content)
+        self.assertEquals(u' text odstavce', o.children[0].children[1].content)
+        self.assertEquals(u' žluťoučký', o.children[1].content)
+
+    def testNodeListRoundTrip(self):
+        o = loads(dumps(parse('((silne a)) b', self.register_map, document_root=True).children))
+        self.assertEquals([StrongNode, TextNode], [n.__class__ for n in o])
+        self.assertEquals(u' b', o[1].content)
+
+    def testExtraAttributes(self):
+        s = '((picture http://pic.png title="My picture"))'
+        o = loads(dumps(parse(s, self.register_map, document_root=True)))
+        self.assertEquals(PictureNode, o.children[0].__class__)
+        self.assertEquals([u'http://pic.png'], o.children[0].args)
+        self.assertEquals(u'My picture', o.children[0].kwargs['title'])
+
+    def testLoadedTreeIsBuildable(self):
+        o = loads(dumps(parse('text', self.register_map, document_root=True)))
+        o.add_child(DummyNode())
+        self.assertEquals(DummyNode, o.children[1].__class__)
+
+    def testBadData(self):
+        self.assertRaises(ValueError, lambda:loads('not a tree at all'))
+
+if __name__ == '__main__':
+    main()
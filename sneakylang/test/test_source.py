@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test reading of parser input """
+
+import mmap
+import os
+import tempfile
+from StringIO import StringIO
+from unittest import main, TestCase
+
+from module_test import *
+
+from sneakylang import parse, parse_file, Register, RegisterMap
+from sneakylang.source import iter_source, read_source
+
+class TestReadingSource(TestCase):
+    def testNewlinesNormalizedAcrossChunks(self):
+        self.assertEquals(u'a\nb\nc\n\nd', read_source(StringIO('a\r\nb\rc\n\r\nd'), chunk_size=2))
+        self.assertEquals(u'a\n', read_source(StringIO('a\r'), chunk_size=1))
+
+    def testMultibyteCharsSplitBetweenChunks(self):
+        data = u'žluťoučký kůň'.encode('utf-8')
+        self.assertEquals(u'žluťoučký kůň', read_source(StringIO(data), chunk_size=1))
+        self.assertEquals(True, len(list(iter_source(StringIO(data), chunk_size=4))) > 1)
+
+    def testUnicodeFileObject(self):
+        self.assertEquals(u'ž\n', read_source(StringIO(u'ž\r\n')))
+
+class TestParsingFiles(TestCase):
+    def setUp(self):
+        self.register_map = RegisterMap({StrongMacro : Register()})
+        fd, self.filename = tempfile.mkstemp()
+        os.write(fd, u'text\r\n((silne ž))'.encode('utf-8'))
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def assertParsed(self, o):
+        self.assertEquals(u'text\n', o.children[0].content)
+        self.assertEquals(StrongNode, o.children[1].__class__)
+        self.assertEquals(u'ž', o.children[1].children[0].content)
+
+    def testParsingFileName(self):
+        self.assertParsed(parse_file(self.filename, self.register_map, document_root=True))
+
+    def testParsingFileObject(self):
+        f = open(self.filename, 'rb')
+        try:
+            self.assertParsed(parse(f, self.register_map, document_root=True))
+        finally:
+            f.close()
+
+    def testParsingMmap(self):
+        f = open(self.filename, 'rb')
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self.assertParsed(parse_file(m, self.register_map, document_root=True))
+            m.close()
+        finally:
+            f.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+""" Test inclusion of pages """
+
+from unittest import main, TestCase
+from module_test import *
+
+from sneakylang import Register, RegisterMap
+from sneakylang.limits import Limits
+from sneakylang.treebuilder import TreeBuilder
+from sneakylang.node import TextNode
+from sneakylang.document import DocumentNode
+from sneakylang.transclusion import IncludeMacro, Transclusion
+
+class TestTransclusion(TestCase):
+    def setUp(self):
+        self.pages = {
+            'template' : u'template',
+            'page' : u'page with ((include template))',
+            'other' : u'other with ((include page))',
+            'self' : u'self ((include self))',
+            'ping' : u'ping ((include pong))',
+            'pong' : u'pong ((include ping))',
+        }
+        self.loaded = []
+        self.register_map = RegisterMap({
+            IncludeMacro : Register([IncludeMacro]),
+        })
+        self.transclusion = Transclusion(self.load, self.register_map)
+        self.register_map.transclusion = self.transclusion
+
+    def load(self, name):
+        self.loaded.append(name)
+        return self.pages[name]
+
+    def get_texts(self, tree):
+        return [node.content for node in tree.children]
+
+    def testPageParsed(self):
+        tree = self.transclusion.parse_page('page')
+        self.assertEquals(DocumentNode, tree.__class__)
+        self.assertEquals([u'page with ', u'template'], self.get_texts(tree))
+        self.assertEquals(tree, tree.children[1].parent)
+
+    def testIncludedPageParsedOnce(self):
+        self.transclusion.parse_page('page')
+        self.transclusion.parse_page('other')
+        self.transclusion.parse_page('page')
+        self.assertEquals(['page', 'template', 'other'], self.loaded)
+
+    def testCachedNodesAreCopies(self):
+        first = self.transclusion.parse_page('page')
+        second = self.transclusion.parse_page('page')
+        self.assertNotEquals(first.children[0], second.children[0])
+        self.assertEquals(self.get_texts(first), self.get_texts(second))
+
+    def testDependenciesRecorded(self):
+        self.transclusion.parse_page('other')
+        self.assertEquals(set(['page']), self.transclusion.dependencies['other'])
+        self.assertEquals(set(['template']), self.transclusion.dependencies['page'])
+        self.assertEquals(set(['page']), self.transclusion.dependents['template'])
+
+    def testInvalidateDependents(self):
+        self.transclusion.parse_page('other')
+        self.assertEquals(set(['template', 'page', 'other']), self.transclusion.invalidate('template'))
+        self.pages['template'] = u'changed'
+        self.loaded = []
+        tree = self.transclusion.parse_page('other')
+        self.assertEquals(['other', 'page', 'template'], self.loaded)
+        self.assertEquals([u'other with ', u'page with ', u'changed'], self.get_texts(tree))
+
+    def testInvalidateKeepsUnrelated(self):
+        self.transclusion.parse_page('other')
+        self.assertEquals(set(['other']), self.transclusion.invalidate('other'))
+        self.loaded = []
+        self.transclusion.parse_page('other')
+        self.assertEquals(['other'], self.loaded)
+
+    def testSelfInclusionLeftAsText(self):
+        tree = self.transclusion.parse_page('self')
+        self.assertEquals([u'self ((include self))'], self.get_texts(tree))
+
+    def testCycleLeftAsText(self):
+        tree = self.transclusion.parse_page('ping')
+        self.assertEquals([u'ping ', u'pong ((include ping))'], self.get_texts(tree))
+        self.assertEquals(set(['pong']), self.transclusion.dependencies['ping'])
+        self.assertEquals(set(['ping']), self.transclusion.dependencies['pong'])
+
+    def testPagesOfCycleNotCachedIncomplete(self):
+        self.transclusion.parse_page('ping')
+        tree = self.transclusion.parse_page('pong')
+        self.assertEquals([u'pong ', u'ping ((include pong))'], self.get_texts(tree))
+        tree = self.transclusion.parse_page('ping')
+        self.assertEquals([u'ping ', u'pong ((include ping))'], self.get_texts(tree))
+
+    def testLimitsOfIncludingPage(self):
+        self.pages['long'] = u'a ((include template)) b ((include template)) c'
+        self.pages['outer'] = u'x ((include long))'
+        tree = parse(self.pages['outer'], self.register_map, document_root=True, limits=Limits(max_nodes=3))
+        self.assertEquals([u'x ', u'a ', u'template', u' b ((include template)) c'], self.get_texts(tree))
+        # truncated page is not cached
+        self.loaded = []
+        tree = self.transclusion.parse_page('long')
+        self.assertEquals(['long'], self.loaded)
+        self.assertEquals(5, len(tree.children))
+
+    def testIncludedNodesCounted(self):
+        builder = TreeBuilder()
+        parse(self.pages['other'], self.register_map, builder=builder, document_root=True)
+        self.assertEquals(3, builder.node_count)
+        builder = TreeBuilder()
+        parse(self.pages['other'], self.register_map, builder=builder, document_root=True)
+        self.assertEquals(3, builder.node_count)
+
+    def testDepthLimitApplies(self):
+        tree = parse(self.pages['other'], self.register_map, document_root=True, limits=Limits(max_depth=1))
+        self.assertEquals([u'other with ', u'page with ((include template))'], self.get_texts(tree))
+
+    def testWithoutTransclusion(self):
+        self.register_map.transclusion = None
+        tree = parse(u'x ((include page))', self.register_map, document_root=True)
+        self.assertEquals([u'x ((include page))'], self.get_texts(tree))
+
+if __name__ == "__main__":
+    main()
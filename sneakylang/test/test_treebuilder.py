@@ -4,6 +4,7 @@
 """ Test context-sensitive Parser registry.
 """
 
+import pickle
 from os import pardir
 from os.path import join
 
@@ -205,6 +206,62 @@ class TestNodeSearch(TestCase):
         self.assertEquals(n2_1, self.builder.get_node_from_children(n2_1, self.root.children))
 
 
+class TestTextNode(TestCase):
+    def testAddingText(self):
+        tn = TextNode(u'a')
+        tn.add_char('b')
+        tn.add_text(u'cd')
+        self.assertEquals(True, tn.endswith(u'd'))
+        self.assertEquals(u'abcd', tn.content)
+        tn.add_text(u'e')
+        tn.content = u'x'
+        self.assertEquals(u'x', tn.content)
+
+    def testRemovingSuffix(self):
+        tn = TextNode(u'ab')
+        tn.add_text(u'!')
+        self.assertEquals(False, tn.remove_suffix(u'?'))
+        self.assertEquals(True, tn.remove_suffix(u'!'))
+        self.assertEquals(True, tn.remove_suffix(u'b'))
+        self.assertEquals(u'a', tn.content)
+
+    def testPickledBeforeChunks(self):
+        # Node with TextNode(u'old text') pickled when content was plain attribute
+        data = "ccopy_reg\n_reconstructor\np0\n(csneakylang.node\nNode\np1\nc__builtin__\nobject\np2\nNtp3\nRp4\n(dp5\nS'actual_text_content'\np6\ng0\n(csneakylang.node\nTextNode\np7\ng2\nNtp8\nRp9\n(dp10\nS'content'\np11\nVold text\np12\nsg6\nNsS'last_added_child'\np13\nNsS'children'\np14\n(lp15\nsS'parent'\np16\ng4\nsbsg13\ng9\nsg14\n(lp17\ng9\nasg16\nNsb."
+        tn = pickle.loads(data).children[0]
+        self.assertEquals(u'old text', tn.content)
+        tn.add_text(u'!')
+        self.assertEquals(u'old text!', tn.content)
+        self.assertEquals(u'old text!', pickle.loads(pickle.dumps(tn, 2)).content)
+
+class TextMacro(Macro):
+    name = 'text'
+
+    def expand_to_nodes(self, content):
+        self.builder.append(TextNode(content=content), move_actual=False)
+
+class TestTextNormalization(TestCase):
+    def testNormalize(self):
+        root = DummyNode()
+        for child in [TextNode(u'a'), TextNode(u''), TextNode(u'b'), DummyNode(), TextNode(u''), DummyNode(), TextNode(u'a'), TextNode(u'b')]:
+            root.children.append(child)
+        root.children[3].children.extend([TextNode(u'ab'), TextNode(u'')])
+        root.normalize()
+        self.assertEquals([TextNode, DummyNode, DummyNode, TextNode], [n.__class__ for n in root.children])
+        self.assertEquals(u'ab', root.children[0].content)
+        self.assertEquals(u'ab', root.children[3].content)
+        self.assertEquals(1, len(root.children[1].children))
+        self.assertEquals(root.children[0].content, root.children[1].children[0].content)
+        self.assertEquals(True, root.children[0].content is root.children[1].children[0].content)
+        self.assertEquals(root.children[3], root.actual_text_content)
+
+    def testAdjacentTextNodesFromMacro(self):
+        register_map = RegisterMap({TextMacro : Register()})
+        self.assertRaises(ValueError, lambda:parse('a ((text b)) c', register_map, document_root=True))
+        tree = parse('a ((text b)) c', register_map, builder=TreeBuilder(normalize_text=True), document_root=True)
+        self.assertEquals(1, len(tree.children))
+        self.assertEquals(u'a b c', tree.children[0].content)
+
 class TestBuilderCalledByMacro(TestCase):
     def setUp(self):
         self.builder = TreeBuilder()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+""" Inclusion of pages into other pages.
+
+Transclusion loads sources of pages by name (using loader given), parses
+them and keeps parsed trees, so page included from many pages is parsed
+only once. When page includes another one, dependency is recorded, and
+invalidate() drops cached page together with all pages including it
+(even indirectly). Page including itself (even indirectly) is detected,
+include is then left as text and pages in the cycle are not cached.
+
+Included pages are parsed within limits of including page. Batched hooks
+are called for every page when it's parsed (see macro_hook.py).
+
+To use it, set Transclusion instance as transclusion of RegisterMap and
+allow IncludeMacro in registers.
+"""
+
+import threading
+
+from document import DocumentNode
+from err import MacroCallError
+from fragment import Fragment
+from macro import Macro
+from parser import parse
+from treebuilder import TreeBuilder
+
+__all__ = ['IncludeMacro', 'Transclusion']
+
+class Transclusion(object):
+    def __init__(self, loader, register_map):
+        self.loader = loader
+        self.register_map = register_map
+        # name : Fragment with children of parsed page
+        self._pages = {}
+        # name : names of pages included by it
+        self.dependencies = {}
+        # name : names of pages including it
+        self.dependents = {}
+        self._lock = threading.Lock()
+        # stack of pages being parsed in current thread
+        self._local = threading.local()
+
+    def _get_stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            self._local.names = set()
+            # pages on stack whose parsing hit include cycle
+            self._local.cut = set()
+            return self._local.stack
+
+    def _add_dependency(self, name, included):
+        self._lock.acquire()
+        try:
+            self.dependencies.setdefault(name, set()).add(included)
+            self.dependents.setdefault(included, set()).add(name)
+        finally:
+            self._lock.release()
+
+    def _clear_dependencies(self, name):
+        for included in self.dependencies.pop(name, ()):
+            dependents = self.dependents.get(included)
+            if dependents is not None:
+                dependents.discard(name)
+                if not dependents:
+                    del self.dependents[included]
+
+    def get_nodes(self, name, builder=None):
+        """ Return new copy of children of parsed page. If builder including
+        the page is given, its limits apply to parsing of page too and nodes
+        of page are counted in it """
+        self._lock.acquire()
+        try:
+            fragment = self._pages.get(name)
+        finally:
+            self._lock.release()
+        if fragment is not None:
+            nodes = fragment.get_nodes()
+            if builder is not None:
+                # top level nodes are counted when appended
+                builder.node_count += fragment.size - len(nodes)
+            return nodes
+
+        stack = self._get_stack()
+        names = self._local.names
+        if name in names:
+            # pages in cycle look different when parsing starts from other one of them
+            self._local.cut.update(stack[stack.index(name):])
+            raise MacroCallError('Page %s is including itself' % name)
+
+        self._lock.acquire()
+        try:
+            self._clear_dependencies(name)
+        finally:
+            self._lock.release()
+
+        page_builder = TreeBuilder()
+        if builder is not None:
+            page_builder.node_count = builder.node_count
+        guard = getattr(builder, 'limit_guard', None)
+        if guard is None and self.register_map.limits is not None:
+            guard = self.register_map.limits.start()
+        if guard is not None:
+            page_builder.limit_guard = guard
+            truncations = guard.truncations
+
+        stack.append(name)
+        names.add(name)
+        try:
+            tree = parse(self.loader(name), self.register_map, builder=page_builder, document_root=True)
+        finally:
+            stack.pop()
+            names.discard(name)
+
+        if builder is not None:
+            builder.node_count = page_builder.node_count - len(tree.children)
+
+        complete = name not in self._local.cut
+        self._local.cut.discard(name)
+        if guard is not None and guard.truncations != truncations:
+            complete = False
+        if not complete:
+            # parsed with include cut by cycle or by limits, not cached
+            return tree.children
+
+        try:
+            fragment = Fragment(tree.children)
+        except ValueError:
+            # nodes cannot be serialized (f.e. pending ones), page is not cached
+            return tree.children
+
+        self._lock.acquire()
+        try:
+            self._pages[name] = fragment
+        finally:
+            self._lock.release()
+        return fragment.get_nodes()
+
+    def include(self, name, builder=None):
+        """ Return nodes of page included from page being parsed (into builder) """
+        stack = self._get_stack()
+        if stack:
+            self._add_dependency(stack[-1], name)
+        return self.get_nodes(name, builder)
+
+    def parse_page(self, name):
+        """ Return parsed page (DocumentNode); dependencies of page are recorded """
+        document = DocumentNode()
+        document.children = self.get_nodes(name)
+        for node in document.children:
+            node.parent = document
+        if document.children:
+            document.last_added_child = document.children[-1]
+        return document
+
+    def invalidate(self, name):
+        """ Drop page and all pages depending on it from cache. Return names of dropped pages """
+        self._lock.acquire()
+        try:
+            invalidated = set()
+            stack = [name]
+            while stack:
+                page = stack.pop()
+                if page in invalidated:
+                    continue
+                invalidated.add(page)
+                self._pages.pop(page, None)
+                stack.extend(self.dependents.get(page, ()))
+            return invalidated
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        self._lock.acquire()
+        try:
+            self._pages.clear()
+            self.dependencies.clear()
+            self.dependents.clear()
+        finally:
+            self._lock.release()
+
+
+class IncludeMacro(Macro):
+    name = 'include'
+    help = '((include page_name))'
+
+    def expand_to_nodes(self, name):
+        transclusion = getattr(self.register_map, 'transclusion', None)
+        if transclusion is None:
+            raise MacroCallError('No transclusion set for register map')
+        for node in transclusion.include(name, self.builder):
+            # text nodes of included page stay apart from text around include
+            self.builder.close_text()
+            self.builder.append(node, move_actual=False)
+        self.builder.close_text()
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+from node import TextNode
+
 __all__ = ('TreeBuilder', 'root_required')
 
 def root_required(fn):
@@ -13,25 +15,44 @@ def root_required(fn):
 
 
 class TreeBuilder(object):
-    def __init__(self, root=None):
+    def __init__(self, root=None, normalize_text=False):
         self.root = root
         # pointer to actual node
         self._actual_node = root
+        # allow adjacent text nodes while building, merge them by
+        # normalize() when parsing is done
+        self.normalize_text = normalize_text
+        # (MacroScanner, start, end) of macro being expanded, see parse()
+        self.scanner_hint = None
+        # number of nodes added, checked by limits
+        self.node_count = 0
+        # LimitGuard of parsing in progress, see limits.py
+        self.limit_guard = None
+        # while positive, builder must keep all nodes in tree (see render.py)
+        self.held = 0
+
+    def _allow_text_node(self, node):
+        if self.normalize_text is True and isinstance(node, TextNode):
+            self._actual_node.actual_text_content = None
 
     @root_required
     def append(self, node, move_actual=True):
+        self.node_count += 1
         if self._actual_node is None:
             self.tree.append(node)
         else:
+            self._allow_text_node(node)
             self._actual_node.add_child(node)
         if move_actual is True:
             self._actual_node = node
 
     @root_required
     def insert(self, node, index, move_actual=True):
+        self.node_count += 1
         if self._actual_node is None:
             self.tree.insert(node, index)
         else:
+            self._allow_text_node(node)
             self._actual_node.insert_child(node, index)
         if move_actual is True:
             self._actual_node = node
@@ -45,6 +66,8 @@ class TreeBuilder(object):
 
     @root_required
     def add_child(self, node, move_actual=True):
+        self.node_count += 1
+        self._allow_text_node(node)
         self._actual_node.add_child(node)
         if move_actual is True:
             self._actual_node = node
@@ -65,6 +88,11 @@ class TreeBuilder(object):
             self.root = node
         self._actual_node = node
 
+    @root_required
+    def close_text(self):
+        """ Next text node could be appended to actual node even if it's ending with text """
+        self._actual_node.close_text()
+
     def set_root(self, node):
         self.root = node
         self._actual_node = node